@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import generateCode, InputToText, pytest, evaluateLogic, getResponse
+from app.api.v1.endpoints import generateCode, InputToText, pytest, evaluateLogic, getResponse, metrics, batchGrade, profiles
 from app.core.fileToText import router as imageToText_router
 
 api_router = APIRouter()
@@ -7,4 +7,7 @@ api_router.include_router(generateCode.router, prefix="/generateCode", tags=["ge
 api_router.include_router(InputToText.router, prefix="/inputToText", tags=["inputToText"])
 api_router.include_router(pytest.router, prefix="/pytest", tags=["pytest"])
 api_router.include_router(evaluateLogic.router, prefix="/evaluateLogic", tags=["pseudocode"]) 
-api_router.include_router(getResponse.router, prefix="/getResponse", tags=["getResponse"])
\ No newline at end of file
+api_router.include_router(getResponse.router, prefix="/getResponse", tags=["getResponse"])
+api_router.include_router(batchGrade.router, prefix="/batch", tags=["batch"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(profiles.router, prefix="/profiles", tags=["profiles"])
@@ -17,18 +17,24 @@ os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = settings.GOOGLE_APPLICATION_CREDE
 # Initialize Google Cloud Vision client
 client = vision.ImageAnnotatorClient()
 
+# Prefix of the placeholder put into `content` for files that could not be read
+OCR_ERROR_PREFIX = "[Error in "
+
 @router.post("/files-to-text")
 async def input_To_Text(
     files: List[UploadFile] = File(...),
+    preprocess: bool = Query(True, description="Shrink images before OCR; false sends the original upload"),
 ) -> Dict[str, Any]:
     """
     Convert multiple image or PDF files to text using Google Cloud Vision API.
     
     Args:
         files (List[UploadFile]): List of image or PDF files to process
+        preprocess (bool): Whether images are oriented, downscaled and grayscaled before OCR
         
     Returns:
-        Dict[str, Any]: A dictionary containing the extracted text for each file
+        Dict[str, Any]: A dictionary containing the extracted text for each file,
+        and the bytes saved by image pre-processing
         
     Raises:
         HTTPException: If any file is invalid or processing fails
@@ -51,7 +57,7 @@ async def input_To_Text(
             
             try:
                 # Use the process_file_to_text function to process each file
-                result = await process_file_to_text(file)
+                result = await process_file_to_text(file, preprocess=preprocess)
                 
                 # Add filename to the result
                 result["filename"] = file.filename
@@ -81,11 +87,21 @@ async def input_To_Text(
             if "error" not in result and "text" in result:
                 content.append(result["text"])
             elif "error" in result:
-                content.append(f"[Error in {result['filename']}: {result['error']}]")
+                content.append(f"{OCR_ERROR_PREFIX}{result['filename']}: {result['error']}]")
         
+        original_bytes = sum(r["preprocessing"]["original_bytes"] for r in results if "preprocessing" in r)
+        processed_bytes = sum(r["preprocessing"]["processed_bytes"] for r in results if "preprocessing" in r)
+        if original_bytes:
+            logger.info(f"Image pre-processing saved {original_bytes - processed_bytes} of {original_bytes} bytes")
+
         # Return in the format expected by getResponse.py
         return {
-            "content": content
+            "content": content,
+            "preprocessing": {
+                "original_bytes": original_bytes,
+                "processed_bytes": processed_bytes,
+                "saved_bytes": original_bytes - processed_bytes
+            }
         }
         
     except Exception as e:
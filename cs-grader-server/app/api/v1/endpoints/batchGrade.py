@@ -0,0 +1,101 @@
+from fastapi import APIRouter, HTTPException
+from typing import Dict, Any
+from app.api.v1.models import (
+    BatchGradeRequest, BatchGradeResponse, SubmissionCluster, BatchSubmission,
+    PromptRequest, PseudocodeEvaluationRequest
+)
+from app.api.v1.endpoints.generateCode import generate_response
+from app.api.v1.endpoints.evaluateLogic import evaluate_psuedocode_logic
+from app.core.config import settings
+from app.core.dedup import cluster_submissions
+from app.core.logging import setup_logger
+from app.core.outbound import current_request_class, BATCH
+import asyncio
+
+router = APIRouter()
+logger = setup_logger("batchGrade")
+
+async def _stage(coro) -> Dict[str, Any]:
+    """Await a grading endpoint, shaping failures the way getResponse does."""
+    try:
+        return (await coro).model_dump()
+    except HTTPException as e:
+        return {"error": str(e.detail), "status": "failed"}
+    except Exception as e:
+        return {"error": str(e), "status": "failed"}
+
+async def grade_submission(submission: BatchSubmission) -> Dict[str, Any]:
+    """Run code generation and logic evaluation for one submission."""
+    code_generation, logic_evaluation = await asyncio.gather(
+        _stage(generate_response(PromptRequest(
+            prompt=submission.pseudocode,
+            description=submission.question,
+            max_retries=3
+        ))),
+        _stage(evaluate_psuedocode_logic(PseudocodeEvaluationRequest(
+            question=submission.question,
+            pseudocode=submission.pseudocode
+        )))
+    )
+    return {"code_generation": code_generation, "logic_evaluation": logic_evaluation}
+
+@router.post("/grade", response_model=BatchGradeResponse)
+async def grade_batch(request: BatchGradeRequest) -> BatchGradeResponse:
+    """
+    Grade a batch of text submissions, grading each group of duplicates once.
+
+    Pseudocode is normalised (comments, case, whitespace and variable names)
+    and fingerprinted; only the first of each set of identical submissions to
+    the same question goes through code generation and evaluation, and its
+    result is copied to the others. Near-identical submissions found with
+    MinHash/LSH are reported as clusters but graded individually, since a
+    one-token difference can be the bug. Provider calls run in the batch lane,
+    behind interactive grading.
+
+    Args:
+        request (BatchGradeRequest): The submissions and the near-duplicate threshold
+
+    Returns:
+        BatchGradeResponse: Result per submission and the clusters that were found
+
+    Raises:
+        HTTPException (400): If submission ids are not unique
+    """
+    submissions = {submission.submission_id: submission for submission in request.submissions}
+    if len(submissions) != len(request.submissions):
+        raise HTTPException(status_code=400, detail="submission_id values must be unique")
+
+    clusters = cluster_submissions(
+        [(s.submission_id, s.question, s.pseudocode) for s in request.submissions],
+        request.near_duplicate_threshold
+    )
+    graded_ids = list(dict.fromkeys(leader for cluster in clusters for leader in cluster.graded_as.values()))
+    logger.info(
+        f"Grading {len(submissions)} submissions as {len(graded_ids)} distinct solutions "
+        f"in {len(clusters)} equivalence classes"
+    )
+
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    # Inherited by every task below, so all provider calls queue in the batch lane
+    current_request_class.set(BATCH)
+
+    async def grade_one(submission_id: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await grade_submission(submissions[submission_id])
+
+    graded = dict(zip(graded_ids, await asyncio.gather(*(grade_one(s) for s in graded_ids))))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for cluster in clusters:
+        for member in cluster.members:
+            leader = cluster.graded_as[member]
+            results[member] = {
+                "cluster_id": cluster.cluster_id,
+                "graded_as": leader,
+                **graded[leader]
+            }
+
+    return BatchGradeResponse(
+        results=results,
+        clusters=[SubmissionCluster(**vars(cluster)) for cluster in clusters]
+    )
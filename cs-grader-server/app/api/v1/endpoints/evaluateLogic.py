@@ -1,15 +1,167 @@
 from cohere import JsonObjectResponseFormatV2, UserChatMessageV2
-from app.core.chroma_middleware import ChromaMiddleware
-from fastapi import APIRouter, HTTPException
-from app.core.config import COHERE_CLIENT, settings
-from app.api.v1.models import PseudocodeEvaluationRequest, PseudocodeEvaluationResponse, LogicalAnalysis
+from app.core.chroma_middleware import ChromaMiddleware, CorpusReloadError, RetrievalError
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional, Tuple
+from app.core.config import settings
+from app.core.clients import COHERE_CLIENT
+from app.api.v1.models import (
+    PseudocodeEvaluationRequest, PseudocodeEvaluationResponse, LogicalAnalysis,
+    SimilarAlgorithm, SimilarAlgorithmsRequest
+)
 from app.core.logging import setup_logger
+from app.core.admin import require_admin
+from app.core.outbound import outbound
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.single_flight import request_key
+from app.core.shared_cache import cached
+from app.core.embeddings import get_embedding_provider
+from app.core.submissions import register_version
+from app.core.prompt_budget import compact_submission, fit_similar_algorithms, cohere_usage, cached_usage
+from app.core.streaming import ndjson_event, NDJSON_MEDIA_TYPE
 import json
 
 logger = setup_logger("pseudocode")
 router = APIRouter()
 chroma_middleware: ChromaMiddleware = ChromaMiddleware()
 
+# Define the expected JSON structure
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "feedback": {"type": "string"},
+        "logical_analysis": {
+            "type": "object",
+            "properties": {
+                "correctness": {"type": "string"},
+                "efficiency": {"type": "string"},
+                "readability": {"type": "string"}
+            },
+            "required": ["correctness", "efficiency", "readability"]
+        },
+        "potential_issues": {
+            "type": "array",
+            "items": {"type": "string"}
+        }
+    },
+    "required": ["feedback", "logical_analysis", "potential_issues"]
+}
+
+async def build_evaluation_prompt(request: PseudocodeEvaluationRequest) -> Tuple[str, List[str], List[str]]:
+    """
+    Look up similar algorithms and build the evaluation prompt.
+
+    A failed lookup does not fail the evaluation; it goes ahead without
+    similar solutions and reports "similar_solutions" as degraded.
+
+    Returns:
+        Tuple[str, List[str], List[str]]: The prompt, the similar-solution snippets
+        used as context and the degraded parts
+    """
+    degraded = []
+    if request.similar_algorithms is not None:
+        # The orchestrator already ran (or gave up on) the similarity lookup, which
+        # applied the threshold of whichever retrieval path answered
+        suggested_algorithms = [algorithm.model_dump() for algorithm in request.similar_algorithms]
+    else:
+        # Find similar algorithms from the database; weak matches are filtered in the query
+        try:
+            suggested_algorithms = await chroma_middleware.find_algorithms_by_question(
+                question=request.question,
+                n_results=5,
+                min_similarity=settings.SIMILARITY_THRESHOLD
+            )
+        except RetrievalError as e:
+            logger.warning(f"Similar algorithm lookup failed, evaluating without context: {str(e)}")
+            suggested_algorithms = []
+            degraded.append("similar_solutions")
+    logger.info(f"There are {len(suggested_algorithms)} similar solutions.")
+
+    # Keep only what fits in the similar-algorithm token budget
+    suggested_algorithms = fit_similar_algorithms(suggested_algorithms)
+    question, pseudocode = compact_submission(request.question, request.pseudocode)
+
+    # Create a prompt for evaluation with similar solutions as context
+    similar_solutions_context = "Similar Solutions Found:\n" if suggested_algorithms else "No similar solutions found."
+    algorithm_list = []
+
+    if suggested_algorithms:
+        for i, solution in enumerate(suggested_algorithms, 1):
+            new_context = f"\nAlgorithm {i} (Similarity: {solution['similarity']:.2f}):\n"
+            new_context += f"Question: {solution['question']}\n"
+            new_context += f"Pseudocode:\n{solution['pseudocode']}\n"
+            similar_solutions_context += new_context
+            algorithm_list.append(new_context)
+
+    # Create a structured prompt for evaluation
+    evaluation_prompt = f"""
+    Question: {question}
+    
+    Pseudocode Solution:
+    {pseudocode}
+    
+    Similar Algorithms:
+    {similar_solutions_context}
+    
+    Consider:
+    1. Does it correctly address the question?
+    2. Is the logical flow sound?
+    3. Are there any potential issues or edge cases not handled?
+    4. Could the solution be improved?
+    5. How does it compare to the similar solutions found?
+    
+    Do not attempt to fix the psuedocode in your evaluation.
+    If the psuedocode has any issues, say it is incorrect.
+    If the psuedocode does not solve the problem, say that it does not solve the problem.
+    Do not include similar algorithms in the solution if they are not part of the psuedocode.
+    
+    Provide a detailed evaluation of the pseudocode.
+    """
+    return evaluation_prompt, algorithm_list, degraded
+
+def parse_evaluation(evaluation_text: str, algorithm_list: List[str]) -> PseudocodeEvaluationResponse:
+    """
+    Validate Cohere's JSON output into a PseudocodeEvaluationResponse.
+
+    Raises:
+        HTTPException (500): If the text is not valid JSON
+    """
+    logger.debug(f"Received evaluation text: {evaluation_text[:100]}...")
+
+    try:
+        # Parse the JSON response directly since it's already in the correct format
+        evaluation_json = json.loads(evaluation_text)
+        # logger.info(f"Parsed evaluation JSON: {json.dumps(evaluation_json, indent=2)}")
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON response: {str(e)}")
+        logger.error(f"The json response was: {evaluation_text}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to parse evaluation response"
+        )
+
+    # Create LogicalAnalysis object
+    logical_analysis_dict = evaluation_json.get('logical_analysis', {})
+    logical_analysis = LogicalAnalysis(
+        correctness=logical_analysis_dict.get('correctness', "No correctness analysis available."),
+        efficiency=logical_analysis_dict.get('efficiency', "No efficiency analysis available."),
+        readability=logical_analysis_dict.get('readability', "No readability analysis available.")
+    )
+
+    return PseudocodeEvaluationResponse(
+        feedback=evaluation_json.get('feedback', "No feedback available."),
+        logical_analysis=logical_analysis,
+        potential_issues=evaluation_json.get('potential_issues', []),
+        similar_solutions=algorithm_list
+    )
+
+# Versions recorded with every graded submission; editing the prompt or parser changes them
+register_version("evaluate", settings.COHERE_MODEL_NAME, build_evaluation_prompt, parse_evaluation, EVALUATION_SCHEMA)
+register_version(
+    "similar", get_embedding_provider().model_id, settings.RETRIEVAL_BACKEND, settings.HYBRID_VECTOR_WEIGHT,
+    settings.LEXICAL_FALLBACK_THRESHOLD
+)
+
 @router.post("/evaluate", response_model=PseudocodeEvaluationResponse)
 async def evaluate_psuedocode_logic(request: PseudocodeEvaluationRequest):
     """
@@ -18,126 +170,51 @@ async def evaluate_psuedocode_logic(request: PseudocodeEvaluationRequest):
     try:
         logger.info(f"Evaluating pseudocode for question: {request.question[:100]}...")
         
-        # Find suggested algorithms from the database
-        suggested_algorithms = await chroma_middleware.find_algorithms_by_question(
-            question=request.question,
-            n_results=5
-        )
-        logger.info(f"Found {len(suggested_algorithms)} suggested algorithms. There are {len(list(filter(lambda x: x['similarity'] >= 0.4, suggested_algorithms)))} similar solutions.")
+        evaluation_prompt, algorithm_list, degraded = await build_evaluation_prompt(request)
 
-        # Create a prompt for evaluation with similar solutions as context
-        similar_solutions_context = "Similar Solutions Found:\n" if suggested_algorithms else "No similar solutions found."
-        algorithm_list = []
-        
-        if suggested_algorithms:
-            for i, solution in enumerate(suggested_algorithms, 1):
-                if solution['similarity'] >= 0.4:
-                    new_context = f"\nAlgorithm {i} (Similarity: {solution['similarity']:.2f}):\n"
-                    new_context += f"Question: {solution['question']}\n"
-                    new_context += f"Pseudocode:\n{solution['pseudocode']}\n"
-                    similar_solutions_context += new_context
-                    algorithm_list.append(new_context)
-
-        # Create a structured prompt for evaluation
-        evaluation_prompt = f"""
-        Question: {request.question}
-        
-        Pseudocode Solution:
-        {request.pseudocode}
-        
-        Similar Algorithms:
-        {similar_solutions_context}
-        
-        Consider:
-        1. Does it correctly address the question?
-        2. Is the logical flow sound?
-        3. Are there any potential issues or edge cases not handled?
-        4. Could the solution be improved?
-        5. How does it compare to the similar solutions found?
-        
-        Do not attempt to fix the psuedocode in your evaluation.
-        If the psuedocode has any issues, say it is incorrect.
-        If the psuedocode does not solve the problem, say that it does not solve the problem.
-        Do not include similar algorithms in the solution if they are not part of the psuedocode.
-        
-        Provide a detailed evaluation of the pseudocode.
-        """
-        
-        # Define the expected JSON structure
-        prompt_structure = {
-            "type": "object",
-            "properties": {
-                "feedback": {"type": "string"},
-                "logical_analysis": {
-                    "type": "object",
-                    "properties": {
-                        "correctness": {"type": "string"},
-                        "efficiency": {"type": "string"},
-                        "readability": {"type": "string"}
-                    },
-                    "required": ["correctness", "efficiency", "readability"]
-                },
-                "potential_issues": {
-                    "type": "array",
-                    "items": {"type": "string"}
-                }
-            },
-            "required": ["feedback", "logical_analysis", "potential_issues"]
-        }
+        async def generate():
+            logger.debug("Generating evaluation using Cohere")
+            # Generate evaluation using Cohere's chat endpoint
+            response = await outbound.cohere_chat.run(lambda: COHERE_CLIENT.chat(
+                model=settings.COHERE_MODEL_NAME,
+                messages=[
+                    UserChatMessageV2(
+                        content=evaluation_prompt
+                    )
+                ],
+                response_format=JsonObjectResponseFormatV2(
+                    json_schema=EVALUATION_SCHEMA
+                )
+            ))
 
-        logger.debug("Generating evaluation using Cohere")
-        # Generate evaluation using Cohere's chat endpoint
-        response = await COHERE_CLIENT.chat(
-            model=settings.COHERE_MODEL_NAME,
-            messages=[
-                UserChatMessageV2(
-                    content=evaluation_prompt
+            if not response or not response.message or not response.message.content:
+                logger.error("No response generated from Cohere")
+                raise HTTPException(
+                    status_code=500,
+                    detail="No response generated from Cohere"
                 )
-            ],
-            response_format=JsonObjectResponseFormatV2(
-                json_schema=prompt_structure
-            )
-        )
 
-        if not response or not response.message or not response.message.content:
-            logger.error("No response generated from Cohere")
-            raise HTTPException(
-                status_code=500,
-                detail="No response generated from Cohere"
-            )
+            text = response.message.content[0].text
+            return {"text": text, "usage": cohere_usage(response, evaluation_prompt, text)}
 
-        # Parse the response to extract JSON
-        evaluation_text = response.message.content[0].text
-        logger.debug(f"Received evaluation text: {evaluation_text[:100]}...")
-        
-        try:
-            # Parse the JSON response directly since it's already in the correct format
-            evaluation_json = json.loads(evaluation_text)
-            # logger.info(f"Parsed evaluation JSON: {json.dumps(evaluation_json, indent=2)}")
-            
-            # Create LogicalAnalysis object
-            logical_analysis_dict = evaluation_json.get('logical_analysis', {})
-            logical_analysis = LogicalAnalysis(
-                correctness=logical_analysis_dict.get('correctness', "No correctness analysis available."),
-                efficiency=logical_analysis_dict.get('efficiency', "No efficiency analysis available."),
-                readability=logical_analysis_dict.get('readability', "No readability analysis available.")
-            )
-            
-            return PseudocodeEvaluationResponse(
-                feedback=evaluation_json.get('feedback', "No feedback available."),
-                logical_analysis=logical_analysis,
-                potential_issues=evaluation_json.get('potential_issues', []),
-                similar_solutions=algorithm_list
-            )
+        # The same submission graded by any replica reuses its evaluation
+        result, hit = await cached(
+            "cohere_evaluation", request_key(settings.COHERE_MODEL_NAME, evaluation_prompt), generate
+        )
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {str(e)}")
-            logger.error(f"The json response was: {evaluation_text}")
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to parse evaluation response"
-            )
+        # Parse the response to extract JSON
+        evaluation_text = result["text"]
+        evaluation = parse_evaluation(evaluation_text, algorithm_list)
+        evaluation.token_usage = {
+            "cohere": cached_usage(result["usage"], hit)
+        }
+        evaluation.degraded = degraded
+        logger.info(f"Token usage for evaluation: {evaluation.token_usage}")
+        return evaluation
 
+    except CircuitOpenError:
+        # Answered with a 503 and Retry-After by the app's exception handler
+        raise
     except Exception as e:
         logger.error(f"Error evaluating pseudocode: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -145,7 +222,101 @@ async def evaluate_psuedocode_logic(request: PseudocodeEvaluationRequest):
             detail=f"Error evaluating pseudocode: {str(e)}"
         )
 
+async def stream_evaluation(request: PseudocodeEvaluationRequest) -> AsyncIterator[bytes]:
+    """
+    Yield NDJSON events for a streamed evaluation.
+
+    Events, one JSON object per line:
+        {"event": "delta", "text": "..."}       partial Cohere output
+        {"event": "result", "data": {...}}       validated PseudocodeEvaluationResponse
+        {"event": "error", "detail": "..."}
+    """
+    try:
+        evaluation_prompt, algorithm_list, degraded = await build_evaluation_prompt(request)
+
+        logger.debug("Streaming evaluation using Cohere")
+        chunks = []
+        async with outbound.cohere_chat.slot():
+            async for event in COHERE_CLIENT.chat_stream(
+                model=settings.COHERE_MODEL_NAME,
+                messages=[
+                    UserChatMessageV2(
+                        content=evaluation_prompt
+                    )
+                ],
+                response_format=JsonObjectResponseFormatV2(
+                    json_schema=EVALUATION_SCHEMA
+                )
+            ):
+                if event.type == "content-delta":
+                    text = event.delta.message.content.text
+                    if text:
+                        chunks.append(text)
+                        yield ndjson_event({"event": "delta", "text": text})
+
+        if not chunks:
+            logger.error("No response generated from Cohere")
+            yield ndjson_event({"event": "error", "detail": "No response generated from Cohere"})
+            return
+
+        evaluation_text = "".join(chunks)
+        evaluation = parse_evaluation(evaluation_text, algorithm_list)
+        evaluation.token_usage = {
+            "cohere": cohere_usage(None, evaluation_prompt, evaluation_text)
+        }
+        evaluation.degraded = degraded
+        yield ndjson_event({"event": "result", "data": evaluation.model_dump()})
+
+    except HTTPException as e:
+        yield ndjson_event({"event": "error", "detail": str(e.detail)})
+    except Exception as e:
+        logger.error(f"Error streaming pseudocode evaluation: {str(e)}", exc_info=True)
+        yield ndjson_event({"event": "error", "detail": f"Error evaluating pseudocode: {str(e)}"})
+
+@router.post("/evaluate-stream")
+async def evaluate_psuedocode_logic_stream(request: PseudocodeEvaluationRequest):
+    """
+    Streaming variant of /evaluate that forwards Cohere output as NDJSON while it is generated.
+    The final `result` event carries the validated PseudocodeEvaluationResponse.
+    """
+    logger.info(f"Streaming evaluation for question: {request.question[:100]}...")
+    return StreamingResponse(stream_evaluation(request), media_type=NDJSON_MEDIA_TYPE)
+
+@router.post("/similar", response_model=List[SimilarAlgorithm])
+async def find_similar_algorithms(request: SimilarAlgorithmsRequest):
+    """
+    Find stored algorithms whose question is similar to the given one.
+
+    An empty list means nothing was similar enough; a failed search is a 503.
+    """
+    try:
+        algorithms = await chroma_middleware.find_algorithms_by_question(
+            question=request.question,
+            n_results=request.n_results,
+            min_similarity=request.min_similarity
+        )
+    except RetrievalError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return [SimilarAlgorithm(**algorithm) for algorithm in algorithms]
+
 @router.get("/stats")
 async def get_chroma_stats():
     """Get statistics about the ChromaDB collection"""
-    return chroma_middleware.get_collection_stats()
\ No newline at end of file
+    return chroma_middleware.get_collection_stats()
+
+@router.post("/reload", dependencies=[Depends(require_admin)])
+async def reload_corpus(
+    path: Optional[str] = Query(None, description="Chroma directory to switch to; defaults to the current one"),
+    force: bool = Query(False, description="Reload even if the files look unchanged")
+):
+    """
+    Load the algorithms corpus again and swap it in without a restart.
+
+    Requests already searching finish on the previous version. Only this
+    replica reloads; replicas with CORPUS_WATCH_INTERVAL set pick up the
+    change on their own.
+    """
+    try:
+        return await chroma_middleware.reload(path=path, force=force)
+    except CorpusReloadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
\ No newline at end of file
@@ -1,61 +1,64 @@
 from cohere import JsonObjectResponseFormatV2, UserChatMessageV2
 from fastapi import APIRouter, HTTPException
-from app.api.v1.models import PromptRequest, PromptResponse, GeminiErrorResponse
-from app.core.config import settings, GEMINI_MODEL, COHERE_CLIENT
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.api.v1.models import (
+    PromptRequest, PromptResponse, GeminiErrorResponse, TestGenerationRequest, TestGenerationResponse
+)
+from app.core.config import settings
+from app.core.clients import GEMINI_MODEL, COHERE_CLIENT
 from app.core.logging import setup_logger
+from app.core.outbound import outbound
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.single_flight import single_flight, request_key
+from app.core.shared_cache import cached
+from app.core.submissions import register_version
+from app.core.prompt_budget import (
+    compact_submission, scale_output_tokens, count_tokens, gemini_usage, cohere_usage, cached_usage
+)
+from app.core.streaming import ndjson_event, NDJSON_MEDIA_TYPE
+from app.core.code_validation import (
+    ValidationIssue, validate_generated_code, validate_tests, exported_names, format_issues
+)
 import google.generativeai as genai
 import asyncio
+import ast
 import json
 
 router = APIRouter()
 logger = setup_logger("generateCode")
 
-@router.post("/generate", response_model=PromptResponse, responses={
-    500: {"model": GeminiErrorResponse}
-})
-async def generate_response(request: PromptRequest) -> PromptResponse:
-    """
-    Generate Python code and pytest test cases from pseudocode using Google's Gemini model.
-
-    The endpoint accepts pseudocode as input and returns both the Python implementation
-    and corresponding pytest test cases.
+code_flight = single_flight("gemini_code")
+test_flight = single_flight("cohere_tests")
 
-    Args:
-        request (PromptRequest): Request body containing:
-            - prompt (str): The pseudocode to convert
-            - max_retries (int, optional): Maximum number of retries for JSON parsing (1-5, default: 3)
+TEST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "imports": {
+            "type": "string",
+            "description": "Import statement starting with 'from main import *' and 'import random'"
+        },
+        "tests": {
+            "type": "string",
+            "description": "Complete pytest test cases for the implementation"
+        }
+    },
+    "required": ["imports", "tests"]
+}
 
-    Returns:
-        PromptResponse: Response containing:
-            - code (str): The generated Python implementation
-            - testing_code (str): The generated pytest test cases
-            - model_used (str): The Gemini model version used
+def build_generation_config(pseudocode: str) -> genai.GenerationConfig:
+    """Preset Gemini generation config, with the output limit scaled to the pseudocode size."""
+    return genai.GenerationConfig(
+        temperature=0.0,     
+        top_p=1.0,       
+        top_k=0,     
+        candidate_count=1,
+        max_output_tokens=scale_output_tokens(pseudocode)
+    )
 
-    Raises:
-        HTTPException (500): 
-            - When no response is generated by the model
-            - When the model response is not valid JSON after max_retries attempts
-            - For any other unexpected errors
-    """
-    max_retries = request.max_retries
-    retry_count = 0
-
-    while retry_count < max_retries:
-        try:
-            # Ensure API is configured
-            genai.configure(api_key=settings.GOOGLE_API_KEY, transport="rest")
-            
-            # Use preset generation config
-            generation_config = genai.GenerationConfig(
-                temperature=0.0,     
-                top_p=1.0,       
-                top_k=0,     
-                candidate_count=1,
-                max_output_tokens=1000
-            )
-            
-            # Prepare the code generation prompt
-            code_prompt = f"""
+def build_code_prompt(description: str, pseudocode: str) -> str:
+    """Prompt asking Gemini for a near-verbatim Python translation of the pseudocode."""
+    return f"""
             Convert the following pseudocode into Python code EXACTLY as specified. 
             Do not fix, re-arrange, or optimize anything. 
             If the pseudocode is contradictory or syntactically incorrect, replicate that as closely as possible in Python. 
@@ -69,22 +72,25 @@ async def generate_response(request: PromptRequest) -> PromptResponse:
             DO NOT RETURN ANYTHING ELSE.
 
             Question Description:
-            {request.description}
+            {description}
 
             Pseudocode:
-            {request.prompt}
+            {pseudocode}
             """
-            
-            # Create a prompt for test generation that works with just the pseudocode
-            # This allows us to start generating tests concurrently while code is being generated
-            test_prompt = f"""
+
+def build_test_prompt(description: str, pseudocode: str) -> str:
+    """
+    Prompt asking Cohere for pytest cases. It only needs the pseudocode, which
+    allows test generation to run concurrently with code generation.
+    """
+    return f"""
             Create pytest test cases for Python code that will be translated from this pseudocode:
             
             Question Description:
-            {request.description}
+            {description}
 
             Pseudocode:
-            {request.prompt}
+            {pseudocode}
             
             From analyzing the pseudocode above, create comprehensive pytest test cases to validate the Python implementation.
             Focus on testing functionality, edge cases, and expected behavior of the algorithm described in the pseudocode.
@@ -96,123 +102,462 @@ async def generate_response(request: PromptRequest) -> PromptResponse:
             DO NOT IMPORT THE ORIGINAL CODE IN ANY OTHER WAY.
             """
 
-            prompt_structure = {
-                "type": "object",
-                "properties": {
-                    "imports": {
-                        "type": "string",
-                        "description": "Import statement starting with 'from main import *' and 'import random'"
-                    },
-                    "tests": {
-                        "type": "string",
-                        "description": "Complete pytest test cases for the implementation"
-                    }
-                },
-                "required": ["imports", "tests"]
-            }
+def build_question_test_prompt(description: str) -> str:
+    """
+    Prompt asking Cohere for pytest cases from the question alone, so test
+    generation can start before the pseudocode has been read.
+    """
+    return f"""
+            Create pytest test cases for a Python solution to this question:
             
-            # Start both API calls concurrently
-            # Create async functions to wrap the synchronous generate_content calls
-            async def generate_code():
-                return GEMINI_MODEL.generate_content(
-                    contents=[{"text": code_prompt}],
-                    generation_config=generation_config
-                )
-                
-            async def generate_tests():
-                return await COHERE_CLIENT.chat(
-                    model=settings.COHERE_MODEL_NAME,
-                    messages=[
-                        UserChatMessageV2(
-                            content=test_prompt
-                        )
-                    ],
-                    response_format=JsonObjectResponseFormatV2(
-                        schema=prompt_structure
-                    )
-                )
-                
-            # Run both tasks concurrently
-            code_response, test_response = await asyncio.gather(
-                generate_code(),
-                generate_tests()
-            )
+            Question Description:
+            {description}
             
-            # Process code response
-            if not code_response or not code_response.text:
-                logger.error("No response generated from Gemini")
-                raise HTTPException(
-                    status_code=500,
-                    detail="No response generated from Gemini"
+            Use the function and parameter names given in the question.
+            Focus on testing functionality, edge cases, and expected behavior the question asks for.
+            Return ONLY the pytest test cases, no explanations or additional text.
+            When importing the solution, use the following line EXACTLY as is:
+            from main import *
+            import random
+            DO NOT IMPORT THE SOLUTION IN ANY OTHER WAY.
+            """
+
+def clean_code(text: str) -> str:
+    """Strip surrounding whitespace and Markdown code fences."""
+    return text.strip().replace("```python", "").replace("```", "").strip()
+
+def parse_test_content(content_text: str) -> str:
+    """Turn Cohere's test output (JSON or raw text) into a runnable test module."""
+    try:
+        # Try to parse as JSON
+        test_json = json.loads(content_text)
+        imports = test_json.get("imports", "from main import *")
+        tests = test_json.get("tests", "")
+        
+        # Combine imports and tests
+        testing_code = f"{imports}\n\n{tests}"
+    except json.JSONDecodeError:
+        # If not valid JSON, use a fallback approach
+        if "from main import *" not in content_text:
+            testing_code = "from main import *\n\n" + content_text
+        else:
+            testing_code = content_text
+    
+    return clean_code(testing_code)
+
+def with_code_feedback(code_prompt: str, issues: List[ValidationIssue]) -> str:
+    """Code prompt extended with the problems found in the previous attempt."""
+    return f"""{code_prompt}
+            Your previous answer could not be used as main.py:
+{format_issues(issues)}
+            Return corrected, compilable Python code only.
+            """
+
+def with_test_feedback(test_prompt: str, issues: List[ValidationIssue], available: List[str]) -> str:
+    """Test prompt extended with the problems found in the previous attempt."""
+    return f"""{test_prompt}
+            Your previous test cases had these problems:
+{format_issues(issues)}
+            Names defined by main.py: {", ".join(available) or "(none)"}
+            Return corrected test cases only.
+            """
+
+def extract_code(code_response) -> str:
+    if not code_response or not code_response.text:
+        logger.error("No response generated from Gemini")
+        raise HTTPException(
+            status_code=500,
+            detail="No response generated from Gemini"
+        )
+    return clean_code(code_response.text)
+
+def extract_test_text(test_response) -> str:
+    if not test_response or not test_response.message or not test_response.message.content:
+        logger.error("No response generated from Cohere")
+        raise HTTPException(
+            status_code=500,
+            detail="No response generated from Cohere"
+        )
+
+    content_text = None
+    message_content = test_response.message.content
+
+    # Check if content is a list (which it typically is in Cohere responses)
+    if isinstance(message_content, list) and len(message_content) > 0:
+        for content in message_content:
+            if hasattr(content, 'text') and content.text:
+                content_text = content.text
+                break
+
+    if not content_text:
+        logger.error("No text content found in Cohere response")
+        raise HTTPException(
+            status_code=500,
+            detail="Invalid response format from Cohere"
+        )
+    return content_text
+
+async def request_code(prompt: str, generation_config: genai.GenerationConfig) -> Tuple[Dict[str, Any], str]:
+    """
+    Ask Gemini for code; returns the token usage and the cleaned code.
+
+    Identical prompts in flight at the same time share one call, and code
+    already generated for the prompt by any replica is reused.
+    """
+    async def generate():
+        # The REST transport's client is blocking, so the call runs in a worker thread
+        response = await outbound.gemini.run(lambda: asyncio.to_thread(
+            GEMINI_MODEL.generate_content,
+            contents=[{"text": prompt}],
+            generation_config=generation_config
+        ))
+        return {"code": extract_code(response), "usage": gemini_usage(response, prompt)}
+
+    key = request_key(settings.GEMINI_MODEL_NAME, generation_config.max_output_tokens, prompt)
+    result, hit = await code_flight.do(key, lambda: cached("gemini_code", key, generate))
+    return cached_usage(result["usage"], hit), result["code"]
+
+async def request_tests(prompt: str) -> Tuple[Dict[str, Any], str]:
+    """Ask Cohere for tests; returns the token usage and the test module."""
+    async def generate():
+        response = await outbound.cohere_chat.run(lambda: COHERE_CLIENT.chat(
+            model=settings.COHERE_MODEL_NAME,
+            messages=[
+                UserChatMessageV2(
+                    content=prompt
                 )
+            ],
+            response_format=JsonObjectResponseFormatV2(
+                schema=TEST_SCHEMA
+            )
+        ))
+        content = extract_test_text(response)
+        return {"testing_code": parse_test_content(content), "usage": cohere_usage(response, prompt, content)}
 
-            # Parse the response to extract code
-            python_code = code_response.text.strip()
-            python_code = python_code.replace("```python", "").replace("```", "").strip()
-            
-            # Process test response
-            if not test_response or not test_response.message or not test_response.message.content:
-                logger.error("No response generated from Cohere")
-                raise HTTPException(
-                    status_code=500,
-                    detail="No response generated from Cohere"
+    key = request_key(settings.COHERE_MODEL_NAME, prompt)
+    result, hit = await test_flight.do(key, lambda: cached("cohere_tests", key, generate))
+    return cached_usage(result["usage"], hit), result["testing_code"]
+
+# Versions recorded with every graded submission; editing a prompt or parser changes them
+register_version(
+    "generate_code", settings.GEMINI_MODEL_NAME,
+    build_code_prompt, with_code_feedback, clean_code, build_generation_config, scale_output_tokens
+)
+register_version(
+    "generate_tests", settings.COHERE_MODEL_NAME,
+    build_test_prompt, with_test_feedback, parse_test_content, TEST_SCHEMA
+)
+register_version(
+    "generate_question_tests", settings.COHERE_MODEL_NAME,
+    build_question_test_prompt, with_test_feedback, parse_test_content, TEST_SCHEMA
+)
+
+def available_names(code: Optional[str]) -> List[str]:
+    """Public names main.py defines, for test feedback prompts."""
+    try:
+        return sorted(exported_names(ast.parse(code or "")))
+    except SyntaxError:
+        return []
+
+@router.post("/generate", response_model=PromptResponse, responses={
+    500: {"model": GeminiErrorResponse}
+})
+async def generate_response(request: PromptRequest) -> PromptResponse:
+    """
+    Generate Python code and pytest test cases from pseudocode using Google's Gemini model.
+
+    The endpoint accepts pseudocode as input and returns both the Python implementation
+    and corresponding pytest test cases. Both are statically validated before
+    returning; when the code does not compile or the tests are broken, only
+    the failing part is regenerated with the problems added to its prompt.
+
+    Args:
+        request (PromptRequest): Request body containing:
+            - prompt (str): The pseudocode to convert
+            - max_retries (int, optional): Maximum number of generation attempts (1-5, default: 3)
+            - include_tests (bool, optional): Set to false to generate code only
+            - testing_code (str, optional): Precomputed tests to validate instead of generating new ones
+
+    Returns:
+        PromptResponse: Response containing:
+            - code (str): The generated Python implementation
+            - testing_code (str): The generated pytest test cases
+            - validation_issues (list): Problems still present after the last attempt
+            - degraded (list): ["tests"] when test generation failed and only code is returned
+
+    Raises:
+        CircuitOpenError (503): When Gemini's circuit is open
+        HTTPException (500): 
+            - When no code is generated by the model
+            - For any other unexpected errors
+    """
+    max_retries = request.max_retries
+    retry_count = 0
+
+    try:
+        # Ensure API is configured
+        genai.configure(api_key=settings.GOOGLE_API_KEY, transport="rest")
+
+        # Clean and trim the OCR'd input to the prompt token budget
+        description, pseudocode = compact_submission(request.description, request.prompt)
+        generation_config = build_generation_config(pseudocode)
+        base_code_prompt = build_code_prompt(description, pseudocode)
+        base_test_prompt = build_test_prompt(description, pseudocode)
+
+        async def given_tests():
+            return None, request.testing_code or ""
+
+        if request.include_tests and request.testing_code is None:
+            tests_call = request_tests(base_test_prompt)
+        else:
+            tests_call = given_tests()
+
+        # Run both tasks concurrently
+        code_result, test_result = await asyncio.gather(
+            request_code(base_code_prompt, generation_config),
+            tests_call,
+            return_exceptions=True
+        )
+        if isinstance(code_result, BaseException):
+            raise code_result
+        code_usage, python_code = code_result
+
+        degraded = []
+        if isinstance(test_result, BaseException):
+            if not isinstance(test_result, Exception):
+                raise test_result
+            # The code is still worth returning; the caller can evaluate without tests
+            logger.warning(f"Test generation failed, returning code only: {str(test_result)}")
+            degraded.append("tests")
+            test_usage, testing_code = None, ""
+        else:
+            test_usage, testing_code = test_result
+        issues = validate_generated_code(python_code, testing_code)
+
+        # Regenerate only the side that failed validation, instead of
+        # finding out from a sandbox run
+        while retry_count + 1 < max_retries:
+            code_issues = [i for i in issues if i.source == "code" and i.severity == "error"]
+            failing_tests = [i for i in issues if i.source == "tests"]
+            if not code_issues and not failing_tests:
+                break
+            retry_count += 1
+            logger.info(
+                f"Regenerating after validation (attempt {retry_count + 1}): "
+                f"{len(code_issues)} code issue(s), {len(failing_tests)} test issue(s)"
+            )
+
+            calls = {}
+            if code_issues:
+                calls["code"] = request_code(with_code_feedback(base_code_prompt, code_issues), generation_config)
+            if failing_tests:
+                calls["tests"] = request_tests(
+                    with_test_feedback(base_test_prompt, failing_tests, available_names(python_code))
                 )
-            
+            results = dict(zip(calls, await asyncio.gather(*calls.values(), return_exceptions=True)))
+
+            failed = False
+            for name, result in results.items():
+                if isinstance(result, BaseException):
+                    if not isinstance(result, Exception):
+                        raise result
+                    # Keep the previous attempt rather than losing it
+                    logger.warning(f"Regenerating {name} failed: {str(result)}")
+                    failed = True
+                elif name == "code":
+                    code_usage, python_code = result
+                else:
+                    test_usage, testing_code = result
+            issues = validate_generated_code(python_code, testing_code)
+            if failed:
+                break
+
+        if issues:
+            logger.warning(f"Returning generated code with {len(issues)} validation issue(s)")
+
+        token_usage = {"gemini": code_usage}
+        if test_usage is not None:
+            token_usage["cohere"] = test_usage
+        logger.info(f"Token usage for generate_response: {token_usage}")
+
+        # Return the combined response
+        return PromptResponse(
+            code=python_code,
+            testing_code=testing_code,
+            token_usage=token_usage,
+            validation_issues=issues,
+            degraded=degraded
+        )
+
+    except CircuitOpenError:
+        # Answered with a 503 and Retry-After by the app's exception handler
+        raise
+    except Exception as e:
+        logger.error(f"Error in generate_response: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=GeminiErrorResponse(
+                error="Unexpected error in generate_response",
+                details=str(e),
+                retries_attempted=retry_count
+            ).model_dump()
+        )
+
+@router.post("/generate-tests", response_model=TestGenerationResponse)
+async def generate_tests_response(request: TestGenerationRequest) -> TestGenerationResponse:
+    """
+    Generate pytest test cases without generating code.
+
+    With only a description the tests are written from the question, so
+    they can be generated while the pseudocode is still being read. With
+    pseudocode the prompt matches /generate's. When `code` is given the tests
+    are validated against it and regenerated with the problems added to the
+    prompt, up to max_retries attempts.
+
+    Raises:
+        CircuitOpenError (503): When Cohere's circuit is open
+        HTTPException (500): When no usable tests are generated
+    """
+    retry_count = 0
+    try:
+        description, pseudocode = compact_submission(request.description, request.pseudocode or "")
+        if pseudocode:
+            base_prompt = build_test_prompt(description, pseudocode)
+        else:
+            base_prompt = build_question_test_prompt(description)
+
+        test_usage, testing_code = await request_tests(base_prompt)
+        issues = validate_tests(request.code, testing_code)
+
+        while retry_count + 1 < request.max_retries and issues:
+            retry_count += 1
+            logger.info(f"Regenerating tests after validation (attempt {retry_count + 1}): {len(issues)} issue(s)")
+            prompt = with_test_feedback(base_prompt, issues, available_names(request.code))
             try:
-                # Extract the tests from the JSON response
-                content_text = None
-                message_content = test_response.message.content
-                
-                # Check if content is a list (which it typically is in Cohere responses)
-                if isinstance(message_content, list) and len(message_content) > 0:
-                    for content in message_content:
-                        if hasattr(content, 'text') and content.text:
-                            content_text = content.text
-                            break
-                
-                if not content_text:
-                    logger.error("No text content found in Cohere response")
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Invalid response format from Cohere"
-                    )
-                
-                try:
-                    # Try to parse as JSON
-                    test_json = json.loads(content_text)
-                    imports = test_json.get("imports", "from main import *")
-                    tests = test_json.get("tests", "")
-                    
-                    # Combine imports and tests
-                    testing_code = f"{imports}\n\n{tests}"
-                except json.JSONDecodeError:
-                    # If not valid JSON, use a fallback approach
-                    if "from main import *" not in content_text:
-                        testing_code = "from main import *\n\n" + content_text
-                    else:
-                        testing_code = content_text
-                
-                testing_code = testing_code.replace("```python", "").replace("```", "").strip()
+                test_usage, testing_code = await request_tests(prompt)
             except Exception as e:
-                logger.error(f"Error processing test response: {str(e)}")
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Failed to parse test response: {str(e)}"
-                )
-            
-            # Return the combined response
-            return PromptResponse(
-                code=python_code,
-                testing_code=testing_code,
+                # Keep the previous attempt rather than losing it
+                logger.warning(f"Regenerating tests failed: {str(e)}")
+                break
+            issues = validate_tests(request.code, testing_code)
+
+        return TestGenerationResponse(
+            testing_code=testing_code,
+            token_usage={"cohere": test_usage},
+            validation_issues=issues
+        )
+
+    except CircuitOpenError:
+        # Answered with a 503 and Retry-After by the app's exception handler
+        raise
+    except Exception as e:
+        logger.error(f"Error in generate_tests_response: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating tests: {str(e)}"
+        )
+
+async def stream_generation(request: PromptRequest) -> AsyncIterator[bytes]:
+    """
+    Yield NDJSON events while Gemini writes the code and Cohere writes the tests.
+
+    Events, one JSON object per line:
+        {"event": "code_delta", "text": "..."}    partial Gemini output
+        {"event": "tests_delta", "text": "..."}   partial Cohere output
+        {"event": "result", "data": {...}}        validated PromptResponse
+        {"event": "error", "detail": "..."}
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    description, pseudocode = compact_submission(request.description, request.prompt)
+    code_prompt = build_code_prompt(description, pseudocode)
+    test_prompt = build_test_prompt(description, pseudocode)
+
+    async def stream_code():
+        chunks = []
+        loop = asyncio.get_running_loop()
+
+        def generate():
+            # Gemini is configured with the REST transport, whose client is
+            # blocking; iterate the stream in a worker thread and hand each
+            # chunk back to the event loop
+            response = GEMINI_MODEL.generate_content(
+                contents=[{"text": code_prompt}],
+                generation_config=build_generation_config(pseudocode),
+                stream=True
             )
-        
-        except Exception as e:
-            logger.error(f"Error in generate_response: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=GeminiErrorResponse(
-                    error="Unexpected error in generate_response",
-                    details=str(e),
-                    retries_attempted=retry_count
-                ).model_dump()
-            )
\ No newline at end of file
+            for chunk in response:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    loop.call_soon_threadsafe(queue.put_nowait, {"event": "code_delta", "text": chunk.text})
+
+        async with outbound.gemini.slot():
+            await asyncio.to_thread(generate)
+        return "".join(chunks)
+
+    async def stream_tests():
+        chunks = []
+        async with outbound.cohere_chat.slot():
+            async for event in COHERE_CLIENT.chat_stream(
+                model=settings.COHERE_MODEL_NAME,
+                messages=[
+                    UserChatMessageV2(
+                        content=test_prompt
+                    )
+                ],
+                response_format=JsonObjectResponseFormatV2(
+                    schema=TEST_SCHEMA
+                )
+            ):
+                if event.type == "content-delta":
+                    text = event.delta.message.content.text
+                    if text:
+                        chunks.append(text)
+                        await queue.put({"event": "tests_delta", "text": text})
+        return "".join(chunks)
+
+    genai.configure(api_key=settings.GOOGLE_API_KEY, transport="rest")
+    gathered = asyncio.gather(stream_code(), stream_tests())
+    gathered.add_done_callback(lambda _: queue.put_nowait(None))
+
+    try:
+        while (event := await queue.get()) is not None:
+            yield ndjson_event(event)
+
+        code_text, test_text = gathered.result()
+        if not code_text:
+            logger.error("No response generated from Gemini")
+            yield ndjson_event({"event": "error", "detail": "No response generated from Gemini"})
+            return
+        if not test_text:
+            logger.error("No response generated from Cohere")
+            yield ndjson_event({"event": "error", "detail": "No response generated from Cohere"})
+            return
+
+        python_code = clean_code(code_text)
+        testing_code = parse_test_content(test_text)
+        result = PromptResponse(
+            code=python_code,
+            testing_code=testing_code,
+            validation_issues=validate_generated_code(python_code, testing_code),
+            token_usage={
+                "gemini": {"input_tokens": count_tokens(code_prompt), "output_tokens": count_tokens(code_text), "estimated": True},
+                "cohere": {"input_tokens": count_tokens(test_prompt), "output_tokens": count_tokens(test_text), "estimated": True}
+            }
+        )
+        yield ndjson_event({"event": "result", "data": result.model_dump()})
+
+    except Exception as e:
+        logger.error(f"Error in stream_generation: {str(e)}")
+        yield ndjson_event({"event": "error", "detail": str(e)})
+    finally:
+        # Stop the provider streams if the client went away mid-generation
+        gathered.cancel()
+
+@router.post("/generate-stream")
+async def generate_response_stream(request: PromptRequest):
+    """
+    Streaming variant of /generate that forwards partial code and tests as NDJSON.
+    The final `result` event carries the validated PromptResponse.
+    """
+    logger.info("Streaming code and test generation")
+    return StreamingResponse(stream_generation(request), media_type=NDJSON_MEDIA_TYPE)
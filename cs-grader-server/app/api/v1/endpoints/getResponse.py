@@ -1,149 +1,346 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Request
-from typing import Dict, Any, List
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Query
+from typing import Dict, Any, List, Optional
+from app.api.v1.endpoints.InputToText import OCR_ERROR_PREFIX
+from app.core.config import settings
 from app.core.logging import setup_logger
+from app.core.admin import ADMIN_TOKEN_HEADER, require_admin
+from app.core.admission import INTERNAL_CALL_HEADER, INTERNAL_CALL_TOKEN
+from app.core.profiling import PROFILE_HEADER
+from app.core.outbound import TENANT_HEADER, DEFAULT_TENANT, REQUEST_CLASS_HEADER, current_request_class
+from app.core.pipeline import Pipeline, Stage, StageResult
+from app.core.response_shaping import summarize_files_to_text
+from app.core.code_validation import validate_tests
+from app.core.submissions import (
+    FormFile, StageRecorder, submission_store, submission_id_for,
+    register_version, component_version, stage_fingerprint
+)
 import httpx
-import asyncio
 
 router = APIRouter()
 logger = setup_logger("getResponse")
 
+def usable_text(processed: Dict[str, Any]) -> str:
+    """Join the OCR'd content of a files-to-text response, dropping error placeholders."""
+    return "\n".join(
+        text for text in processed.get("content", [])
+        if text and text.strip() and not text.startswith(OCR_ERROR_PREFIX)
+    )
+
+def stage_output(result: StageResult) -> Dict[str, Any]:
+    """Shape a downstream stage result the way the web client expects it."""
+    if result.ok:
+        return result.value
+    if result.status == "skipped":
+        return {"status": "skipped", "reason": result.reason}
+    return {"error": result.reason, "status": "failed"}
+
+def merge_tests(code_generation: Dict[str, Any], tests: StageResult) -> Dict[str, Any]:
+    """Combine the code-only generation result with the separately generated tests."""
+    merged = dict(code_generation)
+    if not tests.ok:
+        logger.error(f"Stage tests {tests.status}: {tests.reason}")
+        merged["degraded"] = [*merged.get("degraded", []), "tests"]
+        return merged
+    merged["testing_code"] = tests.value["testing_code"]
+    merged["token_usage"] = {**merged.get("token_usage", {}), **tests.value.get("token_usage", {})}
+    merged["validation_issues"] = [*merged.get("validation_issues", []), *tests.value.get("validation_issues", [])]
+    return merged
+
+register_version("usable_text", "local", usable_text)
+
+def stage_fingerprints(preprocess_images: bool) -> Dict[str, str]:
+    """
+    Version fingerprint of each grading stage: the model and prompt template
+    versions of the endpoint it calls plus the settings that shape its output.
+    """
+    ocr = stage_fingerprint(component_version("vision_ocr"), preprocess_images)
+    text = stage_fingerprint(component_version("usable_text"))
+    # Every provider prompt is compacted to the token budget first
+    compaction = (component_version("prompt_budget"), settings.PROMPT_TOKEN_BUDGET)
+    return {
+        "question_ocr": ocr,
+        "pseudocode_ocr": ocr,
+        "question_text": text,
+        "pseudocode_text": text,
+        "similarity": stage_fingerprint(
+            component_version("similar"), component_version("corpus"), settings.SIMILARITY_THRESHOLD
+        ),
+        "test_generation": stage_fingerprint(component_version("generate_question_tests"), *compaction),
+        "code_generation": stage_fingerprint(
+            component_version("generate_code"), *compaction,
+            settings.GEMINI_MIN_OUTPUT_TOKENS, settings.GEMINI_MAX_OUTPUT_TOKENS
+        ),
+        "tests": stage_fingerprint(component_version("generate_tests"), *compaction),
+        "logic_evaluation": stage_fingerprint(
+            component_version("evaluate"), *compaction,
+            settings.SIMILAR_ALGORITHMS_TOKEN_BUDGET, settings.MIN_SIMILAR_ALGORITHM_TOKENS
+        ),
+    }
+
+def internal_headers(request: Request) -> Dict[str, str]:
+    """Headers for the internal calls of a grading request."""
+    # Keep the caller's tenant and request class on the internal calls so outbound queuing stays fair
+    headers = {
+        TENANT_HEADER: request.headers.get(TENANT_HEADER, DEFAULT_TENANT),
+        REQUEST_CLASS_HEADER: current_request_class.get()
+    }
+    # A profiled request profiles its internal calls too
+    for header in (PROFILE_HEADER, ADMIN_TOKEN_HEADER):
+        if header in request.headers:
+            headers[header] = request.headers[header]
+    # Already admitted: the internal calls must not queue behind this request
+    headers[INTERNAL_CALL_HEADER] = INTERNAL_CALL_TOKEN
+    return headers
+
+async def read_form_data(files: List[UploadFile]) -> List[Any]:
+    # Save file contents in memory before sending to avoid stream depletion
+    form_data = []
+    for f in files:
+        # Read the content
+        content = await f.read()
+        # Reset the file pointer
+        await f.seek(0)
+        form_data.append(
+            ("files", (f.filename, content, f.content_type))
+        )
+    return form_data
+
+async def run_grading_pipeline(
+    base_url: str,
+    headers: Dict[str, str],
+    question_form_data: Optional[List[FormFile]],
+    pseudocode_form_data: Optional[List[FormFile]],
+    preprocess_images: bool,
+    recorder: StageRecorder
+) -> Pipeline:
+    """
+    Run the grading DAG, recording every stage through `recorder`.
+
+    Form data is None on a regrade whose uploads were not kept; the OCR
+    stages then fail unless their recorded output can be reused.
+    """
+    async with httpx.AsyncClient(headers=headers) as client:
+
+        async def post_json(path: str, timeout: float, **kwargs) -> Any:
+            response = await client.post(f"{base_url}/api/v1{path}", timeout=timeout, **kwargs)
+            response.raise_for_status()
+            return response.json()
+
+        ocr_params = {"preprocess": str(preprocess_images).lower()}
+
+        async def files_to_text(form_data: Optional[List[FormFile]]) -> Any:
+            if form_data is None:
+                raise HTTPException(status_code=409, detail="The uploads were not kept, so OCR cannot be redone")
+            return await post_json("/inputToText/files-to-text", 30.0, files=form_data, params=ocr_params)
+
+        async def question_ocr(_):
+            return await files_to_text(question_form_data)
+
+        async def pseudocode_ocr(_):
+            return await files_to_text(pseudocode_form_data)
+
+        async def question_text(inputs):
+            text = usable_text(inputs["question_ocr"])
+            if not text:
+                raise HTTPException(status_code=400, detail="Failed to process question files")
+            return text
+
+        async def pseudocode_text(inputs):
+            text = usable_text(inputs["pseudocode_ocr"])
+            if not text:
+                raise HTTPException(status_code=400, detail="Failed to process pseudocode files")
+            return text
+
+        async def similarity(inputs):
+            return await post_json(
+                "/evaluateLogic/similar",
+                settings.SIMILARITY_STAGE_TIMEOUT,
+                json={
+                    "question": inputs["question_text"],
+                    "n_results": 5,
+                    "min_similarity": settings.SIMILARITY_THRESHOLD
+                }
+            )
+
+        async def test_generation(inputs):
+            # Written from the question alone, so it overlaps the pseudocode OCR
+            return await post_json(
+                "/generateCode/generate-tests",
+                settings.LLM_STAGE_TIMEOUT,
+                json={"description": inputs["question_text"], "max_retries": 1}
+            )
+
+        async def code_generation(inputs):
+            return await post_json(
+                "/generateCode/generate",
+                settings.LLM_STAGE_TIMEOUT,
+                json={
+                    "prompt": inputs["pseudocode_text"],
+                    "description": inputs["question_text"],
+                    "max_retries": 3,
+                    "include_tests": False
+                }
+            )
+
+        async def tests(inputs):
+            code = inputs["code_generation"]["code"]
+            early = inputs["test_generation"]
+            if early is not None and not validate_tests(code, early["testing_code"]):
+                return early
+            # The question-only tests are missing or don't fit the generated
+            # code (e.g. other function names); write them against the code
+            regenerated = await post_json(
+                "/generateCode/generate-tests",
+                settings.LLM_STAGE_TIMEOUT,
+                json={
+                    "description": inputs["question_text"],
+                    "pseudocode": inputs["pseudocode_text"],
+                    "code": code,
+                    "max_retries": 3
+                }
+            )
+            if early is not None and "cohere" in early["token_usage"]:
+                # Keep the discarded call visible in the usage accounting
+                regenerated["token_usage"]["cohere_question_only"] = early["token_usage"]["cohere"]
+            return regenerated
+
+        async def logic_evaluation(inputs):
+            # A failed or timed-out lookup still evaluates, just without context
+            return await post_json(
+                "/evaluateLogic/evaluate",
+                settings.LLM_STAGE_TIMEOUT,
+                json={
+                    "question": inputs["question_text"],
+                    "pseudocode": inputs["pseudocode_text"],
+                    "similar_algorithms": inputs["similarity"] or []
+                }
+            )
+
+        fingerprints = stage_fingerprints(preprocess_images)
+
+        def recorded(name, fn):
+            return recorder.wrap(name, fn, fingerprints[name])
+
+        pipeline = Pipeline([
+            Stage("question_ocr", recorded("question_ocr", question_ocr), fatal=True),
+            Stage("pseudocode_ocr", recorded("pseudocode_ocr", pseudocode_ocr), fatal=True),
+            Stage("question_text", recorded("question_text", question_text), deps=("question_ocr",), fatal=True),
+            Stage("pseudocode_text", recorded("pseudocode_text", pseudocode_text), deps=("pseudocode_ocr",),
+                  fatal=True),
+            Stage("similarity", recorded("similarity", similarity), deps=("question_text",), optional=True,
+                  timeout=settings.SIMILARITY_STAGE_TIMEOUT),
+            Stage("test_generation", recorded("test_generation", test_generation), deps=("question_text",),
+                  optional=True, timeout=settings.LLM_STAGE_TIMEOUT),
+            Stage("code_generation", recorded("code_generation", code_generation),
+                  deps=("question_text", "pseudocode_text")),
+            Stage("tests", recorded("tests", tests),
+                  deps=("question_text", "pseudocode_text", "code_generation", "test_generation"), optional=True),
+            Stage("logic_evaluation", recorded("logic_evaluation", logic_evaluation),
+                  deps=("question_text", "pseudocode_text", "similarity")),
+        ])
+
+        logger.info("Running grading pipeline...")
+        await pipeline.run()
+        return pipeline
+
+def build_response(pipeline: Pipeline, include_input_text: bool, include_stages: bool) -> Dict[str, Any]:
+    """Shape the finished pipeline into the /get-response body."""
+    results = pipeline.results
+    code_generation = stage_output(results["code_generation"])
+    if results["code_generation"].ok:
+        code_generation = merge_tests(code_generation, results["tests"])
+
+    degraded = []
+    for name in ("similarity", "code_generation", "logic_evaluation"):
+        if not results[name].ok:
+            logger.error(f"Stage {name} {results[name].status}: {results[name].reason}")
+            degraded.append(name)
+    degraded.extend(f"code_generation.{part}" for part in code_generation.get("degraded", []))
+    if results["logic_evaluation"].ok:
+        degraded.extend(f"logic_evaluation.{part}" for part in results["logic_evaluation"].value.get("degraded", []))
+
+    input_processing = {
+        "question": results["question_ocr"].value,
+        "pseudocode": results["pseudocode_ocr"].value
+    }
+    if not include_input_text:
+        input_processing = {name: summarize_files_to_text(value) for name, value in input_processing.items()}
+
+    response = {
+        "input_processing": input_processing,
+        "code_generation": code_generation,
+        "logic_evaluation": stage_output(results["logic_evaluation"]),
+        "degraded": degraded
+    }
+    if include_stages:
+        response["stages"] = pipeline.timeline()
+    return response
+
 @router.post("/get-response")
 async def get_complete_response(
     request: Request,
     question_files: List[UploadFile] = File(...),
-    pseudocode_files: List[UploadFile] = File(...)
+    pseudocode_files: List[UploadFile] = File(...),
+    include_input_text: bool = Query(True, description="Return the OCR'd text, otherwise only its length per file"),
+    include_stages: bool = Query(True, description="Return the stage timeline"),
+    preprocess_images: bool = Query(True, description="Shrink images before OCR")
 ) -> Dict[str, Any]:
     """
     Orchestrates the complete workflow by calling API endpoints
-    
+
+    The workflow runs as a DAG of stages: OCR of both inputs, validation of the
+    extracted text, an optional similarity lookup, then code generation and
+    logic evaluation. Each stage starts as soon as its own inputs are ready:
+    the similarity lookup and question-only test generation run while the
+    pseudocode is still being OCR'd, and the tests are only regenerated
+    against the code if they don't fit it. Unusable input (empty text or only OCR error placeholders)
+    stops the request before any LLM call is made, and a slow similarity lookup
+    times out without holding up the evaluation.
+
+    When a provider is down its circuit breaker makes the affected stage fail
+    in milliseconds, and whatever else succeeded is returned with the missing
+    parts listed under `degraded` (e.g. "similarity", "code_generation.tests").
+
+    Each stage's inputs, output and version fingerprint are stored under the
+    returned `submission_id`, so /regrade can later redo only what changed.
+
     Args:
         request (Request): The FastAPI request object
         question_files (List[UploadFile]): List of files containing the question description
         pseudocode_files (List[UploadFile]): List of files containing the pseudocode
-        
+        include_input_text (bool): Whether to echo the OCR'd text back in input_processing
+        include_stages (bool): Whether to include the stage timeline
+        preprocess_images (bool): Passed to files-to-text as `preprocess`
+
     Returns:
         Dict[str, Any]: Combined response containing all processing results
     """
     try:
         # Get base URL from request
         base_url = str(request.base_url).rstrip('/')
-        
-        # Process input files
-        logger.info("Processing input files...")
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            
-            # Save file contents in memory before sending to avoid stream depletion
-            question_form_data = []
-            for f in question_files:
-                # Read the content
-                content = await f.read()
-                # Reset the file pointer
-                await f.seek(0)
-                question_form_data.append(
-                    ("files", (f.filename, content, f.content_type))
-                )
-
-            pseudocode_form_data = []
-            for f in pseudocode_files:
-                # Read the content
-                content = await f.read()
-                # Reset the file pointer
-                await f.seek(0)
-                pseudocode_form_data.append(
-                    ("files", (f.filename, content, f.content_type))
-                )
-                        
-            # Run both inputToText calls concurrently
-            async def process_question_files():
-                response = await client.post(
-                    f"{base_url}/api/v1/inputToText/files-to-text",
-                    files=question_form_data
-                )
-                response.raise_for_status()
-                return response.json()
-            
-            async def process_pseudocode_files():
-                response = await client.post(
-                    f"{base_url}/api/v1/inputToText/files-to-text",
-                    files=pseudocode_form_data
-                )
-                response.raise_for_status()
-                return response.json()
-            
-            # Run both requests concurrently
-            question_processed, pseudocode_processed = await asyncio.gather(
-                process_question_files(),
-                process_pseudocode_files()
-            )
-            
-            # Extract and combine content from responses
-            question_text = "\n".join(question_processed["content"])
-            pseudocode_text = "\n".join(pseudocode_processed["content"])
-
-            print(question_text)
-            print(pseudocode_text)
-            
-            # Combine the results
-            processed_input = {
-                "question": question_processed,
-                "pseudocode": pseudocode_processed
-            }
-        
-        if not question_text or not pseudocode_text:
-            raise HTTPException(
-                status_code=400,
-                detail="Failed to process input files"
-            )
-        
-        # Run generate code and evaluate logic concurrently
-        logger.info("Generating code and evaluating logic...")
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async def generate_code():
-                response = await client.post(
-                    f"{base_url}/api/v1/generateCode/generate",
-                    json={
-                        "prompt": pseudocode_text,
-                        "description": question_text,
-                        "max_retries": 3
-                    }
-                )
-                response.raise_for_status()
-                return response.json()
-            
-            async def evaluate_logic():
-                response = await client.post(
-                    f"{base_url}/api/v1/evaluateLogic/evaluate",
-                    json={
-                        "question": question_text,
-                        "pseudocode": pseudocode_text
-                    }
-                )
-                response.raise_for_status()
-                return response.json()
-            
-            # Run both requests concurrently
-            code_response, evaluation_response = await asyncio.gather(
-                generate_code(),
-                evaluate_logic(),
-                return_exceptions=True
-            )
-            
-            # Handle exceptions from concurrent tasks
-            if isinstance(code_response, Exception):
-                logger.error(f"Error in code generation: {str(code_response)}")
-                code_response = {"error": str(code_response), "status": "failed"}
-                
-            if isinstance(evaluation_response, Exception):
-                logger.error(f"Error in logic evaluation: {str(evaluation_response)}")
-                evaluation_response = {"error": str(evaluation_response), "status": "failed"}
-        
-        # Step 4: Combine all results
-        return {
-            "input_processing": processed_input,
-            "code_generation": code_response,
-            "logic_evaluation": evaluation_response
-        }
-        
+
+        question_form_data = await read_form_data(question_files)
+        pseudocode_form_data = await read_form_data(pseudocode_files)
+
+        recorder = StageRecorder()
+        pipeline = await run_grading_pipeline(
+            base_url, internal_headers(request), question_form_data, pseudocode_form_data,
+            preprocess_images, recorder
+        )
+
+        submission_id = submission_id_for(question_form_data, pseudocode_form_data)
+        files = {"question": question_form_data, "pseudocode": pseudocode_form_data}
+        await submission_store.save(
+            submission_id, recorder.records, {"preprocess_images": preprocess_images},
+            files=files if settings.SUBMISSION_STORE_FILES else None
+        )
+
+        response = build_response(pipeline, include_input_text, include_stages)
+        response["submission_id"] = submission_id
+        return response
+
+    except HTTPException:
+        raise
     except httpx.HTTPError as e:
         logger.error(f"HTTP error in get_complete_response: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -156,3 +353,61 @@ async def get_complete_response(
             status_code=500,
             detail=f"An error occurred while processing the request: {str(e)}"
         )
+
+@router.get("/submissions", dependencies=[Depends(require_admin)])
+async def list_submissions(
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0)
+) -> Dict[str, Any]:
+    """Ids of stored submissions, least recently graded first."""
+    return {"submission_ids": await submission_store.list_ids(limit, offset)}
+
+@router.post("/regrade/{submission_id}", dependencies=[Depends(require_admin)])
+async def regrade_submission(
+    submission_id: str,
+    request: Request,
+    include_input_text: bool = Query(False, description="Return the OCR'd text, otherwise only its length per file"),
+    include_stages: bool = Query(True, description="Return the stage timeline")
+) -> Dict[str, Any]:
+    """
+    Grade a stored submission again, recomputing only the stages whose
+    fingerprint (model plus prompt template version) or inputs changed.
+
+    The response has the /get-response shape plus the stages that were
+    `recomputed` and `reused`.
+    """
+    record = await submission_store.load(submission_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    try:
+        files = await submission_store.load_files(submission_id) or {}
+        preprocess_images = record.get("options", {}).get("preprocess_images", True)
+
+        recorder = StageRecorder(previous=record.get("stages"))
+        pipeline = await run_grading_pipeline(
+            str(request.base_url).rstrip('/'), internal_headers(request),
+            files.get("question"), files.get("pseudocode"), preprocess_images, recorder
+        )
+        # The uploads are saved again too, so they are retained as long as the record
+        await submission_store.save(submission_id, recorder.records, record.get("options", {}), files or None)
+        logger.info(f"Regraded {submission_id}: recomputed {recorder.recomputed}, reused {recorder.reused}")
+
+        response = build_response(pipeline, include_input_text, include_stages)
+        response.update(submission_id=submission_id, recomputed=recorder.recomputed, reused=recorder.reused)
+        return response
+
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        logger.error(f"HTTP error regrading {submission_id}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"An HTTP error occurred while regrading the submission: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Error regrading {submission_id}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred while regrading the submission: {str(e)}"
+        )
@@ -0,0 +1,56 @@
+from fastapi import APIRouter
+from typing import Dict, Any
+from app.core.outbound import outbound
+from app.core.single_flight import single_flight_stats
+from app.core.image_preprocessing import preprocessing_stats
+from app.core.shared_cache import cache_stats
+from app.core.state_store import state_store_info
+from app.core.sandbox_cache import sandbox_cache_stats
+from app.core.sandbox_workers import sandbox_dispatcher
+
+router = APIRouter()
+
+@router.get("/outbound")
+async def get_outbound_metrics() -> Dict[str, Any]:
+    """
+    Queue depth, in-flight calls, current rate and 429 counts for each outbound provider.
+    """
+    return outbound.stats()
+
+@router.get("/single-flight")
+async def get_single_flight_metrics() -> Dict[str, Any]:
+    """
+    Calls started and concurrent duplicates coalesced onto them, per single-flight group.
+    """
+    return single_flight_stats()
+
+@router.get("/image-preprocessing")
+async def get_image_preprocessing_metrics() -> Dict[str, Any]:
+    """
+    Images pre-processed before OCR and the upload bytes that saved.
+    """
+    return preprocessing_stats.stats()
+
+
+@router.get("/shared-cache")
+async def get_shared_cache_metrics() -> Dict[str, Any]:
+    """
+    State store backend and this replica's hits, misses and waits per cache namespace.
+    """
+    return {**state_store_info(), "namespaces": cache_stats.stats()}
+
+
+@router.get("/sandbox-cache")
+async def get_sandbox_cache_metrics() -> Dict[str, Any]:
+    """
+    Test run result cache hit rate and why finished runs were not cached.
+    """
+    return sandbox_cache_stats.stats()
+
+
+@router.get("/sandbox-workers")
+async def get_sandbox_worker_metrics() -> Dict[str, Any]:
+    """
+    Live sandbox workers with their capacity and load, and this replica's placements.
+    """
+    return await sandbox_dispatcher.stats()
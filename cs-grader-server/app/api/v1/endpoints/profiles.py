@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from typing import Any, Dict, List
+from app.core.admin import require_admin
+from app.core.profiling import profile_store
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/")
+async def list_profiles() -> List[Dict[str, Any]]:
+    """
+    Stored request profiles, newest first: requested, sampled and slow requests.
+    """
+    return profile_store.list_profiles()
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str) -> Dict[str, Any]:
+    """
+    The span timeline of one request: pipeline stages, provider queue waits and calls.
+    """
+    profile = profile_store.load(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@router.get("/{profile_id}/call-stack")
+async def get_profile_call_stack(profile_id: str):
+    """
+    Download the pyinstrument HTML call-stack profile, if one was recorded.
+    """
+    path = profile_store.html_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No call-stack profile for this request")
+    return FileResponse(path, media_type="text/html", filename=f"{profile_id}.html")
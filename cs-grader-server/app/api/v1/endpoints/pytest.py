@@ -1,13 +1,21 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
-import tempfile
-import os
-import docker
-import json
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from typing import AsyncIterator, Iterator, Literal, Optional
+import asyncio
+from app.core.config import settings
 from app.core.logging import setup_logger
+from app.core.outbound import outbound
+from app.core.shared_cache import cached
+from app.core.sandbox import get_docker_client, runner_image_ref, run_pytest_in_container, stream_pytest_in_container
+from app.core.sandbox_cache import (
+    SANDBOX_CACHE_NAMESPACE, sandbox_limits, run_cache_key, is_nondeterministic, is_cacheable
+)
+from app.core.sandbox_workers import sandbox_dispatcher, SandboxJobError
+from app.core.streaming import ndjson_event, NDJSON_MEDIA_TYPE
+from app.core.code_validation import validate_generated_code, has_errors
+from app.core.response_shaping import shape_test_run
 from pydantic import BaseModel
-import subprocess
 
 router = APIRouter()
 logger = setup_logger("pytest")
@@ -15,170 +23,138 @@ logger = setup_logger("pytest")
 class CodeRequest(BaseModel):
     code: str
     test_code: Optional[str] = None
+    skip_validation: bool = False
 
-def check_docker_available():
-    """Check if Docker is running and accessible."""
-    try:
-        # Try to run docker info command
-        subprocess.run(["docker", "info"], capture_output=True, check=True, shell=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+def reject_invalid(request: CodeRequest) -> None:
+    """Raise a 422 with the static validation errors that would make the whole run fail."""
+    if request.skip_validation:
+        return
+    issues = validate_generated_code(request.code, request.test_code)
+    if has_errors(issues):
+        logger.info(f"Rejected run before starting a container: {len(issues)} validation issue(s)")
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "message": "Code failed static validation; no tests were run",
+                "issues": [issue.model_dump() for issue in issues]
+            }
+        )
 
-def create_dockerfile():
-    return """
-FROM python:3.12-slim
+@router.post("/validate")
+async def validate_code(request: CodeRequest):
+    """
+    Statically check code and tests without starting a container.
 
-WORKDIR /app
+    Reports syntax errors, imports unavailable in the sandbox, tests pytest
+    would not collect and names the tests use but nothing defines.
+    """
+    issues = validate_generated_code(request.code, request.test_code)
+    return {"valid": not has_errors(issues), "issues": issues}
 
-RUN pip install pytest pytest-json-report
+@router.post("/run")
+async def run_pytest(
+    request: CodeRequest,
+    report: Literal["full", "compact", "none"] = Query(
+        "full", description="'compact' keeps summary, timing and per-test outcome/crash only"
+    ),
+    include_logs: bool = Query(True, description="Include the container output"),
+    max_log_chars: Optional[int] = Query(None, ge=0, description="Keep only the last N characters of the logs")
+):
+    """
+    Run pytest on provided code string in a Docker container.
 
-COPY . .
+    Code that fails static validation is rejected with a 422 before any
+    container is built; set `skip_validation` to run it anyway. The query
+    flags trim the raw report and logs from the response.
 
-CMD ["pytest", "-v", "--json-report"]
-"""
+    Results of runs that finished normally are cached by code, tests, runner
+    image and resource limits; `cached` is true when no container was
+    started. Runs that timed out (`timed_out`), ran out of memory
+    (`oom_killed`) or look flaky are never cached.
 
-def run_pytest_in_container(code: str, test_code: Optional[str] = None):
-    logger.info("Starting pytest run with code string")
-    
-    # Check if Docker is available
-    if not check_docker_available():
-        logger.error("Docker is not running or not accessible")
-        raise HTTPException(
-            status_code=503,
-            detail="Docker is not running. Please start Docker and try again."
-        )
-    
-    # Create a temporary directory for the test files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        logger.debug(f"Created temporary directory: {temp_dir}")
-        
-        # Save the main code
-        main_path = os.path.join(temp_dir, "main.py")
-        logger.debug("Saving main code")
-        with open(main_path, "w") as f:
-            f.write(code)
-        
-        # Save the test code if provided
-        if test_code:
-            test_path = os.path.join(temp_dir, "test_main.py")
-            logger.debug("Saving test code")
-            with open(test_path, "w") as f:
-                f.write(test_code)
-        
-        # Create Dockerfile
-        dockerfile_path = os.path.join(temp_dir, "Dockerfile")
-        logger.debug("Creating Dockerfile")
-        with open(dockerfile_path, "w") as f:
-            f.write(create_dockerfile())
-        
-        # Build and run Docker container
-        try:
-            client = docker.from_env()
-        except docker.errors.DockerException as e:
-            logger.error(f"Failed to connect to Docker: {str(e)}")
-            raise HTTPException(
-                status_code=503,
-                detail="Failed to connect to Docker. Please ensure Docker is running and accessible."
-            )
-        
-        try:
-            # Build the image
-            logger.info("Building Docker image")
-            image, build_logs = client.images.build(
-                path=temp_dir,
-                dockerfile="Dockerfile",
-                tag="pytest-runner",
-                rm=True
-            )
-            
-            # Log build output
-            for log in build_logs:
-                if 'stream' in log:
-                    logger.debug(f"Docker build: {log['stream'].strip()}")
-            
-            # Run the container with auto-remove disabled
-            logger.info("Running Docker container")
-            container = client.containers.run(
-                image.id,
-                detach=True,
-                remove=False  # Disable auto-remove
-            )
-            
-            # Wait for the container to finish
-            result = container.wait()
-            logger.info(f"Container finished with exit code: {result['StatusCode']}")
-            
-            # Get the logs before removing the container
-            logs = container.logs().decode()
-            logger.debug(f"Container logs: {logs}")
-            
-            # Copy the JSON report from the container
-            try:
-                # Get the archive data
-                report_data, _ = container.get_archive('/app/.report.json')
-                
-                # Create a temporary file to store the archive
-                archive_path = os.path.join(temp_dir, 'report.tar')
-                with open(archive_path, 'wb') as f:
-                    for chunk in report_data:
-                        f.write(chunk)
-                
-                # Extract the tar archive
-                import tarfile
-                with tarfile.open(archive_path) as tar:
-                    tar.extractall(path=temp_dir)
-                
-                # Read the report
-                report_path = os.path.join(temp_dir, '.report.json')
-                if os.path.exists(report_path):
-                    logger.debug("Found JSON report")
-                    with open(report_path, "r") as f:
-                        report = json.loads(f.read())
-                else:
-                    logger.debug("No JSON report found")
-                    report = None
-                
-                # Clean up the archive file
-                os.remove(archive_path)
-                
-            except Exception as e:
-                logger.warning(f"Failed to copy report from container: {str(e)}")
-                report = None
-            
-            # Remove the container after getting logs and report
-            container.remove(force=True)
-            
-            return {
-                "exit_code": result["StatusCode"],
-                "logs": logs,
-                "report": report
-            }
-            
-        except docker.errors.BuildError as e:
-            logger.error(f"Failed to build Docker image: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Failed to build Docker image: {str(e)}")
-        except docker.errors.APIError as e:
-            logger.error(f"Docker API error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Docker API error: {str(e)}")
-        finally:
-            # Clean up
+    With SANDBOX_EXECUTION=remote the run is placed on the least loaded
+    sandbox worker instead of this host's Docker daemon.
+    """
+    logger.info("Received request to run pytest")
+
+    if not request.code:
+        logger.warning("No code provided in request")
+        raise HTTPException(status_code=400, detail="No code provided")
+
+    reject_invalid(request)
+
+    logger.info("Processing code string")
+
+    remote = settings.SANDBOX_EXECUTION == "remote"
+
+    async def run():
+        if remote:
             try:
-                logger.debug("Cleaning up Docker image")
-                client.images.remove(image.id, force=True)
-            except Exception as e:
-                logger.warning(f"Failed to clean up Docker image: {str(e)}")
+                return await sandbox_dispatcher.run(request.code, request.test_code, runner_image_ref())
+            except SandboxJobError as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+        # Runs off the event loop, in the sandbox lane of the caller's request class
+        return await outbound.sandbox.run(
+            lambda: asyncio.to_thread(run_pytest_in_container, request.code, request.test_code),
+            max_retries=0
+        )
 
-@router.post("/run")
-async def run_pytest(request: CodeRequest):
+    if not settings.SANDBOX_RESULT_CACHE:
+        result = await run()
+    else:
+        # Identical code and tests already run on the same runner image with
+        # the same limits, by any replica, reuse that result. The image is keyed
+        # by its reference (a content hash for the built image), so a hit needs
+        # no Docker daemon; workers also only take jobs for this reference.
+        nondeterministic = is_nondeterministic(request.code, request.test_code)
+        result, hit = await cached(
+            SANDBOX_CACHE_NAMESPACE,
+            run_cache_key(request.code, request.test_code, runner_image_ref(), sandbox_limits()),
+            run,
+            cacheable=lambda result: is_cacheable(result, nondeterministic)
+        )
+        result = {**result, "cached": hit}
+    return shape_test_run(result, report=report, include_logs=include_logs, max_log_chars=max_log_chars)
+
+async def stream_on_worker(code: str, test_code: Optional[str]) -> AsyncIterator[bytes]:
+    """Forward a sandbox worker's run events as NDJSON."""
+    try:
+        async for event in sandbox_dispatcher.stream(code, test_code, runner_image_ref()):
+            yield ndjson_event(event)
+    except SandboxJobError as e:
+        yield ndjson_event({"event": "error", "status_code": e.status_code, "detail": e.detail})
+
+async def stream_in_sandbox_slot(events: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Hold a sandbox slot while the blocking Docker event iterator runs in a thread."""
+    async with outbound.sandbox.slot():
+        async for event in iterate_in_threadpool(events):
+            yield event
+
+@router.post("/run-stream")
+async def run_pytest_stream(request: CodeRequest):
     """
-    Run pytest on provided code string in a Docker container.
+    Run pytest in a Docker container and stream progress as NDJSON.
+
+    Each test outcome is forwarded as soon as pytest prints it; the final
+    `result` event carries the same exit_code/logs/report as `/run`.
     """
-    logger.info("Received request to run pytest")
-    
+    logger.info("Received request to stream pytest run")
+
     if not request.code:
         logger.warning("No code provided in request")
         raise HTTPException(status_code=400, detail="No code provided")
-    
-    logger.info("Processing code string")
-    return run_pytest_in_container(request.code, request.test_code) 
\ No newline at end of file
+
+    reject_invalid(request)
+
+    if settings.SANDBOX_EXECUTION == "remote":
+        return StreamingResponse(
+            stream_on_worker(request.code, request.test_code), media_type=NDJSON_MEDIA_TYPE
+        )
+
+    # Fail before the response starts so Docker problems still surface as a 503
+    client = get_docker_client()
+
+    return StreamingResponse(
+        stream_in_sandbox_slot(stream_pytest_in_container(client, request.code, request.test_code)),
+        media_type=NDJSON_MEDIA_TYPE
+    )
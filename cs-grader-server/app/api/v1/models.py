@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
+from app.core.code_validation import ValidationIssue
 
 class PromptRequest(BaseModel):
     prompt: str
@@ -7,22 +8,75 @@ class PromptRequest(BaseModel):
         default=3,
         ge=1,
         le=5,
-        description="Maximum number of retries for JSON parsing (1-5, default: 3)"
+        description="Maximum number of generation attempts when validation fails (1-5, default: 3)"
     )
     description: str
+    include_tests: bool = Field(default=True, description="Set to false to generate code only")
+    testing_code: Optional[str] = Field(
+        default=None,
+        description="Precomputed tests (e.g. from /generate-tests); validated against the code instead of generating new ones"
+    )
+
+class TestGenerationRequest(BaseModel):
+    description: str = Field(..., description="The programming question or problem statement")
+    pseudocode: Optional[str] = Field(default=None, description="Pseudocode; tests are written from the question alone when omitted")
+    code: Optional[str] = Field(default=None, description="Generated main.py the tests are validated against")
+    max_retries: int = Field(default=3, ge=1, le=5, description="Maximum number of generation attempts when validation fails")
+
+class TokenUsage(BaseModel):
+    input_tokens: int = Field(..., description="Prompt tokens sent to the provider")
+    output_tokens: int = Field(..., description="Completion tokens returned by the provider")
+    estimated: bool = Field(default=False, description="True when counted locally rather than reported by the provider")
+    cached: bool = Field(default=False, description="True when the result came from the shared cache and no tokens were spent")
 
 class PromptResponse(BaseModel):
     code: str
     testing_code: str
+    token_usage: Dict[str, TokenUsage] = Field(default_factory=dict, description="Token usage per provider call")
+    validation_issues: List[ValidationIssue] = Field(
+        default_factory=list,
+        description="Static validation problems left after the last generation attempt"
+    )
+    degraded: List[str] = Field(
+        default_factory=list,
+        description="Parts left out because a provider failed, e.g. 'tests'"
+    )
+
+class TestGenerationResponse(BaseModel):
+    testing_code: str
+    token_usage: Dict[str, TokenUsage] = Field(default_factory=dict, description="Token usage per provider call")
+    validation_issues: List[ValidationIssue] = Field(
+        default_factory=list,
+        description="Static validation problems left after the last generation attempt"
+    )
 
 class GeminiErrorResponse(BaseModel):
     error: str
     details: Optional[str] = None
     retries_attempted: int
 
+class SimilarAlgorithm(BaseModel):
+    question: str = Field(..., description="Question the stored algorithm answers")
+    pseudocode: str = Field(..., description="Stored reference pseudocode")
+    similarity: float = Field(..., description="Similarity to the queried question (fused when hybrid retrieval is on)")
+    vector_similarity: Optional[float] = Field(default=None, description="Cosine similarity of the embeddings")
+    lexical_similarity: Optional[float] = Field(default=None, description="BM25 coverage of the question terms")
+
+class SimilarAlgorithmsRequest(BaseModel):
+    question: str = Field(..., description="The programming question or problem statement")
+    n_results: int = Field(default=5, ge=1, le=20, description="Maximum number of algorithms to return")
+    min_similarity: Optional[float] = Field(
+        default=None, ge=-1.0, le=1.0,
+        description="Only return algorithms at least this similar; weaker matches are never fetched"
+    )
+
 class PseudocodeEvaluationRequest(BaseModel):
     question: str = Field(..., description="The programming question or problem statement")
     pseudocode: str = Field(..., description="The pseudocode solution to evaluate")
+    similar_algorithms: Optional[List[SimilarAlgorithm]] = Field(
+        default=None,
+        description="Precomputed similar algorithms; looked up in ChromaDB when omitted"
+    )
 
 class LogicalAnalysis(BaseModel):
     correctness: str = Field(..., description="Analysis of the solution's correctness")
@@ -33,4 +87,35 @@ class PseudocodeEvaluationResponse(BaseModel):
     feedback: str = Field(..., description="Feedback on the solution")
     logical_analysis: LogicalAnalysis = Field(..., description="Detailed analysis of the solution")
     potential_issues: List[str] = Field(default_factory=list, description="List of potential issues or edge cases")
-    similar_solutions: List[str] = Field(default_factory=list, description="List of similar solutions found")
\ No newline at end of file
+    similar_solutions: List[str] = Field(default_factory=list, description="List of similar solutions found")
+    token_usage: Dict[str, TokenUsage] = Field(default_factory=dict, description="Token usage per provider call")
+    degraded: List[str] = Field(
+        default_factory=list,
+        description="Context left out because a provider failed, e.g. 'similar_solutions'"
+    )
+
+class BatchSubmission(BaseModel):
+    submission_id: str = Field(..., description="Caller's identifier for the submission")
+    question: str = Field(..., description="The programming question or problem statement")
+    pseudocode: str = Field(..., description="The pseudocode solution to grade")
+
+class BatchGradeRequest(BaseModel):
+    submissions: List[BatchSubmission] = Field(..., min_length=1, description="Submissions to grade")
+    near_duplicate_threshold: float = Field(
+        default=1.0,
+        ge=0.5,
+        le=1.0,
+        description="Estimated Jaccard similarity at which near-identical pseudocode is reported as one cluster; "
+                    "near-duplicates are still graded individually (1.0: exact matches only)"
+    )
+
+class SubmissionCluster(BaseModel):
+    cluster_id: str
+    representative: str = Field(..., description="First submission of the cluster")
+    members: List[str] = Field(..., description="Submissions in the cluster")
+    kind: str = Field(..., description="'unique', 'exact' (same normalised pseudocode) or 'near' (near-duplicate)")
+    graded_as: Dict[str, str] = Field(..., description="Submission whose grade each member received")
+
+class BatchGradeResponse(BaseModel):
+    results: Dict[str, Dict[str, Any]] = Field(..., description="Grading result per submission_id")
+    clusters: List[SubmissionCluster] = Field(..., description="Equivalence classes found among the submissions")
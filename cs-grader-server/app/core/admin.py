@@ -0,0 +1,17 @@
+import secrets
+from typing import Optional
+from fastapi import Header, HTTPException
+from app.core.config import settings
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+def is_admin(token: Optional[str]) -> bool:
+    """True if the token matches ADMIN_TOKEN; admin access is off while ADMIN_TOKEN is unset."""
+    return bool(settings.ADMIN_TOKEN) and token is not None and secrets.compare_digest(token, settings.ADMIN_TOKEN)
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """FastAPI dependency guarding admin-only endpoints."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
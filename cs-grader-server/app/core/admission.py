@@ -0,0 +1,293 @@
+import asyncio
+import math
+import secrets
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.logging import setup_logger
+
+logger = setup_logger("admission")
+
+MB = 1024 * 1024
+
+# Calls /get-response makes to this process carry this header; they are
+# covered by the parent request's estimate and must not queue behind it
+INTERNAL_CALL_HEADER = "X-Internal-Call"
+INTERNAL_CALL_TOKEN = secrets.token_urlsafe(16)
+
+FILENAME_MARKER = b'filename="'
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    """
+    How much memory requests to a group of routes are expected to hold.
+
+    Attributes:
+        name: Route group reported in metrics and rejections
+        prefixes: Path prefixes (after the API prefix) that belong to the group
+        body_copies: Copies of the request body held at once
+        base_bytes: Memory held regardless of the body (clients, buffers, results)
+        per_file_bytes: Extra memory per uploaded file (decode and OCR payloads)
+        max_in_flight: Setting name capping concurrent requests of the group, if any
+    """
+    name: str
+    prefixes: Tuple[str, ...]
+    body_copies: float
+    base_bytes: int
+    per_file_bytes: int = 0
+    max_in_flight: Optional[str] = None
+
+    def estimate(self, content_length: Optional[int]) -> int:
+        body = content_length if content_length is not None else settings.ADMISSION_UNKNOWN_BODY_BYTES
+        return int(self.base_bytes + body * self.body_copies)
+
+ROUTE_POLICIES = (
+    # The upload is parsed, read into memory, re-encoded as multipart for
+    # files-to-text and parsed again there, with two httpx clients open
+    RoutePolicy("get_response", ("/getResponse/get-response",), body_copies=4.0, base_bytes=8 * MB,
+                per_file_bytes=4 * MB, max_in_flight="ADMISSION_GET_RESPONSE_MAX_IN_FLIGHT"),
+    # Loads the stored uploads and runs the same pipeline
+    RoutePolicy("regrade", ("/getResponse/regrade/",), body_copies=0.0, base_bytes=64 * MB,
+                max_in_flight="ADMISSION_GET_RESPONSE_MAX_IN_FLIGHT"),
+    RoutePolicy("files_to_text", ("/inputToText/",), body_copies=2.0, base_bytes=1 * MB, per_file_bytes=4 * MB),
+    RoutePolicy("batch", ("/batch/",), body_copies=3.0, base_bytes=4 * MB),
+    RoutePolicy("default", ("",), body_copies=2.0, base_bytes=256 * 1024),
+)
+
+# Never admission-controlled: health checks, metrics and docs must answer under load
+EXEMPT_PREFIXES = ("/health", "/metrics/", "/profiles/", "/docs", "/redoc", "/openapi.json")
+
+def policy_for(path: str) -> Optional[RoutePolicy]:
+    """The policy for a request path, or None when the path is exempt."""
+    if path == "/":
+        return None
+    if path.startswith(settings.API_V1_STR):
+        path = path[len(settings.API_V1_STR):]
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    for policy in ROUTE_POLICIES:
+        if path.startswith(policy.prefixes):
+            return policy
+    return None
+
+class AdmissionRejected(Exception):
+    def __init__(self, route: str, reason: str, retry_after: float):
+        super().__init__(f"Server is busy ({reason}); retry in {retry_after:.0f}s")
+        self.route = route
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Ticket:
+    """An admitted request's reservation."""
+
+    def __init__(self, policy: RoutePolicy, reserved_bytes: int):
+        self.policy = policy
+        self.reserved_bytes = reserved_bytes
+
+class _RouteStats:
+    def __init__(self):
+        self.in_flight = 0
+        self.reserved_bytes = 0
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.rejected_total = 0
+        self.avg_duration = 0.0
+
+class AdmissionController:
+    """
+    Caps in-flight requests and their estimated memory.
+
+    Each request reserves an estimate of the memory it will hold, from its
+    route, Content-Length and the files found while its body streams in.
+    A request that would exceed ADMISSION_MEMORY_BUDGET_MB, the global or its
+    route's in-flight limit waits in a bounded queue for up to
+    ADMISSION_QUEUE_TIMEOUT seconds, then is rejected with a Retry-After
+    derived from how long requests on the route usually take. A request is
+    always admitted when nothing else is in flight, so one oversized upload
+    is slow rather than impossible.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.reserved_bytes = 0
+        self.queued = 0
+        self._routes: Dict[str, _RouteStats] = {}
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def memory_budget(self) -> int:
+        return settings.ADMISSION_MEMORY_BUDGET_MB * MB
+
+    def _route(self, name: str) -> _RouteStats:
+        if name not in self._routes:
+            self._routes[name] = _RouteStats()
+        return self._routes[name]
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _blocked_by(self, policy: RoutePolicy, estimate: int) -> Optional[str]:
+        """Why the request cannot start now, or None if it can."""
+        if self.in_flight == 0:
+            return None
+        if self.in_flight >= settings.ADMISSION_MAX_IN_FLIGHT:
+            return "too many requests in flight"
+        if policy.max_in_flight and self._route(policy.name).in_flight >= getattr(settings, policy.max_in_flight):
+            return f"too many {policy.name} requests in flight"
+        if self.reserved_bytes + estimate > self.memory_budget:
+            return "memory budget exhausted"
+        return None
+
+    def _retry_after(self, policy: RoutePolicy) -> float:
+        duration = self._route(policy.name).avg_duration
+        return max(1.0, duration) if duration else settings.ADMISSION_DEFAULT_RETRY_AFTER
+
+    def _reserve(self, policy: RoutePolicy, estimate: int) -> Ticket:
+        route = self._route(policy.name)
+        self.in_flight += 1
+        self.reserved_bytes += estimate
+        route.in_flight += 1
+        route.reserved_bytes += estimate
+        route.admitted_total += 1
+        return Ticket(policy, estimate)
+
+    def _reject(self, policy: RoutePolicy, reason: str) -> AdmissionRejected:
+        self._route(policy.name).rejected_total += 1
+        logger.warning(f"Rejected {policy.name} request: {reason}")
+        return AdmissionRejected(policy.name, reason, self._retry_after(policy))
+
+    async def admit(self, policy: RoutePolicy, estimate: int) -> Ticket:
+        """Reserve capacity for a request, waiting in the queue if needed; raises AdmissionRejected."""
+        reason = self._blocked_by(policy, estimate)
+        if reason is None and self.queued == 0:
+            return self._reserve(policy, estimate)
+        if self.queued >= settings.ADMISSION_MAX_QUEUE:
+            raise self._reject(policy, reason or "queue full")
+
+        condition = self._get_condition()
+        self.queued += 1
+        self._route(policy.name).queued_total += 1
+        try:
+            async with condition:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self._blocked_by(policy, estimate) is None),
+                    timeout=settings.ADMISSION_QUEUE_TIMEOUT
+                )
+                return self._reserve(policy, estimate)
+        except asyncio.TimeoutError:
+            raise self._reject(policy, self._blocked_by(policy, estimate) or "queue timeout")
+        finally:
+            self.queued -= 1
+
+    def grow(self, ticket: Ticket, extra: int) -> None:
+        """Add to an admitted request's reservation, e.g. for files found in its body."""
+        ticket.reserved_bytes += extra
+        self.reserved_bytes += extra
+        self._route(ticket.policy.name).reserved_bytes += extra
+
+    async def release(self, ticket: Ticket, duration: float) -> None:
+        route = self._route(ticket.policy.name)
+        self.in_flight -= 1
+        self.reserved_bytes -= ticket.reserved_bytes
+        route.in_flight -= 1
+        route.reserved_bytes -= ticket.reserved_bytes
+        route.avg_duration = duration if not route.avg_duration else 0.8 * route.avg_duration + 0.2 * duration
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    def pressure(self) -> Dict[str, Any]:
+        memory = self.reserved_bytes / self.memory_budget if self.memory_budget else 0.0
+        slots = self.in_flight / settings.ADMISSION_MAX_IN_FLIGHT
+        utilisation = max(memory, slots)
+        if self.queued or utilisation >= 1.0:
+            status = "saturated"
+        elif utilisation >= settings.ADMISSION_BUSY_THRESHOLD:
+            status = "busy"
+        else:
+            status = "ok"
+        return {
+            "status": status,
+            "in_flight": self.in_flight,
+            "max_in_flight": settings.ADMISSION_MAX_IN_FLIGHT,
+            "queued": self.queued,
+            "reserved_mb": round(self.reserved_bytes / MB, 1),
+            "memory_budget_mb": settings.ADMISSION_MEMORY_BUDGET_MB,
+            "utilisation": round(utilisation, 3),
+            "routes": {
+                name: {
+                    "in_flight": route.in_flight,
+                    "reserved_mb": round(route.reserved_bytes / MB, 1),
+                    "admitted_total": route.admitted_total,
+                    "queued_total": route.queued_total,
+                    "rejected_total": route.rejected_total,
+                    "avg_duration": round(route.avg_duration, 3),
+                }
+                for name, route in self._routes.items()
+            },
+        }
+
+admission = AdmissionController()
+
+class AdmissionMiddleware:
+    """
+    Admit, queue or reject each request before it reaches the app.
+
+    Rejections are 503s with Retry-After. Multipart file parts are counted
+    as the body streams in and added to the request's reservation.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.ADMISSION_CONTROL_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        policy = policy_for(scope["path"])
+        headers = Headers(scope=scope)
+        internal = headers.get(INTERNAL_CALL_HEADER)
+        if policy is None or (internal is not None and secrets.compare_digest(internal, INTERNAL_CALL_TOKEN)):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = headers.get("content-length")
+        estimate = policy.estimate(int(content_length) if content_length and content_length.isdigit() else None)
+        try:
+            ticket = await self.controller.admit(policy, estimate)
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": str(e), "route": e.route},
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+            await response(scope, receive, send)
+            return
+
+        tail = b""
+
+        async def receive_counting_files() -> Message:
+            nonlocal tail
+            message = await receive()
+            if policy.per_file_bytes and message["type"] == "http.request":
+                # Keep the end of the previous chunk so a marker split across chunks is still found
+                chunk = tail + message.get("body", b"")
+                files = chunk.count(FILENAME_MARKER)
+                tail = chunk[-(len(FILENAME_MARKER) - 1):]
+                if files:
+                    self.controller.grow(ticket, files * policy.per_file_bytes)
+            return message
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await self.app(scope, receive_counting_files, send)
+        finally:
+            await self.controller.release(ticket, loop.time() - start)
@@ -0,0 +1,49 @@
+import json
+from typing import Any, Dict, Optional
+from app.core.logging import setup_logger
+
+logger = setup_logger("algorithm_documents")
+
+# Fields a parsed algorithm document provides
+ALGORITHM_FIELDS = ("question", "pseudocode")
+
+def parse_algorithm_document(doc: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a stored `algorithms` document into {"question", "pseudocode"}.
+
+    Documents are JSON objects; older ones use an "Algorithm:/Summary:/Description:"
+    text format. Returns None if the document matches neither.
+    """
+    try:
+        # First try to parse as JSON
+        doc_data = json.loads(doc)
+        return {
+            "question": doc_data.get("question", ""),
+            "pseudocode": doc_data.get("pseudocode", "")
+        }
+    except json.JSONDecodeError:
+        pass
+
+    # Try to extract information from text format if it's not valid JSON
+    try:
+        if doc.startswith("Algorithm:"):
+            algorithm_name = ""
+            question = ""
+            description = ""
+
+            for line in doc.split("\n"):
+                if line.startswith("Algorithm:"):
+                    algorithm_name = line.replace("Algorithm:", "").strip()
+                elif line.startswith("Summary:"):
+                    question = line.replace("Summary:", "").strip()
+                elif line.startswith("Description:"):
+                    description = line.replace("Description:", "").strip()
+
+            if algorithm_name and (question or description):
+                return {
+                    "question": question or algorithm_name,
+                    "pseudocode": description or ""
+                }
+    except Exception as ex:
+        logger.error(f"Failed to parse document in alternative format: {ex}")
+    return None
@@ -1,36 +1,223 @@
+import asyncio
+import os
+import time
 import chromadb
-from typing import Any, List, cast
-import json
-from app.core.config import settings, COHERE_CLIENT
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, cast
+from app.core.config import settings
 from app.core.logging import setup_logger
+from app.core.algorithm_documents import parse_algorithm_document, ALGORITHM_FIELDS
+from app.core.vector_index import InMemoryVectorIndex
+from app.core.lexical_index import LexicalIndex
+from app.core.embeddings import get_embedding_provider, SEARCH_QUERY
+from app.core.single_flight import single_flight, request_key
+from app.core.shared_cache import cached
+from app.core.submissions import register_version
 
 logger = setup_logger("chroma_middleware")
 
+embedding_flight = single_flight("cohere_embed")
+
+# Collection metadata key naming the model its embeddings came from
+EMBEDDING_MODEL_METADATA = "embedding_model"
+
+def corpus_fingerprint(path: str) -> str:
+    """Fingerprint of the files under a Chroma directory; changes whenever the corpus is rewritten."""
+    entries = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            full = os.path.join(root, name)
+            try:
+                stat = os.stat(full)
+            except FileNotFoundError:
+                continue
+            entries.append((os.path.relpath(full, path), stat.st_size, stat.st_mtime_ns))
+    return request_key(*sorted(entries))[:16]
+
+class CorpusReloadError(Exception):
+    """The new corpus could not be loaded; the current one stays in service."""
+
+class RetrievalError(Exception):
+    """The similarity search failed, as opposed to finding no similar algorithms."""
+
+@dataclass
+class CorpusSnapshot:
+    """
+    One loaded version of the algorithms collection and the indexes built from it.
+
+    Never mutated after loading: a reload builds a new snapshot and swaps the
+    reference, and each search keeps the snapshot it started with.
+    """
+    version: int
+    path: str
+    fingerprint: str
+    loaded_at: float
+    load_seconds: float
+    client: Any
+    collection: Any
+    total_solutions: int
+    embedding_model: str
+    index: Optional[InMemoryVectorIndex] = None
+    lexical_index: Optional[LexicalIndex] = None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3),
+            "total_solutions": self.total_solutions,
+            "embedding_model": self.embedding_model,
+        }
+
+def load_snapshot(path: str, version: int, fingerprint: Optional[str] = None) -> CorpusSnapshot:
+    """Open the collection at `path` and build its in-memory indexes (blocking)."""
+    start = time.perf_counter()
+    fingerprint = fingerprint or corpus_fingerprint(path)
+    if version > 1:
+        # Chroma shares one system per path within a process; drop the cached
+        # one so the rewritten files are read. Clients already handed out keep working.
+        SharedSystemClient.clear_system_cache()
+    client = chromadb.PersistentClient(path=path)
+    collection = client.get_or_create_collection(
+        name="algorithms",
+        metadata={"hnsw:space": "cosine"}
+    )
+    logger.info(f"Connected to ChromaDB collection: {collection.name} (corpus version {version})")
+
+    # Collections built before tools/reembed.py have no model recorded and hold Cohere vectors
+    embedding_model = (collection.metadata or {}).get(EMBEDDING_MODEL_METADATA, settings.COHERE_EMBEDDING_MODEL)
+    if embedding_model != get_embedding_provider().model_id:
+        logger.warning(
+            f"Corpus at {path} was embedded with {embedding_model} but the embedding provider is "
+            f"{get_embedding_provider().model_id}; serving lexical retrieval only until it is re-embedded"
+        )
+
+    # Optionally serve queries from an in-memory copy of the collection
+    index = None
+    if settings.RETRIEVAL_BACKEND == "memory":
+        index = InMemoryVectorIndex.from_collection(collection, quantize=settings.VECTOR_INDEX_QUANTIZE)
+
+    # Local BM25 index: zero-network first stage and fallback when embedding fails
+    lexical_index = LexicalIndex.from_collection(collection) if settings.LEXICAL_INDEX_ENABLED else None
+
+    return CorpusSnapshot(
+        version=version,
+        path=path,
+        fingerprint=fingerprint,
+        loaded_at=time.time(),
+        load_seconds=time.perf_counter() - start,
+        client=client,
+        collection=collection,
+        # The collection is read-only while serving, so count it once
+        total_solutions=collection.count(),
+        embedding_model=embedding_model,
+        index=index,
+        lexical_index=lexical_index,
+    )
+
 class ChromaMiddleware:
     def __init__(self):
         logger.info("Initializing ChromaMiddleware")
-        self.client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
-        self.collection = self.client.get_or_create_collection(
-            name="algorithms",
-            metadata={"hnsw:space": "cosine"}
-        )
-        logger.info(f"Connected to ChromaDB collection: {self.collection.name}")
+        self.snapshot = load_snapshot(settings.CHROMA_DB_PATH, version=1)
+        register_version("corpus", "chroma", self.snapshot.fingerprint)
+        self._reload_lock: Optional[asyncio.Lock] = None
         logger.info(f"Collection stats: {self.get_collection_stats()}")
 
+    @property
+    def collection(self):
+        return self.snapshot.collection
+
+    @property
+    def total_solutions(self) -> int:
+        return self.snapshot.total_solutions
+
+    async def reload(self, path: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
+        """
+        Load the corpus at `path` (default: the current one) and swap it in.
+
+        The new collection handle and indexes are built in a worker thread
+        while searches keep using the current snapshot; the swap is a single
+        reference assignment, and searches already running finish on the
+        version they started with. Unchanged files are not reloaded unless
+        `force` is set, and a corpus that comes up empty replacing a
+        non-empty one is refused (usually a copy still in progress).
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            current = self.snapshot
+            path = path or current.path
+            if not os.path.isdir(path):
+                raise CorpusReloadError(f"Corpus directory does not exist: {path}")
+
+            fingerprint = await asyncio.to_thread(corpus_fingerprint, path)
+            if not force and path == current.path and fingerprint == current.fingerprint:
+                return {"reloaded": False, **current.info()}
+
+            try:
+                snapshot = await asyncio.to_thread(load_snapshot, path, current.version + 1, fingerprint)
+            except Exception as e:
+                logger.error(f"Corpus reload from {path} failed: {str(e)}", exc_info=True)
+                raise CorpusReloadError(f"Failed to load corpus from {path}: {str(e)}")
+            if snapshot.total_solutions == 0 and current.total_solutions > 0 and not force:
+                raise CorpusReloadError(f"Corpus at {path} is empty; keeping version {current.version}")
+
+            self.snapshot = snapshot
+            register_version("corpus", "chroma", snapshot.fingerprint)
+            logger.info(
+                f"Corpus version {snapshot.version} in service: {snapshot.total_solutions} solutions "
+                f"(was {current.total_solutions}), loaded in {snapshot.load_seconds:.2f}s"
+            )
+            return {"reloaded": True, "previous_version": current.version, **snapshot.info()}
+
+    async def watch(self, interval: float) -> None:
+        """
+        Reload whenever the corpus files change.
+
+        A change is only acted on once the fingerprint has stayed the same for
+        one more interval, so a corpus being copied in is not loaded half-written.
+        """
+        logger.info(f"Watching {self.snapshot.path} for corpus changes every {interval}s")
+        pending: Optional[str] = None
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                fingerprint = await asyncio.to_thread(corpus_fingerprint, self.snapshot.path)
+                if fingerprint == self.snapshot.fingerprint:
+                    pending = None
+                elif fingerprint != pending:
+                    pending = fingerprint
+                else:
+                    pending = None
+                    await self.reload()
+            except Exception as e:
+                logger.error(f"Corpus watcher failed: {str(e)}")
+
     async def _generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding using Cohere API"""
+        """Generate the query embedding with the configured provider"""
         logger.debug(f"Generating embedding for text: {text[:100]}...")
+        provider = get_embedding_provider()
         try:
-            response = await COHERE_CLIENT.embed(
-                texts=[text],
-                model=settings.COHERE_EMBEDDING_MODEL,
-                input_type="search_query",
-                embedding_types=["float"]
-            )
-            
-            if hasattr(response, "embeddings") and response.embeddings:
-                first_embedding = response.embeddings.float_[0]
-                return first_embedding
+            async def embed():
+                return (await provider.embed([text], SEARCH_QUERY))[0]
+
+            async def lookup():
+                if not provider.shared_cache:
+                    return await embed()
+                # Replicas share provider embeddings through the shared cache
+                embedding, _ = await cached("cohere_embed", key, embed)
+                return embedding
+
+            # Concurrent lookups for the same question share one embedding call
+            key = request_key(provider.model_id, SEARCH_QUERY, text)
+            embedding = await embedding_flight.do(key, lookup)
+
+            if embedding:
+                return embedding
             else:
                 logger.error("Could not extract embedding from response")
                 return []
@@ -38,83 +225,188 @@ class ChromaMiddleware:
             logger.error(f"Embedding generation failed: {e}")
             return []
 
-    async def find_algorithms_by_question(self, question: str, n_results: int = 5) -> list[dict[str, Any]]:
-        """Find algorithms by question"""
+    async def _embed_question(self, question: str) -> List[float]:
+        """Question embedding, or [] if the provider fails or is slower than EMBEDDING_TIMEOUT."""
+        try:
+            return await asyncio.wait_for(self._generate_embedding(question), timeout=settings.EMBEDDING_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Embedding timed out after {settings.EMBEDDING_TIMEOUT}s; using lexical retrieval only")
+            return []
+
+    def _vector_scores(self, snapshot: CorpusSnapshot, embedding: List[float], n_candidates: int) -> Dict[str, float]:
+        """Top n_candidates stored ids by cosine similarity."""
+        if snapshot.index is not None:
+            return {
+                snapshot.index.ids[row]: similarity
+                for row, similarity in snapshot.index.search([embedding], n_candidates)[0]
+            }
+
+        # Rank on distances only; documents are fetched later for the survivors
+        results = snapshot.collection.query(
+            query_embeddings=[embedding],
+            n_results=n_candidates,
+            include=["distances"]
+        )
+        ids = (results.get('ids') or [[]])[0]
+        distances = (results.get('distances') or [[]])[0]
+        return {id_: 1 - distance for id_, distance in zip(ids, distances)}
+
+    def _fill_vector_scores(
+        self, snapshot: CorpusSnapshot, embedding: List[float], vector: Dict[str, float], ids: List[str]
+    ) -> Dict[str, float]:
+        """Cosine similarity for lexical candidates outside the vector top list."""
+        missing = [id_ for id_ in ids if id_ not in vector]
+        if not missing:
+            return vector
+        if snapshot.index is not None:
+            return {**vector, **snapshot.index.similarities_for(embedding, missing)}
+        # HNSW only returns its top list; score the rest exactly from their stored embeddings
+        fetched = snapshot.collection.get(ids=missing, include=["embeddings"])
+        embeddings = fetched.get("embeddings")
+        scores = {id_: 0.0 for id_ in missing}
+        if embeddings is not None and len(embeddings):
+            stored = np.asarray(embeddings, dtype=np.float32)
+            stored = stored / np.maximum(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12)
+            query = np.asarray(embedding, dtype=np.float32)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+            scores.update({id_: float(score) for id_, score in zip(fetched.get("ids") or [], stored @ query)})
+        return {**vector, **scores}
+
+    def _fetch_documents(self, snapshot: CorpusSnapshot, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Parsed documents for the given ids."""
+        if snapshot.index is not None:
+            documents = {id_: snapshot.index.document(id_) for id_ in ids}
+        else:
+            fetched = snapshot.collection.get(ids=ids, include=["documents"])
+            documents = {
+                id_: parse_algorithm_document(doc or "")
+                for id_, doc in zip(fetched.get('ids') or [], fetched.get('documents') or [])
+            }
+        return {id_: doc for id_, doc in documents.items() if doc is not None}
+
+    async def find_algorithms_by_question(
+        self,
+        question: str,
+        n_results: int = 5,
+        min_similarity: Optional[float] = None,
+        include: Sequence[str] = ALGORITHM_FIELDS,
+    ) -> list[dict[str, Any]]:
+        """
+        Find algorithms by question
+
+        With the lexical index enabled, BM25 candidates are found locally while
+        the question is embedded. When the embedding arrives within
+        EMBEDDING_TIMEOUT the two scores are fused as
+        HYBRID_VECTOR_WEIGHT * cosine + (1 - HYBRID_VECTOR_WEIGHT) * lexical
+        for ranking, while min_similarity still applies to the cosine
+        similarity it is calibrated for; otherwise the lexical similarity is
+        used on its own and a requested min_similarity is replaced by
+        LEXICAL_FALLBACK_THRESHOLD.
+
+        Args:
+            question: The question to match
+            n_results: Maximum number of algorithms to return
+            min_similarity: Drop matches below this similarity before their documents are fetched
+            include: Document fields to return besides "id" and the scores
+
+        Returns:
+            Matching algorithms, most similar first
+
+        Raises:
+            RetrievalError: If the search itself failed
+        """
         logger.info(f"Searching for algorithms matching question: {question[:100]}...")
+        unknown = set(include) - set(ALGORITHM_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown include fields: {sorted(unknown)}")
+
+        # Stay on one corpus version for the whole search, even if a reload swaps it meanwhile
+        snapshot = self.snapshot
+        lexical_index = snapshot.lexical_index
+        if snapshot.total_solutions == 0:
+            logger.info("Collection is empty; skipping similarity search")
+            return []
+
         try:
-            question_embedding = await self._generate_embedding(question)
-            if not question_embedding:
-                logger.error("Failed to generate question embedding")
-                return []
-                
-            results = self.collection.query(
-                query_embeddings=[question_embedding],
-                n_results=n_results
-            )
-            
-            if not results:
-                logger.warning("No results found in ChromaDB")
-                return []
-                
-            documents = results.get('documents', [[]])
-            distances = results.get('distances', [[]])
-            
-            if not documents or not documents[0]:
-                logger.warning("No documents found in results")
+            n_candidates = n_results * settings.HYBRID_CANDIDATE_MULTIPLIER if lexical_index else n_results
+            # Query vectors from another model would be meaningless against this corpus
+            embedding_task = None
+            if snapshot.embedding_model == get_embedding_provider().model_id:
+                embedding_task = asyncio.ensure_future(self._embed_question(question))
+            lexical = lexical_index.search(question, n_candidates) if lexical_index else {}
+            question_embedding = await embedding_task if embedding_task else []
+
+            vector = self._vector_scores(snapshot, question_embedding, n_candidates) if question_embedding else {}
+            if not vector and not lexical:
+                # The corpus is not empty, so neither retrieval path worked
+                raise RetrievalError("No query embedding and no lexical candidates for question")
+
+            if lexical_index is None:
+                scores = {id_: {"similarity": cosine} for id_, cosine in vector.items()}
+            elif not vector:
+                scores = {id_: {"similarity": lex, "lexical_similarity": lex} for id_, lex in lexical.items()}
+                # Lexical coverage runs lower than cosine, so it has its own cut-off
+                if min_similarity is not None:
+                    min_similarity = settings.LEXICAL_FALLBACK_THRESHOLD
+            else:
+                candidates = list(vector.keys() | lexical.keys())
+                vector = self._fill_vector_scores(snapshot, question_embedding, vector, candidates)
+                lexical = {**lexical_index.similarities(question, [id_ for id_ in candidates if id_ not in lexical]), **lexical}
+                weight = settings.HYBRID_VECTOR_WEIGHT
+                scores = {
+                    id_: {
+                        "similarity": weight * vector[id_] + (1 - weight) * lexical[id_],
+                        "vector_similarity": vector[id_],
+                        "lexical_similarity": lexical[id_]
+                    }
+                    for id_ in candidates
+                }
+
+            ranked = sorted(scores.items(), key=lambda item: item[1]["similarity"], reverse=True)
+            # The threshold is calibrated for cosine similarity, so a fused score
+            # only ranks; lexical coverage would otherwise raise the cut-off
+            matches = [
+                (id_, score) for id_, score in ranked
+                if min_similarity is None or score.get("vector_similarity", score["similarity"]) >= min_similarity
+            ][:n_results]
+            if not matches:
+                logger.info("No algorithms above the similarity threshold")
                 return []
-                
+
+            documents = self._fetch_documents(snapshot, [id_ for id_, _ in matches]) if include else {}
+
             algorithms = []
-            for i, doc in enumerate(documents[0]):
-                try:
-                    # First try to parse as JSON
-                    doc_data = json.loads(doc)
-                    algorithms.append({
-                        "question": doc_data.get("question", ""),
-                        "pseudocode": doc_data.get("pseudocode", ""),
-                        "similarity": 1 - distances[0][i] if distances and distances[0] and i < len(distances[0]) else 0.0
-                    })
-                except json.JSONDecodeError as e:
-                    # logger.error(f"Failed to parse document as JSON: {e}")
-                    # logger.error(f"Document: {doc}")
-                    
-                    # Try to extract information from text format if it's not valid JSON
-                    try:
-                        # Try to parse text format as a fallback
-                        if doc.startswith("Algorithm:"):
-                            lines = doc.split("\n")
-                            algorithm_name = ""
-                            question = ""
-                            description = ""
-                            
-                            for j, line in enumerate(lines):
-                                if line.startswith("Algorithm:"):
-                                    algorithm_name = line.replace("Algorithm:", "").strip()
-                                elif line.startswith("Summary:"):
-                                    question = line.replace("Summary:", "").strip()
-                                elif line.startswith("Description:"):
-                                    description = line.replace("Description:", "").strip()
-                                    
-                            if algorithm_name and (question or description):
-                                algorithms.append({
-                                    "question": question or algorithm_name,
-                                    "pseudocode": description or "",
-                                    "similarity": 1 - distances[0][i] if distances and distances[0] and i < len(distances[0]) else 0.0
-                                })
-                    except Exception as ex:
-                        logger.error(f"Failed to parse document in alternative format: {ex}")
+            for id_, score in matches:
+                if include:
+                    doc_data = documents.get(id_)
+                    if doc_data is None:
                         continue
-            
-            logger.info(f"Found {len(algorithms)} matching algorithms")
+                    fields = {field: doc_data[field] for field in include}
+                else:
+                    fields = {}
+                algorithms.append({"id": id_, **fields, **score})
+
+            logger.info(f"Found {len(algorithms)} matching algorithms ({'hybrid' if vector and lexical else 'vector' if vector else 'lexical'})")
             return algorithms
+        except RetrievalError:
+            logger.error("Similarity search found no usable candidates")
+            raise
         except Exception as e:
             logger.error(f"Error finding algorithms by question: {str(e)}", exc_info=True)
-            return []
+            raise RetrievalError(f"Similarity search failed: {str(e)}") from e
 
     def get_collection_stats(self) -> dict[str, Any]:
         """Get statistics about the collection"""
+        snapshot = self.snapshot
         stats = {
-            "total_solutions": self.collection.count(),
-            "collection_name": self.collection.name
+            "total_solutions": snapshot.total_solutions,
+            "collection_name": snapshot.collection.name,
+            "retrieval_backend": settings.RETRIEVAL_BACKEND,
+            "corpus_version": snapshot.version,
+            "corpus_path": snapshot.path,
+            "loaded_at": snapshot.loaded_at,
+            "embedding_model": snapshot.embedding_model,
+            "embedding_provider": get_embedding_provider().stats()
         }
         logger.info(f"Collection stats: {stats}")
         return stats 
\ No newline at end of file
@@ -0,0 +1,156 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import setup_logger
+
+logger = setup_logger("circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} is unavailable (circuit open); retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Whether an error says something about the provider's health.
+
+    Timeouts, connection errors and 5xx count; 4xx responses are the
+    caller's fault and 429s are handled by the rate limiter.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return not (isinstance(status, int) and 400 <= status < 500)
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker over a sliding window of recent calls.
+
+    The circuit opens when, over the last `window` calls (at least
+    `min_calls`), the failure rate or the share of calls slower than
+    `slow_call_seconds` reaches its threshold. While open every call fails
+    immediately with CircuitOpenError. After `open_seconds` the circuit goes
+    half-open and lets `half_open_calls` probes through: a healthy probe
+    closes it, a failed or slow one opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        failure_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        half_open_calls: Optional[int] = None,
+    ):
+        self.name = name
+        self.window = window or settings.CIRCUIT_BREAKER_WINDOW
+        self.min_calls = min_calls or settings.CIRCUIT_BREAKER_MIN_CALLS
+        self.failure_rate = failure_rate or settings.CIRCUIT_BREAKER_FAILURE_RATE
+        self.slow_call_seconds = slow_call_seconds or settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS
+        self.slow_call_rate = slow_call_rate or settings.CIRCUIT_BREAKER_SLOW_CALL_RATE
+        self.open_seconds = open_seconds or settings.CIRCUIT_BREAKER_OPEN_SECONDS
+        self.half_open_calls = half_open_calls or settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS
+
+        self.state = CLOSED
+        self.opened_until = 0.0
+        self.probes_in_flight = 0
+        self.trips_total = 0
+        self.rejected_total = 0
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=self.window)  # (failed, slow)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and time.monotonic() < self.opened_until
+
+    def allow(self) -> bool:
+        """
+        Admit a call or raise CircuitOpenError.
+
+        Returns True when the call is a half-open probe; pass that flag back
+        to `record` or `abandon`.
+        """
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now < self.opened_until:
+                self.rejected_total += 1
+                raise CircuitOpenError(self.name, self.opened_until - now)
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+            logger.info(f"{self.name} circuit half-open; probing")
+
+        if self.state == HALF_OPEN:
+            if self.probes_in_flight >= self.half_open_calls:
+                self.rejected_total += 1
+                raise CircuitOpenError(self.name, 1.0)
+            self.probes_in_flight += 1
+            return True
+        return False
+
+    def record(self, probe: bool, failed: bool, latency: Optional[float] = None) -> None:
+        """Record a finished call. `latency` is None for calls that are long by design (streams)."""
+        slow = latency is not None and latency > self.slow_call_seconds
+        if probe:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self._close()
+            return
+        if self.state != CLOSED:
+            # Started before the circuit opened; the window was already reset
+            return
+
+        self._outcomes.append((failed, slow))
+        if len(self._outcomes) < self.min_calls:
+            return
+        failures = sum(1 for f, _ in self._outcomes if f) / len(self._outcomes)
+        slow_calls = sum(1 for _, s in self._outcomes if s) / len(self._outcomes)
+        if failures >= self.failure_rate or slow_calls >= self.slow_call_rate:
+            logger.warning(
+                f"{self.name} failure rate {failures:.0%}, slow-call rate {slow_calls:.0%} "
+                f"over the last {len(self._outcomes)} calls"
+            )
+            self._open()
+
+    def abandon(self, probe: bool) -> None:
+        """Forget a call that ended without saying anything about provider health."""
+        if probe:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_until = time.monotonic() + self.open_seconds
+        self.trips_total += 1
+        self._outcomes.clear()
+        logger.warning(f"{self.name} circuit opened for {self.open_seconds:.0f}s")
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._outcomes.clear()
+        logger.info(f"{self.name} circuit closed")
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        if state == OPEN and time.monotonic() >= self.opened_until:
+            state = HALF_OPEN
+        return {
+            "state": state,
+            "open_for_seconds": round(max(0.0, self.opened_until - time.monotonic()), 3) if state == OPEN else 0.0,
+            "window_calls": len(self._outcomes),
+            "window_failures": sum(1 for f, _ in self._outcomes if f),
+            "window_slow_calls": sum(1 for _, s in self._outcomes if s),
+            "trips_total": self.trips_total,
+            "rejected_total": self.rejected_total,
+        }
@@ -0,0 +1,26 @@
+import google.generativeai as genai
+import cohere
+from app.core.config import settings
+
+# Provider clients live apart from the settings so processes that never call
+# an LLM (sandbox workers, the state service) can load config without keys.
+
+# Validate required settings
+if not settings.GOOGLE_API_KEY:
+    raise ValueError("GOOGLE_API_KEY environment variable is not set")
+if not settings.COHERE_API_KEY:
+    raise ValueError("COHERE_API_KEY environment variable is not set")
+if not settings.GOOGLE_APPLICATION_CREDENTIALS:
+    raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set")
+
+# Configure Gemini API with defaults
+genai.configure(
+    api_key=settings.GOOGLE_API_KEY,
+    transport="rest"  # Force REST transport
+)
+
+# Initialize Gemini model
+GEMINI_MODEL = genai.GenerativeModel(settings.GEMINI_MODEL_NAME)
+
+# Configure Cohere API
+COHERE_CLIENT = cohere.AsyncClientV2(api_key=settings.COHERE_API_KEY, log_warning_experimental_features=False)
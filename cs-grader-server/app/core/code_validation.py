@@ -0,0 +1,173 @@
+import ast
+import builtins
+import sys
+from typing import List, Optional, Set
+from pydantic import BaseModel, Field
+
+# Modules importable inside the pytest sandbox besides the standard library
+SANDBOX_MODULES = frozenset({"main", "pytest", "_pytest", "pytest_jsonreport"})
+STAR_IMPORT = "from main import *"
+# Set on every module but not in builtins
+MODULE_ATTRIBUTES = frozenset({"__file__", "__name__", "__doc__", "__package__", "__spec__", "__loader__", "__cached__"})
+
+class ValidationIssue(BaseModel):
+    source: str = Field(..., description="'code' (main.py) or 'tests' (test_main.py)")
+    kind: str = Field(..., description="'syntax', 'import', 'discovery' or 'undefined_name'")
+    severity: str = Field(..., description="'error' breaks the whole run; 'warning' fails individual tests")
+    message: str
+    line: Optional[int] = None
+
+def _parse(source: str, text: str, filename: str, issues: List[ValidationIssue]) -> Optional[ast.Module]:
+    try:
+        tree = ast.parse(text, filename=filename)
+        compile(tree, filename, "exec")
+        return tree
+    except SyntaxError as e:
+        issues.append(ValidationIssue(
+            source=source, kind="syntax", severity="error",
+            message=f"{e.msg} ({filename}, line {e.lineno})", line=e.lineno
+        ))
+        return None
+
+def _check_imports(source: str, tree: ast.Module, issues: List[ValidationIssue]) -> None:
+    available = set(sys.stdlib_module_names) | SANDBOX_MODULES
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            if module.split(".")[0] not in available:
+                issues.append(ValidationIssue(
+                    source=source, kind="import", severity="error",
+                    message=f"Module '{module}' is not available in the test sandbox", line=node.lineno
+                ))
+
+def exported_names(tree: ast.Module) -> Set[str]:
+    """Names `from main import *` makes available: public module-level bindings."""
+    names: Set[str] = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names if alias.name != "*")
+        else:
+            for child in ast.walk(node):
+                if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                    names.add(child.id)
+    return {name for name in names if not name.startswith("_")}
+
+def _bound_names(tree: ast.Module) -> Set[str]:
+    """Every name bound anywhere in the module (a deliberately loose scope model)."""
+    names: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names if alias.name != "*")
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, ast.MatchAs) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchStar) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    return names
+
+def _has_star_import(tree: ast.Module) -> bool:
+    return any(
+        isinstance(node, ast.ImportFrom) and node.module == "main" and any(a.name == "*" for a in node.names)
+        for node in tree.body
+    )
+
+def _discovered_tests(tree: ast.Module) -> int:
+    """Number of tests pytest's default rules would collect from the module."""
+    count = 0
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            count += 1
+        elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            count += sum(
+                1 for item in node.body
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name.startswith("test")
+            )
+    return count
+
+def validate_generated_code(code: str, test_code: Optional[str]) -> List[ValidationIssue]:
+    """
+    Check generated code and tests without running them.
+
+    Compiles both files, checks that every import is available in the sandbox,
+    that the tests use `from main import *`, that pytest would collect at
+    least one test, and that names the tests use are defined by the tests,
+    main.py or builtins.
+    """
+    issues: List[ValidationIssue] = []
+
+    code_tree = _parse("code", code, "main.py", issues)
+    if code_tree is not None:
+        _check_imports("code", code_tree, issues)
+
+    if not test_code:
+        return issues
+
+    test_tree = _parse("tests", test_code, "test_main.py", issues)
+    if test_tree is None:
+        return issues
+    _check_imports("tests", test_tree, issues)
+
+    has_star_import = _has_star_import(test_tree)
+    if not has_star_import:
+        issues.append(ValidationIssue(
+            source="tests", kind="import", severity="warning",
+            message=f"Tests do not use '{STAR_IMPORT}'"
+        ))
+
+    if _discovered_tests(test_tree) == 0:
+        issues.append(ValidationIssue(
+            source="tests", kind="discovery", severity="error",
+            message="No test functions (test_*) or Test* classes were found"
+        ))
+
+    # Only check names when main.py parsed, otherwise everything from it looks undefined
+    if code_tree is not None:
+        known = _bound_names(test_tree) | set(dir(builtins)) | MODULE_ATTRIBUTES
+        if has_star_import:
+            known |= exported_names(code_tree)
+        reported: Set[str] = set()
+        for node in ast.walk(test_tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) \
+                    and node.id not in known and node.id not in reported:
+                reported.add(node.id)
+                issues.append(ValidationIssue(
+                    source="tests", kind="undefined_name", severity="warning",
+                    message=f"Name '{node.id}' is not defined in the tests or main.py", line=node.lineno
+                ))
+
+    return issues
+
+def validate_tests(code: Optional[str], test_code: str) -> List[ValidationIssue]:
+    """Issues with the tests alone; without code, names from main.py are not checked."""
+    issues = [issue for issue in validate_generated_code(code or "", test_code) if issue.source == "tests"]
+    if code is None:
+        issues = [issue for issue in issues if issue.kind != "undefined_name"]
+    return issues
+
+def has_errors(issues: List[ValidationIssue]) -> bool:
+    return any(issue.severity == "error" for issue in issues)
+
+def format_issues(issues: List[ValidationIssue]) -> str:
+    """Issues as prompt feedback, one per line."""
+    return "\n".join(
+        f"- {issue.message}" + (f" (line {issue.line})" if issue.line and "line" not in issue.message else "")
+        for issue in issues
+    )
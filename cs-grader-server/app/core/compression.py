@@ -0,0 +1,40 @@
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.logging import setup_logger
+
+logger = setup_logger("compression")
+
+try:
+    # Optional: Brotli for clients that accept it, gzip for the rest
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Streaming endpoints end in this suffix; compressing them would buffer events
+STREAMING_PATH_SUFFIX = "-stream"
+
+class CompressionMiddleware:
+    """
+    Compress response bodies of at least `minimum_size` bytes.
+
+    Uses Brotli when brotli-asgi is installed (falling back to gzip for
+    clients that don't accept br), otherwise gzip. NDJSON streaming routes
+    are passed through untouched so each event reaches the client as it
+    is produced.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, quality=4, minimum_size=minimum_size, gzip_fallback=True)
+            self.encoding = "br"
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+            self.encoding = "gzip"
+        logger.info(f"Compressing responses of {minimum_size}+ bytes with {self.encoding}")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].endswith(STREAMING_PATH_SUFFIX):
+            await self.app(scope, receive, send)
+            return
+        await self.compressed(scope, receive, send)
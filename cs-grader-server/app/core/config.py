@@ -1,7 +1,5 @@
 from dotenv import load_dotenv
 import os
-import google.generativeai as genai
-import cohere
 from pydantic_settings import BaseSettings
 from pathlib import Path
 
@@ -17,10 +15,12 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     COHERE_API_KEY: str = os.getenv("COHERE_API_KEY", "")
     GOOGLE_APPLICATION_CREDENTIALS: str = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")  # admin endpoints are disabled while empty
 
     # API Config
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "CS Grader API"
+    RESPONSE_COMPRESSION_MIN_SIZE: int = 1024  # bytes; smaller responses are sent uncompressed
 
     # Model Configurations
     GEMINI_MODEL_NAME: str = "models/gemini-1.5-flash"
@@ -29,29 +29,125 @@ class Settings(BaseSettings):
 
     # Database Configurations
     CHROMA_DB_PATH: str = os.path.join(config_dir, "chroma_db")
+    CORPUS_WATCH_INTERVAL: float = 0.0  # seconds between checks of CHROMA_DB_PATH for a new corpus; 0 disables
+    RETRIEVAL_BACKEND: str = "chroma"  # "chroma" (HNSW on disk) or "memory" (in-memory matrix)
+    VECTOR_INDEX_QUANTIZE: bool = False  # store the in-memory matrix as int8
+    LEXICAL_INDEX_ENABLED: bool = True  # BM25 index fused with vector scores, used alone if embedding fails
+    HYBRID_VECTOR_WEIGHT: float = 0.7  # weight of cosine similarity in the fused score
+    HYBRID_CANDIDATE_MULTIPLIER: int = 4  # candidates per requested result from each retriever
+    EMBEDDING_TIMEOUT: float = 2.0  # seconds to wait for the question embedding before going lexical-only
+    EMBEDDING_BACKEND: str = "cohere"  # "cohere" or "local" (sentence-transformers model on this host)
+    EMBEDDING_MODEL_PATH: str = ""  # local model directory (or hub name) for EMBEDDING_BACKEND=local
+    EMBEDDING_DEVICE: str = "cpu"
+    EMBEDDING_BATCH_SIZE: int = 32  # texts per local forward pass
+    EMBEDDING_BATCH_WAIT: float = 0.005  # seconds to gather concurrent queries into one local batch
+    EMBEDDING_WORKERS: int = 1  # threads running local inference
+    EMBEDDING_QUERY_PREFIX: str = ""  # prepended to queries, for models trained with e.g. "query: "
+    EMBEDDING_DOCUMENT_PREFIX: str = ""  # prepended to stored documents when re-embedding
+    LEXICAL_FALLBACK_THRESHOLD: float = 0.2  # minimum lexical similarity when no embedding is available
+
+    # Outbound API limits (requests per second and concurrent calls per provider)
+    GEMINI_RATE_LIMIT: float = 5.0
+    GEMINI_MAX_CONCURRENCY: int = 8
+    COHERE_CHAT_RATE_LIMIT: float = 5.0
+    COHERE_CHAT_MAX_CONCURRENCY: int = 8
+    COHERE_EMBED_RATE_LIMIT: float = 10.0
+    COHERE_EMBED_MAX_CONCURRENCY: int = 16
+    VISION_RATE_LIMIT: float = 10.0
+    VISION_MAX_CONCURRENCY: int = 16
+    SANDBOX_RATE_LIMIT: float = 10.0  # container runs started per second
+    SANDBOX_MAX_CONCURRENCY: int = 4
+    OUTBOUND_MAX_RETRIES: int = 3
+
+    # Request classes (X-Request-Class: interactive or batch)
+    INTERACTIVE_LANE_WEIGHT: int = 4  # grants per BATCH_LANE_WEIGHT batch grants when both lanes wait
+    BATCH_LANE_WEIGHT: int = 1
+    INTERACTIVE_QUEUE_LIMIT: int = 200  # waiters per provider before new calls are rejected
+    BATCH_QUEUE_LIMIT: int = 1000
+    BATCH_CONCURRENCY_SHARE: float = 0.5  # share of each provider's concurrency batch calls may hold
+
+    # Request profiling
+    PROFILE_SAMPLE_RATE: float = 0.0  # share of requests profiled without the X-Profile header
+    SLOW_REQUEST_THRESHOLD: float = 10.0  # seconds; slower requests are always stored
+    PROFILE_DIR: str = os.path.join("logs", "profiles")
+    PROFILE_MAX_FILES: int = 200  # oldest profiles are deleted beyond this
+
+    # Image pre-processing before OCR
+    IMAGE_MAX_SIDE: int = 1600  # pixels on the longest side; enough for handwriting OCR
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_PREPROCESS_WORKERS: int = 2  # processes in the pre-processing pool
+
+    # Test sandbox
+    SANDBOX_RUNNER_IMAGE: str = ""  # prebuilt runner image, pinned by digest (results are cached by this reference); built locally when empty
+    SANDBOX_TIMEOUT: float = 30.0  # seconds before a test container is killed
+    SANDBOX_MEMORY_LIMIT: str = "256m"
+    SANDBOX_CPU_LIMIT: float = 1.0
+    SANDBOX_PIDS_LIMIT: int = 64
+    SANDBOX_NETWORK_DISABLED: bool = True
+    SANDBOX_RESULT_CACHE: bool = True  # reuse results of identical code, tests, image and limits
+    SANDBOX_CACHE_MAX_TIMEOUT_SHARE: float = 0.5  # runs slower than this share of the timeout are not cached
+
+    # Sandbox workers (SANDBOX_EXECUTION=remote; jobs and heartbeats go through the shared state store)
+    SANDBOX_EXECUTION: str = "local"  # "local" (Docker on this host) or "remote" (python -m app.sandbox_worker)
+    SANDBOX_WORKER_CAPACITY: int = 4  # concurrent runs per worker
+    SANDBOX_WORKER_HEARTBEAT_INTERVAL: float = 2.0  # workers missing three heartbeats get no new jobs
+    SANDBOX_WORKER_POLL_INTERVAL: float = 0.1  # seconds between queue and result polls
+    SANDBOX_CLAIM_TIMEOUT: float = 5.0  # seconds before an unclaimed job may move to a less loaded worker
+    SANDBOX_QUEUE_TIMEOUT: float = 60.0  # seconds a job may wait for a worker before the request gets a 503
+    SANDBOX_JOB_TTL: float = 600.0  # seconds job records and events are kept
+
+    # Admission control (estimated memory and in-flight requests per process)
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_MEMORY_BUDGET_MB: int = 1024  # leave headroom below the container's memory limit
+    ADMISSION_MAX_IN_FLIGHT: int = 128
+    ADMISSION_GET_RESPONSE_MAX_IN_FLIGHT: int = 8  # full grading requests (and regrades) at once
+    ADMISSION_MAX_QUEUE: int = 64  # requests waiting for capacity before new ones are rejected
+    ADMISSION_QUEUE_TIMEOUT: float = 10.0  # seconds a request may wait for capacity
+    ADMISSION_UNKNOWN_BODY_BYTES: int = 20 * 1024 * 1024  # assumed body size without Content-Length
+    ADMISSION_DEFAULT_RETRY_AFTER: float = 5.0  # seconds, until a route has a typical duration
+    ADMISSION_BUSY_THRESHOLD: float = 0.8  # utilisation reported as "busy" by /health
+
+    # Shared state (caches, job records and locks shared between replicas)
+    STATE_BACKEND: str = "sqlite"  # "sqlite" (one host), "http" (state service) or "none"
+    STATE_DB_PATH: str = os.path.join(config_dir, "state", "state.db")
+    STATE_SERVICE_URL: str = "http://localhost:8100"
+    STATE_SERVICE_TIMEOUT: float = 2.0
+    STATE_SERVICE_TOKEN: str = os.getenv("STATE_SERVICE_TOKEN", "")  # shared secret; the state service refuses requests while empty
+    STATE_PURGE_INTERVAL: float = 600.0  # seconds between sweeps of expired entries and locks; 0 disables
+    CACHE_TTL_SECONDS: float = 7 * 24 * 3600.0
+    CACHE_LOCK_TTL: float = 180.0  # seconds a replica may hold a key while computing it
+    CACHE_LOCK_WAIT: float = 130.0  # seconds to wait for another replica's result before computing it here
+    CACHE_POLL_INTERVAL: float = 0.25
+
+    # Submission records (stage inputs, outputs and fingerprints, for incremental regrades)
+    SUBMISSION_RECORDS_ENABLED: bool = True
+    SUBMISSION_STORE_FILES: bool = True  # keep uploads so OCR can be redone when it changes
+    SUBMISSION_RETENTION_DAYS: float = 30.0  # records and uploads expire this long after the last (re)grade; 0 keeps them
+
+    # Circuit breakers (per provider, over a sliding window of recent calls)
+    CIRCUIT_BREAKER_WINDOW: int = 20
+    CIRCUIT_BREAKER_MIN_CALLS: int = 5  # calls in the window before the circuit can trip
+    CIRCUIT_BREAKER_FAILURE_RATE: float = 0.5
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS: float = 30.0
+    CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 0.5
+    CIRCUIT_BREAKER_OPEN_SECONDS: float = 30.0  # how long calls fail fast before a half-open probe
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS: int = 1
+
+    # Grading pipeline
+    SIMILARITY_THRESHOLD: float = 0.4  # minimum cosine similarity for a stored algorithm to be used as context
+    SIMILARITY_STAGE_TIMEOUT: float = 5.0  # seconds before evaluation proceeds without similar solutions
+    LLM_STAGE_TIMEOUT: float = 120.0  # seconds for code generation or evaluation before returning without it
+    BATCH_MAX_CONCURRENCY: int = 4  # equivalence classes graded at once by /batch/grade
+
+    # Prompt token budgets (estimated tokens)
+    PROMPT_TOKEN_BUDGET: int = 6000  # question + pseudocode
+    SIMILAR_ALGORITHMS_TOKEN_BUDGET: int = 1500
+    MIN_SIMILAR_ALGORITHM_TOKENS: int = 64  # don't include a similar algorithm trimmed below this
+    GEMINI_MIN_OUTPUT_TOKENS: int = 1000
+    GEMINI_MAX_OUTPUT_TOKENS: int = 4096
 
     class Config:
         case_sensitive = True
 
 # Create settings instance
 settings = Settings()
-
-# Validate required settings
-if not settings.GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY environment variable is not set")
-if not settings.COHERE_API_KEY:
-    raise ValueError("COHERE_API_KEY environment variable is not set")
-if not settings.GOOGLE_APPLICATION_CREDENTIALS:
-    raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set")
-
-# Configure Gemini API with defaults
-genai.configure(
-    api_key=settings.GOOGLE_API_KEY,
-    transport="rest"  # Force REST transport
-)
-
-# Initialize Gemini model
-GEMINI_MODEL = genai.GenerativeModel(settings.GEMINI_MODEL_NAME)
-
-# Configure Cohere API
-COHERE_CLIENT = cohere.AsyncClientV2(api_key=settings.COHERE_API_KEY, log_warning_experimental_features=False)
\ No newline at end of file
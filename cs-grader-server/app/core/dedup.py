@@ -0,0 +1,211 @@
+import hashlib
+import random
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+# Words that carry pseudocode structure and are never renamed
+PSEUDOCODE_KEYWORDS = frozenset("""
+    and array begin break call case continue def define do each else elif end endfor endif endwhile
+    false for from function if in input is let not null none of or output print procedure repeat
+    return set step then to true until var while
+""".split())
+
+# Keywords after which the next identifier is a newly bound name
+BINDING_KEYWORDS = frozenset({"for", "each", "let", "set", "var", "input"})
+DEFINITION_KEYWORDS = frozenset({"def", "define", "function", "procedure"})
+ASSIGNMENT_OPERATORS = frozenset({"=", "<-", ":="})
+AUGMENTED_OPERATORS = frozenset("+-*/%")
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?|\"[^\"]*\"|'[^']*'|==|!=|<=|>=|<-|->|:=|\S")
+COMMENT_PATTERN = re.compile(r"(#|//).*$", re.MULTILINE)
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+MERSENNE_PRIME = (1 << 61) - 1
+
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+def _is_identifier(token: str) -> bool:
+    return (token[0].isalpha() or token[0] == "_") and token not in PSEUDOCODE_KEYWORDS
+
+def bound_names(lines: Sequence[Sequence[str]]) -> Set[str]:
+    """
+    Names the pseudocode binds itself: assignment targets, loop variables,
+    and defined functions with their parameters.
+
+    Everything else (called helpers such as max or len, and attributes) is
+    left alone, since renaming it would make different programs look equal.
+    """
+    bound: Set[str] = set()
+    for tokens in lines:
+        for i, token in enumerate(tokens):
+            if token in ASSIGNMENT_OPERATORS:
+                # `a, b = ...`, `then x <- ...`, `total += ...`; not `arr[i] = ...` or `obj.x = ...`
+                end = i - 1 if i and tokens[i - 1] in AUGMENTED_OPERATORS else i
+                start = end
+                while start and (_is_identifier(tokens[start - 1]) or tokens[start - 1] == ","):
+                    start -= 1
+                if start == 0 or tokens[start - 1] in PSEUDOCODE_KEYWORDS or tokens[start - 1] == ":":
+                    bound.update(t for t in tokens[start:end] if t != ",")
+            elif token in BINDING_KEYWORDS:
+                # `for i in`, `for each item in`, `for i, j in`, `set x to`
+                for name in tokens[i + 1:]:
+                    if name == "," or name == "each":
+                        continue
+                    if not _is_identifier(name):
+                        break
+                    bound.add(name)
+            elif token in DEFINITION_KEYWORDS and i + 1 < len(tokens) and _is_identifier(tokens[i + 1]):
+                bound.add(tokens[i + 1])
+                if i + 2 < len(tokens) and tokens[i + 2] == "(":
+                    for name in tokens[i + 3:]:
+                        if name == ")":
+                            break
+                        if _is_identifier(name):
+                            bound.add(name)
+    return bound
+
+def normalize_tokens(text: str) -> List[str]:
+    """
+    Tokenize pseudocode with comments removed, case folded and bound names
+    renamed by order of first appearance, so a copy with renamed variables
+    normalises to the same tokens.
+    """
+    text = COMMENT_PATTERN.sub("", text).lower()
+    lines = [TOKEN_PATTERN.findall(line) for line in text.splitlines()]
+    bound = bound_names(lines)
+    names: Dict[str, str] = {}
+    tokens = []
+    for token in (token for line in lines for token in line):
+        if token in bound:
+            token = names.setdefault(token, f"v{len(names)}")
+        tokens.append(token)
+    return tokens
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form used to compare question texts."""
+    return " ".join(text.lower().split())
+
+def fingerprint(text: str) -> str:
+    """Hash of the whitespace- and variable-name-normalised pseudocode."""
+    return hashlib.sha256(" ".join(normalize_tokens(text)).encode()).hexdigest()
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+def minhash(tokens: Sequence[str]) -> Tuple[int, ...]:
+    """MinHash signature of the token shingles."""
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    hashes = [_hash64(shingle) for shingle in shingles]
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+def estimated_jaccard(left: Sequence[int], right: Sequence[int]) -> float:
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+@dataclass
+class Cluster:
+    """
+    An equivalence class of submissions.
+
+    `graded_as` maps each member to the submission whose grade it reuses.
+    Exact duplicates share the representative's grade; near-duplicates are
+    only reported, and each distinct pseudocode among them is graded itself.
+    """
+    cluster_id: str
+    representative: str
+    members: List[str] = field(default_factory=list)
+    kind: str = "unique"  # "unique", "exact" or "near"
+    graded_as: Dict[str, str] = field(default_factory=dict)
+
+class _UnionFind:
+    def __init__(self, items: Iterable[str]):
+        self.parent = {item: item for item in items}
+
+    def find(self, item: str) -> str:
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a: str, b: str) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+def cluster_submissions(
+    submissions: Sequence[Tuple[str, str, str]], near_duplicate_threshold: float
+) -> List[Cluster]:
+    """
+    Group (submission_id, question, pseudocode) triples into equivalence classes.
+
+    Submissions only cluster with others answering the same (whitespace-
+    normalised) question. Within a question, identical normalised pseudocode
+    is merged by fingerprint, and near-duplicates are found with MinHash/LSH
+    and merged when their estimated Jaccard similarity reaches the threshold.
+    The first submission of each class, in input order, is its representative;
+    each member is graded as the first submission with its fingerprint.
+    """
+    order = {submission_id: i for i, (submission_id, _, _) in enumerate(submissions)}
+    union = _UnionFind(order)
+    near_merged = set()
+    exact_leader: Dict[str, str] = {}
+
+    by_question: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for submission_id, question, pseudocode in submissions:
+        by_question[normalize_text(question)].append((submission_id, pseudocode))
+
+    rows_per_band = NUM_PERMUTATIONS // LSH_BANDS
+    for entries in by_question.values():
+        first_by_fingerprint: Dict[str, str] = {}
+        signatures: Dict[str, Tuple[int, ...]] = {}
+        for submission_id, pseudocode in entries:
+            tokens = normalize_tokens(pseudocode)
+            key = fingerprint(pseudocode)
+            if key in first_by_fingerprint:
+                exact_leader[submission_id] = first_by_fingerprint[key]
+                union.union(first_by_fingerprint[key], submission_id)
+                continue
+            exact_leader[submission_id] = submission_id
+            first_by_fingerprint[key] = submission_id
+            signatures[submission_id] = minhash(tokens)
+
+        if near_duplicate_threshold >= 1.0:
+            continue
+        buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = defaultdict(list)
+        for submission_id, signature in signatures.items():
+            for band in range(LSH_BANDS):
+                band_key = (band, signature[band * rows_per_band:(band + 1) * rows_per_band])
+                for other in buckets[band_key]:
+                    if union.find(other) != union.find(submission_id) and \
+                            estimated_jaccard(signatures[other], signature) >= near_duplicate_threshold:
+                        union.union(other, submission_id)
+                        near_merged.update((other, submission_id))
+                buckets[band_key].append(submission_id)
+
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for submission_id in order:
+        groups[union.find(submission_id)].append(submission_id)
+
+    clusters = []
+    for i, members in enumerate(sorted(groups.values(), key=lambda m: order[m[0]])):
+        if len(members) == 1:
+            kind = "unique"
+        elif any(member in near_merged for member in members):
+            kind = "near"
+        else:
+            kind = "exact"
+        clusters.append(Cluster(
+            cluster_id=f"c{i}", representative=members[0], members=members, kind=kind,
+            graded_as={member: exact_leader[member] for member in members}
+        ))
+    return clusters
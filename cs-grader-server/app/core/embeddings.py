@@ -0,0 +1,208 @@
+import asyncio
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.clients import COHERE_CLIENT
+from app.core.logging import setup_logger
+from app.core.outbound import outbound
+
+logger = setup_logger("embeddings")
+
+try:
+    # Optional: only needed for EMBEDDING_BACKEND=local
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+# Cohere's input types; local models get the matching configured prefix instead
+SEARCH_QUERY = "search_query"
+SEARCH_DOCUMENT = "search_document"
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into embedding vectors for the `algorithms` collection.
+
+    `model_id` identifies the vector space: a collection embedded with one
+    model can only be searched with query vectors from the same model, so it
+    is stored in the collection metadata and checked when the corpus loads.
+    """
+
+    name = "base"
+    model_id = ""
+    # Whether vectors are worth sharing between replicas through the state store
+    shared_cache = False
+
+    @abstractmethod
+    async def embed(self, texts: List[str], input_type: str) -> List[List[float]]:
+        """One vector per text, in order; input_type is SEARCH_QUERY or SEARCH_DOCUMENT."""
+
+    async def warm_up(self) -> None:
+        """Load anything the first query would otherwise wait for."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model_id}
+
+class CohereEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the Cohere API, through the outbound scheduler."""
+
+    name = "cohere"
+    shared_cache = True
+    # Texts per embed request accepted by the API
+    max_batch = 96
+
+    def __init__(self, model: str):
+        self.model_id = model
+
+    async def embed(self, texts: List[str], input_type: str) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.max_batch):
+            batch = texts[start:start + self.max_batch]
+            response = await outbound.cohere_embed.run(lambda: COHERE_CLIENT.embed(
+                texts=batch,
+                model=self.model_id,
+                input_type=input_type,
+                embedding_types=["float"]
+            ))
+            if not (hasattr(response, "embeddings") and response.embeddings and response.embeddings.float_):
+                raise ValueError("Could not extract embeddings from response")
+            vectors.extend(list(vector) for vector in response.embeddings.float_)
+        return vectors
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    Embeddings from a sentence-transformers model on this host.
+
+    Inference runs in a small thread pool (the model releases the GIL while
+    encoding). Queries arriving within EMBEDDING_BATCH_WAIT of each other
+    are encoded together, up to EMBEDDING_BATCH_SIZE per forward pass, so a
+    burst of requests costs a few batched passes instead of one pass each.
+    """
+
+    name = "local"
+
+    def __init__(
+        self, model_path: str, device: str = "cpu", batch_size: int = 32, batch_wait: float = 0.005,
+        workers: int = 1, query_prefix: str = "", document_prefix: str = ""
+    ):
+        if not model_path:
+            raise ValueError("EMBEDDING_MODEL_PATH must be set for EMBEDDING_BACKEND=local")
+        self.model_path = model_path
+        self.model_id = f"local:{os.path.basename(os.path.normpath(model_path))}"
+        self.device = device
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.prefixes = {SEARCH_QUERY: query_prefix, SEARCH_DOCUMENT: document_prefix}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embedding")
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches_total = 0
+        self.texts_total = 0
+
+    def _load(self):
+        with self._model_lock:
+            if self._model is None:
+                if SentenceTransformer is None:
+                    raise RuntimeError(
+                        "EMBEDDING_BACKEND=local needs sentence-transformers; install it or use EMBEDDING_BACKEND=cohere"
+                    )
+                logger.info(f"Loading embedding model from {self.model_path} on {self.device}")
+                self._model = SentenceTransformer(self.model_path, device=self.device)
+            return self._model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        model = self._load()
+        vectors = model.encode(
+            texts, batch_size=self.batch_size, convert_to_numpy=True, normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return [vector.tolist() for vector in vectors]
+
+    async def warm_up(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._load)
+
+    async def embed(self, texts: List[str], input_type: str) -> List[List[float]]:
+        prefix = self.prefixes.get(input_type, "")
+        texts = [prefix + text for text in texts]
+        loop = asyncio.get_running_loop()
+        if input_type != SEARCH_QUERY:
+            # Bulk document embedding is already batched by the caller
+            self.batches_total += 1
+            self.texts_total += len(texts)
+            return await loop.run_in_executor(self._executor, self._encode, texts)
+
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.append((text, future))
+            futures.append(future)
+        if len(self._pending) >= self.batch_size:
+            self._flush(loop)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_wait, self._flush, loop)
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Send pending queries to the pool, one batch per EMBEDDING_BATCH_SIZE."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            self._pending = self._pending[self.batch_size:]
+            self.batches_total += 1
+            self.texts_total += len(batch)
+            result = loop.run_in_executor(self._executor, self._encode, [text for text, _ in batch])
+            result.add_done_callback(lambda done, batch=batch: self._resolve(batch, done))
+
+    @staticmethod
+    def _resolve(batch: List[Tuple[str, asyncio.Future]], done: asyncio.Future) -> None:
+        error = done.exception()
+        for i, (_, future) in enumerate(batch):
+            # Callers that timed out have already cancelled their future
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "loaded": self._model is not None,
+            "batches_total": self.batches_total,
+            "texts_total": self.texts_total,
+            "avg_batch_size": round(self.texts_total / self.batches_total, 2) if self.batches_total else 0.0,
+        }
+
+def create_embedding_provider(backend: Optional[str] = None) -> EmbeddingProvider:
+    """The provider selected by `backend` (default EMBEDDING_BACKEND)."""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == "local":
+        return LocalEmbeddingProvider(
+            settings.EMBEDDING_MODEL_PATH,
+            device=settings.EMBEDDING_DEVICE,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            batch_wait=settings.EMBEDDING_BATCH_WAIT,
+            workers=settings.EMBEDDING_WORKERS,
+            query_prefix=settings.EMBEDDING_QUERY_PREFIX,
+            document_prefix=settings.EMBEDDING_DOCUMENT_PREFIX,
+        )
+    if backend != "cohere":
+        logger.warning(f"Unknown EMBEDDING_BACKEND '{backend}'; using Cohere")
+    return CohereEmbeddingProvider(settings.COHERE_EMBEDDING_MODEL)
+
+_provider: Optional[EmbeddingProvider] = None
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the process-wide embedding provider, creating it on first use."""
+    global _provider
+    if _provider is None:
+        _provider = create_embedding_provider()
+        logger.info(f"Using the {_provider.name} embedding provider ({_provider.model_id})")
+    return _provider
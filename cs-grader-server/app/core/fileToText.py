@@ -1,9 +1,15 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query
 from typing import Dict, Any, List
 import io
+import asyncio
 from google.cloud import vision
 import os
 from app.core.config import settings
+from app.core.outbound import outbound
+from app.core.single_flight import single_flight, request_key
+from app.core.shared_cache import cached
+from app.core.image_preprocessing import preprocess_image, shrink_for_ocr
+from app.core.submissions import register_version
 from PyPDF2 import PdfReader
 import tempfile
 
@@ -18,15 +24,20 @@ os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = settings.GOOGLE_APPLICATION_CREDE
 # Initialize Google Cloud Vision client
 client = vision.ImageAnnotatorClient()
 
-async def process_file_to_text(file: UploadFile) -> Dict[str, Any]:
+ocr_flight = single_flight("vision_ocr")
+register_version("vision_ocr", "vision.text_detection", settings.IMAGE_MAX_SIDE, settings.IMAGE_JPEG_QUALITY, shrink_for_ocr)
+
+async def process_file_to_text(file: UploadFile, preprocess: bool = True) -> Dict[str, Any]:
     """
     Convert an image, PDF, or text file to text using Google Cloud Vision API.
     
     Args:
         file (UploadFile): The image, PDF, or text file to process
+        preprocess (bool): Orient, downscale and grayscale images before OCR
         
     Returns:
-        Dict[str, Any]: A dictionary containing the extracted text
+        Dict[str, Any]: A dictionary containing the extracted text, and for
+        pre-processed images the byte savings under "preprocessing"
         
     Raises:
         HTTPException: If the file is invalid or processing fails
@@ -100,25 +111,44 @@ async def process_file_to_text(file: UploadFile) -> Dict[str, Any]:
                 )
         else:
             # Process single image
-            image = vision.Image(content=content)
-            response = client.text_detection(image=image)
-            texts = response.text_annotations
-            
-            if not texts:
-                raise HTTPException(
-                    status_code=500,
-                    detail="No text was detected in the image"
-                )
-                
-            if response.error.message:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error from Google Cloud Vision: {response.error.message}"
+            async def detect_text():
+                preprocessing = None
+                image_content = content
+                if preprocess:
+                    image_content, preprocessing = await preprocess_image(content)
+                image = vision.Image(content=image_content)
+                response = await outbound.vision.run(
+                    lambda: asyncio.to_thread(client.text_detection, image=image)
                 )
-                
-            return {
-                "text": texts[0].description
-            }
+                texts = response.text_annotations
+
+                if not texts:
+                    raise HTTPException(
+                        status_code=500,
+                        detail="No text was detected in the image"
+                    )
+
+                if response.error.message:
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Error from Google Cloud Vision: {response.error.message}"
+                    )
+
+                result = {
+                    "text": texts[0].description
+                }
+                if preprocessing is not None:
+                    result["preprocessing"] = preprocessing
+                return result
+
+            # Identical uploads share one pre-processing run and Vision call,
+            # in this process and across replicas through the shared cache
+            key = request_key("vision.text_detection", preprocess, content)
+            result, hit = await ocr_flight.do(key, lambda: cached("vision_ocr", key, detect_text))
+            if hit:
+                # Nothing was pre-processed for this request
+                result = {"text": result["text"]}
+            return result
         
     except Exception as e:
         raise HTTPException(
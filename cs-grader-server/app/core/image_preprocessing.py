@@ -0,0 +1,106 @@
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from PIL import Image, ImageOps
+from app.core.config import settings
+from app.core.logging import setup_logger
+
+logger = setup_logger("image_preprocessing")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+class PreprocessingStats:
+    """Process-wide totals of what pre-processing saved before OCR."""
+
+    def __init__(self):
+        self.images_total = 0
+        self.skipped_total = 0
+        self.original_bytes = 0
+        self.processed_bytes = 0
+
+    def record(self, result: Dict[str, Any]) -> None:
+        self.images_total += 1
+        if not result["applied"]:
+            self.skipped_total += 1
+        self.original_bytes += result["original_bytes"]
+        self.processed_bytes += result["processed_bytes"]
+
+    def stats(self) -> Dict[str, Any]:
+        saved = self.original_bytes - self.processed_bytes
+        return {
+            "images_total": self.images_total,
+            "skipped_total": self.skipped_total,
+            "original_bytes": self.original_bytes,
+            "processed_bytes": self.processed_bytes,
+            "saved_bytes": saved,
+            "saved_ratio": round(saved / self.original_bytes, 3) if self.original_bytes else 0.0,
+        }
+
+preprocessing_stats = PreprocessingStats()
+
+def shrink_for_ocr(content: bytes, max_side: int, quality: int) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Orient, downscale, grayscale and re-encode an image for text detection.
+
+    Runs in a worker process. The original bytes are returned unchanged when
+    re-encoding would not make them smaller.
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        original_size = image.size
+        # Let the JPEG decoder skip resolution we are going to throw away
+        image.draft("L", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("L")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        processed = buffer.getvalue()
+        size = image.size
+
+    if len(processed) >= len(content):
+        return content, {"applied": False, "reason": "not smaller", "width": original_size[0], "height": original_size[1]}
+    return processed, {"applied": True, "width": size[0], "height": size[1]}
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PREPROCESS_WORKERS)
+    return _pool
+
+def shutdown_pool() -> None:
+    """Stop the worker processes; the next image starts a new pool."""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+async def preprocess_image(content: bytes) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Shrink an uploaded image in the process pool before it is sent to Vision.
+
+    Images Pillow cannot read are passed through untouched, so OCR still
+    gets a chance at them.
+
+    Returns:
+        Tuple[bytes, Dict[str, Any]]: The bytes to send and a record of the savings
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        processed, details = await loop.run_in_executor(
+            _get_pool(), shrink_for_ocr, content, settings.IMAGE_MAX_SIDE, settings.IMAGE_JPEG_QUALITY
+        )
+    except Exception as e:
+        logger.warning(f"Image pre-processing failed, sending the original: {str(e)}")
+        processed, details = content, {"applied": False, "reason": str(e)}
+
+    result = {
+        **details,
+        "original_bytes": len(content),
+        "processed_bytes": len(processed),
+        "saved_bytes": len(content) - len(processed),
+    }
+    preprocessing_stats.record(result)
+    logger.debug(f"Pre-processed image: {result}")
+    return processed, result
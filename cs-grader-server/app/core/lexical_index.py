@@ -0,0 +1,125 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from app.core.algorithm_documents import parse_algorithm_document
+from app.core.logging import setup_logger
+
+logger = setup_logger("lexical_index")
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Question text describes what the algorithm solves, which is what a lookup
+# by question wants to match, so it counts more than the pseudocode body.
+QUESTION_WEIGHT = 2.0
+PSEUDOCODE_WEIGHT = 1.0
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased words plus character trigrams of longer words.
+
+    The trigrams ("#alg", "#lgo", ...) let OCR misspellings such as
+    "algoritm" still share most of their terms with the correct word.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    terms = list(words)
+    for word in words:
+        if len(word) >= 4:
+            terms.extend(f"#{word[i:i + 3]}" for i in range(len(word) - 2))
+    return terms
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the question and pseudocode of every algorithm.
+
+    Scores are reported as a lexical similarity in [0, 1): the BM25 score
+    divided by the score a document would get if it contained every query
+    term with saturated frequency. This measures coverage of the query rather
+    than rank, so it can be thresholded and fused with cosine similarity.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        documents: Sequence[Optional[Dict[str, Any]]],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.ids = list(ids)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._lengths: List[float] = []
+        self._rows = {id_: i for i, id_ in enumerate(self.ids)}
+
+        for row, document in enumerate(documents):
+            weights: Counter = Counter()
+            if document is not None:
+                for term in tokenize(document.get("question", "")):
+                    weights[term] += QUESTION_WEIGHT
+                for term in tokenize(document.get("pseudocode", "")):
+                    weights[term] += PSEUDOCODE_WEIGHT
+            for term, tf in weights.items():
+                self._postings[term][row] = tf
+            self._lengths.append(sum(weights.values()))
+
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    @classmethod
+    def from_collection(cls, collection) -> "LexicalIndex":
+        """Build the index from every document in a Chroma collection."""
+        data = collection.get(include=["documents"])
+        documents = [parse_algorithm_document(doc) if doc else None for doc in data.get("documents") or []]
+        index = cls(data.get("ids") or [], documents)
+        logger.info(f"Built lexical index over {len(index)} documents ({len(index._postings)} terms)")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        n = len(self.ids)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _score_rows(self, terms: Iterable[str], rows: Optional[Iterable[int]] = None) -> Dict[int, float]:
+        wanted = None if rows is None else set(rows)
+        scores: Dict[int, float] = defaultdict(float)
+        for term, query_tf in Counter(terms).items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for row, tf in postings.items():
+                if wanted is not None and row not in wanted:
+                    continue
+                norm = 1 - self.b + self.b * (self._lengths[row] / self._avg_length if self._avg_length else 1.0)
+                scores[row] += query_tf * idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+    def _ideal_score(self, terms: Sequence[str]) -> float:
+        return sum(query_tf * self._idf(term) * (self.k1 + 1) for term, query_tf in Counter(terms).items())
+
+    def search(self, query: str, n_results: int) -> Dict[str, float]:
+        """Top n_results documents as {id: lexical similarity}."""
+        terms = tokenize(query)
+        ideal = self._ideal_score(terms)
+        if not terms or ideal <= 0:
+            return {}
+        scores = self._score_rows(terms)
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return {self.ids[row]: score / ideal for row, score in top}
+
+    def similarities(self, query: str, ids: Iterable[str]) -> Dict[str, float]:
+        """Lexical similarity of the query to specific documents (0.0 if unknown)."""
+        ids = list(ids)
+        terms = tokenize(query)
+        ideal = self._ideal_score(terms)
+        if not terms or ideal <= 0:
+            return {id_: 0.0 for id_ in ids}
+        rows = {self._rows[id_] for id_ in ids if id_ in self._rows}
+        scores = self._score_rows(terms, rows)
+        return {
+            id_: (scores.get(self._rows[id_], 0.0) / ideal if id_ in self._rows else 0.0)
+            for id_ in ids
+        }
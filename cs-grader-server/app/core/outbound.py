@@ -0,0 +1,359 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+from app.core.config import settings
+from app.core.circuit_breaker import CircuitBreaker, is_provider_failure
+from app.core.logging import setup_logger
+from app.core.profiling import record_span
+
+logger = setup_logger("outbound")
+
+T = TypeVar("T")
+
+# Requests are queued fairly per tenant (course, TA tool, ...). The tenant is
+# taken from this header by the middleware in main.py and forwarded on the
+# internal calls made by getResponse.
+TENANT_HEADER = "X-Tenant-Id"
+DEFAULT_TENANT = "default"
+current_tenant: ContextVar[str] = ContextVar("current_tenant", default=DEFAULT_TENANT)
+
+# Interactive requests (a student waiting in the web UI) and batch requests
+# (bulk regrades) wait in separate lanes. The class comes from this header,
+# set by the middleware in main.py; /batch/grade always runs as batch.
+REQUEST_CLASS_HEADER = "X-Request-Class"
+INTERACTIVE = "interactive"
+BATCH = "batch"
+REQUEST_CLASSES = (INTERACTIVE, BATCH)
+current_request_class: ContextVar[str] = ContextVar("current_request_class", default=INTERACTIVE)
+
+def parse_request_class(value: Optional[str]) -> str:
+    """Map a header value to a lane; anything unknown is interactive."""
+    value = (value or "").strip().lower()
+    return value if value in REQUEST_CLASSES else INTERACTIVE
+
+class QueueFullError(Exception):
+    """Raised when a lane's queue for a provider is at its limit."""
+
+    def __init__(self, provider: str, lane: str, retry_after: float = 1.0):
+        super().__init__(f"{provider} {lane} queue is full; retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.lane = lane
+        self.retry_after = retry_after
+
+def is_rate_limited(error: Exception) -> bool:
+    """Return True if a provider error is an HTTP 429 / quota exhaustion."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == 429:
+        return True
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Extract a Retry-After delay in seconds from a provider error, if present."""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+class ProviderLimiter:
+    """
+    Token bucket plus concurrency cap for one outbound provider.
+
+    Waiters queue in a lane per request class, and within a lane per tenant.
+    Lanes are served by smooth weighted round-robin, tenants round-robin,
+    so neither a bulk regrade nor one course's burst can starve a student
+    waiting in the web UI. Each lane's queue is bounded, and the batch lane
+    may only hold a share of the concurrency slots.
+
+    A 429 halves the effective rate and pauses the provider for Retry-After
+    (or an exponential backoff); every successful call then recovers the
+    rate additively. A circuit breaker checked before queuing fails calls
+    fast while the provider is down.
+    """
+
+    def __init__(self, name: str, rate: float, max_concurrency: int):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1.0, float(max_concurrency))
+        self.tokens = self.burst
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.consecutive_throttles = 0
+        self.calls_total = 0
+        self.throttled_total = 0
+        self.rejected_total = 0
+        self._updated = time.monotonic()
+        self._lanes: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            lane: OrderedDict() for lane in REQUEST_CLASSES
+        }
+        self._weights = {INTERACTIVE: settings.INTERACTIVE_LANE_WEIGHT, BATCH: settings.BATCH_LANE_WEIGHT}
+        self._queue_limits = {INTERACTIVE: settings.INTERACTIVE_QUEUE_LIMIT, BATCH: settings.BATCH_QUEUE_LIMIT}
+        self._lane_caps = {
+            INTERACTIVE: max_concurrency,
+            BATCH: max(1, int(max_concurrency * settings.BATCH_CONCURRENCY_SHARE)),
+        }
+        self._lane_in_flight = {lane: 0 for lane in REQUEST_CLASSES}
+        self._credits = {lane: 0 for lane in REQUEST_CLASSES}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.breaker = CircuitBreaker(name)
+
+    def _lane_depth(self, lane: str) -> int:
+        return sum(1 for waiters in self._lanes[lane].values() for fut in waiters if not fut.done())
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._lane_depth(lane) for lane in REQUEST_CLASSES)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _drop_cancelled(self) -> None:
+        """Drop waiters cancelled at the head of each tenant's queue, and tenants left with none."""
+        for queues in self._lanes.values():
+            for tenant, waiters in list(queues.items()):
+                while waiters and waiters[0].done():
+                    waiters.popleft()
+                if not waiters:
+                    del queues[tenant]
+
+    def _ready_lanes(self) -> List[str]:
+        """Lanes with waiters and a free slot within their concurrency cap."""
+        # Cancelled waiters must not earn their lane a round-robin turn
+        self._drop_cancelled()
+        return [
+            lane for lane in REQUEST_CLASSES
+            if self._lanes[lane] and self._lane_in_flight[lane] < self._lane_caps[lane]
+        ]
+
+    def _next_lane(self, ready: List[str]) -> str:
+        """Smooth weighted round-robin over the ready lanes."""
+        for lane in ready:
+            self._credits[lane] += self._weights[lane]
+        lane = max(ready, key=lambda name: self._credits[name])
+        self._credits[lane] -= sum(self._weights[name] for name in ready)
+        return lane
+
+    def _dispatch(self) -> None:
+        """Grant queued waiters while tokens and concurrency slots are available."""
+        now = time.monotonic()
+        self._refill(now)
+        while self.in_flight < self.max_concurrency:
+            ready = self._ready_lanes()
+            if not ready:
+                return
+            if now < self.paused_until:
+                self._schedule(self.paused_until - now)
+                return
+            if self.tokens < 1:
+                self._schedule((1 - self.tokens) / self.rate)
+                return
+
+            lane = self._next_lane(ready)
+            queues = self._lanes[lane]
+            tenant, waiters = next(iter(queues.items()))
+            fut = waiters.popleft()
+            if waiters:
+                queues.move_to_end(tenant)
+            else:
+                del queues[tenant]
+
+            self.tokens -= 1
+            self.in_flight += 1
+            self._lane_in_flight[lane] += 1
+            fut.set_result(None)
+
+    async def acquire(self, tenant: Optional[str] = None, lane: Optional[str] = None) -> str:
+        """
+        Wait for a slot and return the lane it was granted in.
+
+        Raises:
+            QueueFullError: If the lane already has its limit of waiters
+        """
+        tenant = tenant or current_tenant.get()
+        lane = lane or current_request_class.get()
+        if self._lane_depth(lane) >= self._queue_limits[lane]:
+            self.rejected_total += 1
+            raise QueueFullError(self.name, lane)
+        fut = asyncio.get_running_loop().create_future()
+        self._lanes[lane].setdefault(tenant, deque()).append(fut)
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Granted just before the caller was cancelled; hand the slot back
+                self.release(lane)
+            raise
+        return lane
+
+    def release(self, lane: str, throttled: bool = False, retry_after: Optional[float] = None) -> None:
+        self.in_flight -= 1
+        self._lane_in_flight[lane] -= 1
+        self.calls_total += 1
+        if throttled:
+            self.throttled_total += 1
+            self.consecutive_throttles += 1
+            delay = retry_after if retry_after is not None else min(60.0, 2.0 ** self.consecutive_throttles)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.rate = max(self.max_rate * 0.1, self.rate / 2)
+            logger.warning(f"{self.name} rate limited; pausing {delay:.1f}s, rate now {self.rate:.2f}/s")
+        else:
+            self.consecutive_throttles = 0
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[str] = None):
+        """Hold one rate-limited slot for the duration of the block (e.g. a stream)."""
+        probe = self.breaker.allow()
+        queued = time.perf_counter()
+        try:
+            lane = await self.acquire(tenant)
+        except BaseException:
+            self.breaker.abandon(probe)
+            raise
+        start = time.perf_counter()
+        record_span(f"queue.{self.name}", queued, start - queued, lane=lane)
+        try:
+            yield
+        except Exception as e:
+            throttled = is_rate_limited(e)
+            self.release(lane, throttled=throttled, retry_after=get_retry_after(e))
+            if throttled:
+                self.breaker.abandon(probe)
+            else:
+                self.breaker.record(probe, failed=is_provider_failure(e))
+            raise
+        except BaseException:
+            self.release(lane)
+            self.breaker.abandon(probe)
+            raise
+        else:
+            record_span(f"stream.{self.name}", start, time.perf_counter() - start)
+            self.release(lane)
+            # Streams are long by design, so only their failures count
+            self.breaker.record(probe, failed=False)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        tenant: Optional[str] = None,
+        max_retries: Optional[int] = None,
+    ) -> T:
+        """
+        Run `call` under the limiter, retrying after backoff when the provider returns 429.
+
+        Raises:
+            CircuitOpenError: If the provider's circuit is open
+            QueueFullError: If the caller's lane is full
+        """
+        max_retries = settings.OUTBOUND_MAX_RETRIES if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            probe = self.breaker.allow()
+            queued = time.perf_counter()
+            try:
+                lane = await self.acquire(tenant)
+            except BaseException:
+                self.breaker.abandon(probe)
+                raise
+            start = time.perf_counter()
+            record_span(f"queue.{self.name}", queued, start - queued, lane=lane)
+            try:
+                result = await call()
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                record_span(f"call.{self.name}", start, elapsed, error=type(e).__name__)
+                throttled = is_rate_limited(e)
+                self.release(lane, throttled=throttled, retry_after=get_retry_after(e))
+                if throttled:
+                    self.breaker.abandon(probe)
+                else:
+                    self.breaker.record(probe, failed=is_provider_failure(e), latency=elapsed)
+                if throttled and attempt < max_retries:
+                    attempt += 1
+                    continue
+                raise
+            except BaseException:
+                self.release(lane)
+                self.breaker.abandon(probe)
+                raise
+            elapsed = time.perf_counter() - start
+            record_span(f"call.{self.name}", start, elapsed)
+            self.release(lane)
+            self.breaker.record(probe, failed=False, latency=elapsed)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        per_tenant: Dict[str, int] = {}
+        for queues in self._lanes.values():
+            for tenant, waiters in queues.items():
+                per_tenant[tenant] = per_tenant.get(tenant, 0) + sum(1 for fut in waiters if not fut.done())
+        return {
+            "queue_depth": sum(per_tenant.values()),
+            "queue_depth_by_tenant": {k: v for k, v in per_tenant.items() if v},
+            "lanes": {
+                lane: {
+                    "queue_depth": self._lane_depth(lane),
+                    "queue_limit": self._queue_limits[lane],
+                    "in_flight": self._lane_in_flight[lane],
+                    "max_concurrency": self._lane_caps[lane],
+                    "weight": self._weights[lane],
+                }
+                for lane in REQUEST_CLASSES
+            },
+            "rejected_total": self.rejected_total,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rate_per_second": round(self.rate, 3),
+            "max_rate_per_second": self.max_rate,
+            "paused_for_seconds": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            "calls_total": self.calls_total,
+            "throttled_total": self.throttled_total,
+            "circuit": self.breaker.stats(),
+        }
+
+class OutboundScheduler:
+    """Registry of per-provider limiters for every paid API the server calls, plus the Docker sandbox."""
+
+    def __init__(self):
+        self.gemini = ProviderLimiter("gemini", settings.GEMINI_RATE_LIMIT, settings.GEMINI_MAX_CONCURRENCY)
+        self.cohere_chat = ProviderLimiter("cohere_chat", settings.COHERE_CHAT_RATE_LIMIT, settings.COHERE_CHAT_MAX_CONCURRENCY)
+        self.cohere_embed = ProviderLimiter("cohere_embed", settings.COHERE_EMBED_RATE_LIMIT, settings.COHERE_EMBED_MAX_CONCURRENCY)
+        self.vision = ProviderLimiter("vision", settings.VISION_RATE_LIMIT, settings.VISION_MAX_CONCURRENCY)
+        self.sandbox = ProviderLimiter("sandbox", settings.SANDBOX_RATE_LIMIT, settings.SANDBOX_MAX_CONCURRENCY)
+
+    def providers(self) -> Dict[str, ProviderLimiter]:
+        return {
+            limiter.name: limiter
+            for limiter in (self.gemini, self.cohere_chat, self.cohere_embed, self.vision, self.sandbox)
+        }
+
+    def open_circuits(self) -> List[str]:
+        """Providers currently failing fast."""
+        return [name for name, limiter in self.providers().items() if limiter.breaker.is_open]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: limiter.stats() for name, limiter in self.providers().items()}
+
+outbound = OutboundScheduler()
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.logging import setup_logger
+from app.core.profiling import record_span
+
+logger = setup_logger("pipeline")
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+class StageSkipped(Exception):
+    """Raised by a stage to skip itself (and everything that depends on it)."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+@dataclass
+class Stage:
+    """
+    One node of a Pipeline.
+
+    Attributes:
+        name: Unique stage name; dependents receive this stage's value under it
+        fn: Coroutine function called with {dependency name: value}
+        deps: Names of the stages that must finish first
+        optional: Failures and timeouts are tolerated; dependents receive None
+        fatal: A failure cancels every running stage and is re-raised from Pipeline.run
+        timeout: Seconds before the stage is abandoned
+    """
+    name: str
+    fn: StageFn
+    deps: Tuple[str, ...] = ()
+    optional: bool = False
+    fatal: bool = False
+    timeout: Optional[float] = None
+
+@dataclass
+class StageResult:
+    status: str  # "ok", "failed", "skipped" or "timeout"
+    value: Any = None
+    error: Optional[BaseException] = None
+    reason: Optional[str] = None
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    def summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {"status": self.status, "duration": round(self.duration, 3)}
+        if self.reason:
+            summary["reason"] = self.reason
+        return summary
+
+@dataclass
+class Pipeline:
+    """
+    A small DAG scheduler: each stage starts as soon as all of its dependencies
+    have finished, independent stages run concurrently, and a stage whose
+    required dependency did not succeed is skipped instead of being called.
+    """
+    stages: List[Stage]
+    results: Dict[str, StageResult] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._by_name = {stage.name: stage for stage in self.stages}
+        for stage in self.stages:
+            for dep in stage.deps:
+                if dep not in self._by_name:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    async def _run_stage(self, stage: Stage, inputs: Dict[str, Any]) -> StageResult:
+        start = time.perf_counter()
+        result = await self._call_stage(stage, inputs, start)
+        record_span(f"stage.{stage.name}", start, result.duration, status=result.status)
+        return result
+
+    async def _call_stage(self, stage: Stage, inputs: Dict[str, Any], start: float) -> StageResult:
+        try:
+            if stage.timeout is not None:
+                value = await asyncio.wait_for(stage.fn(inputs), timeout=stage.timeout)
+            else:
+                value = await stage.fn(inputs)
+            return StageResult("ok", value=value, duration=time.perf_counter() - start)
+        except StageSkipped as e:
+            return StageResult("skipped", reason=e.reason, duration=time.perf_counter() - start)
+        except asyncio.TimeoutError as e:
+            return StageResult("timeout", error=e, reason=f"timed out after {stage.timeout}s",
+                               duration=time.perf_counter() - start)
+        except Exception as e:
+            return StageResult("failed", error=e, reason=str(e), duration=time.perf_counter() - start)
+
+    def _launch_ready(self, pending: Dict[str, Stage], tasks: Dict[asyncio.Task, str]) -> None:
+        progressed = True
+        while progressed:
+            progressed = False
+            for name, stage in list(pending.items()):
+                if not all(dep in self.results for dep in stage.deps):
+                    continue
+                del pending[name]
+                progressed = True
+
+                blocked = [
+                    dep for dep in stage.deps
+                    if not self.results[dep].ok and not self._by_name[dep].optional
+                ]
+                if blocked:
+                    dep = blocked[0]
+                    self.results[name] = StageResult("skipped", reason=f"{dep} {self.results[dep].status}")
+                    logger.info(f"Skipping stage {name}: {dep} {self.results[dep].status}")
+                    continue
+
+                inputs = {dep: self.results[dep].value for dep in stage.deps}
+                tasks[asyncio.create_task(self._run_stage(stage, inputs))] = name
+
+    async def run(self) -> Dict[str, StageResult]:
+        """Run every stage and return their results by name."""
+        pending = dict(self._by_name)
+        tasks: Dict[asyncio.Task, str] = {}
+        try:
+            self._launch_ready(pending, tasks)
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks.pop(task)
+                    result = task.result()
+                    self.results[name] = result
+                    logger.debug(f"Stage {name} finished: {result.status} in {result.duration:.2f}s")
+
+                    if not result.ok and self._by_name[name].fatal and result.error is not None:
+                        logger.error(f"Fatal failure in stage {name}: {result.reason}")
+                        raise result.error
+                self._launch_ready(pending, tasks)
+            return self.results
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def timeline(self) -> Dict[str, Dict[str, Any]]:
+        return {name: result.summary() for name, result in self.results.items()}
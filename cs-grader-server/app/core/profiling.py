@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.admin import ADMIN_TOKEN_HEADER, is_admin
+from app.core.config import settings
+from app.core.logging import setup_logger
+
+logger = setup_logger("profiling")
+
+try:
+    # Optional: call-stack profiles for requests that opt in
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+@dataclass
+class Span:
+    name: str
+    start: float  # seconds since the request started
+    duration: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start": round(self.start, 4),
+            "duration": round(self.duration, 4),
+            **({"attributes": self.attributes} if self.attributes else {}),
+        }
+
+@dataclass
+class RequestProfile:
+    """Timeline of one request: pipeline stages, provider waits and calls."""
+    method: str
+    path: str
+    query: str = ""
+    reason: str = "slow"  # "requested", "sampled" or "slow"
+    profile_id: str = field(default_factory=lambda: f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}")
+    created: float = field(default_factory=time.time)
+    spans: List[Span] = field(default_factory=list)
+    status_code: Optional[int] = None
+    duration: float = 0.0
+
+    def __post_init__(self):
+        self._t0 = time.perf_counter()
+
+    def add_span(self, name: str, start: float, duration: float, **attributes: Any) -> None:
+        """Record a span given its perf_counter start time."""
+        self.spans.append(Span(name, start - self._t0, duration, attributes))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "reason": self.reason,
+            "created": self.created,
+            "status_code": self.status_code,
+            "duration": round(self.duration, 4),
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+def record_span(name: str, start: float, duration: float, **attributes: Any) -> None:
+    """Add a span to the current request's profile; a no-op outside a request."""
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add_span(name, start, duration, **attributes)
+
+class ProfileStore:
+    """
+    Bounded on-disk ring buffer of request profiles.
+
+    Each profile is a JSON file named by its id (which sorts by time), plus
+    an HTML call-stack profile when pyinstrument ran. Once more than
+    `max_profiles` are stored the oldest are deleted.
+    """
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+
+    def _paths(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("*.json"))
+
+    def _write(self, profile: Dict[str, Any], html: Optional[str]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if html is not None:
+            (self.directory / f"{profile['id']}.html").write_text(html)
+        tmp = self.directory / f".{profile['id']}.json.tmp"
+        tmp.write_text(json.dumps(profile))
+        os.replace(tmp, self.directory / f"{profile['id']}.json")
+
+        paths = self._paths()
+        for path in paths[:max(0, len(paths) - self.max_profiles)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".html").unlink(missing_ok=True)
+
+    async def save(self, profile: Dict[str, Any], html: Optional[str] = None) -> None:
+        await asyncio.to_thread(self._write, profile, html)
+
+    def _valid_id(self, profile_id: str) -> bool:
+        return profile_id.replace("-", "").isalnum()
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Summaries of the stored profiles, newest first."""
+        summaries = []
+        for path in reversed(self._paths()):
+            try:
+                profile = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            summaries.append({
+                **{key: profile.get(key) for key in ("id", "method", "path", "reason", "created", "status_code", "duration")},
+                "has_call_stack": path.with_suffix(".html").exists(),
+            })
+        return summaries
+
+    def load(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self.directory / f"{profile_id}.json"
+        if not self._valid_id(profile_id) or not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def html_path(self, profile_id: str) -> Optional[Path]:
+        path = self.directory / f"{profile_id}.html"
+        if not self._valid_id(profile_id) or not path.exists():
+            return None
+        return path
+
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
+
+class ProfilingMiddleware:
+    """
+    Time every request and keep the slow ones.
+
+    Every request collects a cheap span timeline (pipeline stages, provider
+    queue waits and calls). Requests that opt in, with `X-Profile: 1` and a
+    valid admin token or by PROFILE_SAMPLE_RATE sampling, also run under
+    pyinstrument when it is installed, and are always stored. Other requests
+    are stored only when they take SLOW_REQUEST_THRESHOLD seconds or more.
+    Duration is measured to the last body chunk, so streams count in full.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if headers.get(PROFILE_HEADER) == "1" and is_admin(headers.get(ADMIN_TOKEN_HEADER)):
+            reason = "requested"
+        elif settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+            reason = "sampled"
+        else:
+            reason = None
+
+        profile = RequestProfile(
+            method=scope["method"],
+            path=scope["path"],
+            query=scope.get("query_string", b"").decode(errors="replace"),
+            reason=reason or "slow",
+        )
+        profiler = None
+        if reason is not None and Profiler is not None:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+
+        async def send_with_profile(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                if reason is not None:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (PROFILE_ID_HEADER.lower().encode(), profile.profile_id.encode())
+                    ]
+            await send(message)
+
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            current_profile.reset(token)
+            profile.duration = time.perf_counter() - start
+            html = None
+            if profiler is not None:
+                profiler.stop()
+                html = profiler.output_html()
+
+            if reason is not None or profile.duration >= settings.SLOW_REQUEST_THRESHOLD:
+                if reason is None:
+                    logger.warning(f"Slow request {profile.method} {profile.path}: {profile.duration:.2f}s")
+                try:
+                    await profile_store.save(profile.to_dict(), html)
+                except OSError as e:
+                    logger.error(f"Failed to store profile {profile.profile_id}: {str(e)}")
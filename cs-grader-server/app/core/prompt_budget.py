@@ -0,0 +1,187 @@
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.submissions import register_version
+
+# Roughly four characters per token for English text and code. The providers
+# do not expose a local tokenizer, so budgets are enforced on this estimate
+# and the provider-reported usage is returned alongside when available.
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = "\n[... truncated ...]\n"
+
+# Ruled-paper artefacts such as "-----" or "||||"
+RULED_LINE_PATTERN = re.compile(r"^([-_=.|~*])\1{3,}$")
+# Lines that carry no content in prose after OCR: stray punctuation, page
+# furniture and ruled lines. Not applied to code, where a lone "}" or ")"
+# closes a block.
+NOISE_LINE_PATTERN = re.compile(r"^[\W_]{1,3}$|" + RULED_LINE_PATTERN.pattern)
+CONTROL_CHAR_PATTERN = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+
+# Only drop a pseudocode line for duplicating the question if it is long
+# enough to be prose rather than a short statement like "return x".
+MIN_DEDUPE_LINE_LENGTH = 20
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in text."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _normalize_line(line: str) -> str:
+    return " ".join(line.lower().split())
+
+def clean_ocr_text(text: str, dedupe: bool = True, code: bool = False) -> str:
+    """
+    Strip OCR noise from extracted text.
+
+    Removes control characters, trailing whitespace and noise-only lines and
+    collapses runs of blank lines. With dedupe, paragraphs repeated verbatim
+    (e.g. the question printed on every page of a scan) are dropped; this is
+    off for pseudocode, where a repeated block is meaningful. With code, only
+    ruled lines count as noise, so closing brackets survive. Leading
+    indentation is kept because it carries structure in pseudocode.
+    """
+    noise = RULED_LINE_PATTERN if code else NOISE_LINE_PATTERN
+    text = CONTROL_CHAR_PATTERN.sub("", text).replace("\r\n", "\n").replace("\r", "\n")
+
+    lines = []
+    for line in text.split("\n"):
+        line = line.rstrip()
+        if noise.match(line.strip()):
+            continue
+        lines.append(line)
+
+    paragraphs = []
+    seen = set()
+    for paragraph in "\n".join(lines).split("\n\n"):
+        paragraph = paragraph.strip("\n")
+        key = _normalize_line(paragraph)
+        if not key or (dedupe and key in seen):
+            continue
+        seen.add(key)
+        paragraphs.append(paragraph)
+
+    return "\n\n".join(paragraphs)
+
+def remove_question_text(pseudocode: str, question: str) -> str:
+    """Drop pseudocode lines that repeat a line of the question verbatim."""
+    question_lines = {
+        _normalize_line(line) for line in question.split("\n")
+        if len(line.strip()) >= MIN_DEDUPE_LINE_LENGTH
+    }
+    if not question_lines:
+        return pseudocode
+    kept = [line for line in pseudocode.split("\n") if _normalize_line(line) not in question_lines]
+    return "\n".join(kept)
+
+def truncate_to_budget(text: str, max_tokens: int) -> str:
+    """Trim text to max_tokens, keeping its beginning and end."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+    head = keep_chars * 2 // 3
+    tail = keep_chars - head
+    return text[:head] + TRUNCATION_MARKER + (text[-tail:] if tail else "")
+
+def compact_submission(question: str, pseudocode: str) -> Tuple[str, str]:
+    """
+    Clean, dedupe and trim the question and pseudocode to PROMPT_TOKEN_BUDGET.
+
+    The pseudocode is what is being graded, so it gets the larger share of
+    the budget when both sides do not fit.
+    """
+    question = clean_ocr_text(question)
+    pseudocode = remove_question_text(clean_ocr_text(pseudocode, dedupe=False, code=True), question)
+
+    budget = settings.PROMPT_TOKEN_BUDGET
+    question_tokens = count_tokens(question)
+    pseudocode_tokens = count_tokens(pseudocode)
+    if question_tokens + pseudocode_tokens <= budget:
+        return question, pseudocode
+
+    question_budget = max(budget // 3, budget - pseudocode_tokens)
+    question = truncate_to_budget(question, question_budget)
+    pseudocode = truncate_to_budget(pseudocode, budget - count_tokens(question))
+    return question, pseudocode
+
+def fit_similar_algorithms(
+    algorithms: List[Dict[str, Any]], max_tokens: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Keep the most similar algorithms that fit in max_tokens.
+
+    Algorithms are taken in descending similarity; the first one that does not
+    fit has its pseudocode trimmed into the remaining space, and the rest are
+    dropped.
+    """
+    remaining = settings.SIMILAR_ALGORITHMS_TOKEN_BUDGET if max_tokens is None else max_tokens
+    fitted = []
+    for algorithm in sorted(algorithms, key=lambda a: a["similarity"], reverse=True):
+        question = clean_ocr_text(algorithm["question"])
+        pseudocode = clean_ocr_text(algorithm["pseudocode"], dedupe=False, code=True)
+        cost = count_tokens(question) + count_tokens(pseudocode)
+        if cost > remaining:
+            pseudocode_budget = remaining - count_tokens(question)
+            if pseudocode_budget < settings.MIN_SIMILAR_ALGORITHM_TOKENS:
+                break
+            pseudocode = truncate_to_budget(pseudocode, pseudocode_budget)
+            cost = count_tokens(question) + count_tokens(pseudocode)
+        fitted.append({**algorithm, "question": question, "pseudocode": pseudocode})
+        remaining -= cost
+    return fitted
+
+def scale_output_tokens(pseudocode: str) -> int:
+    """
+    Output token limit for code translation, proportional to the pseudocode.
+
+    A Python translation is usually two to three times the pseudocode length;
+    the limit is clamped to [GEMINI_MIN_OUTPUT_TOKENS, GEMINI_MAX_OUTPUT_TOKENS].
+    """
+    wanted = count_tokens(pseudocode) * 3 + 256
+    return max(settings.GEMINI_MIN_OUTPUT_TOKENS, min(settings.GEMINI_MAX_OUTPUT_TOKENS, wanted))
+
+# Compaction rewrites every prompt, so its rules are part of each grading
+# stage's version; the budgets themselves are added in stage_fingerprints
+register_version(
+    "prompt_budget", "local", count_tokens, clean_ocr_text, remove_question_text, truncate_to_budget,
+    compact_submission, fit_similar_algorithms, CHARS_PER_TOKEN, TRUNCATION_MARKER, MIN_DEDUPE_LINE_LENGTH,
+    NOISE_LINE_PATTERN.pattern, CONTROL_CHAR_PATTERN.pattern
+)
+
+def gemini_usage(response: Any, prompt: str) -> Dict[str, Any]:
+    """Token usage of a Gemini response, estimated when the SDK does not report it."""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is not None and getattr(metadata, "prompt_token_count", None):
+        return {
+            "input_tokens": metadata.prompt_token_count,
+            "output_tokens": metadata.candidates_token_count,
+            "estimated": False
+        }
+    return {
+        "input_tokens": count_tokens(prompt),
+        "output_tokens": count_tokens(getattr(response, "text", "") or ""),
+        "estimated": True
+    }
+
+def cohere_usage(response: Any, prompt: str, output_text: str) -> Dict[str, Any]:
+    """Token usage of a Cohere chat response, estimated when not reported."""
+    tokens = getattr(getattr(response, "usage", None), "tokens", None)
+    if tokens is not None and getattr(tokens, "input_tokens", None) is not None:
+        return {
+            "input_tokens": int(tokens.input_tokens),
+            "output_tokens": int(tokens.output_tokens or 0),
+            "estimated": False
+        }
+    return {
+        "input_tokens": count_tokens(prompt),
+        "output_tokens": count_tokens(output_text),
+        "estimated": True
+    }
+
+def cached_usage(usage: Dict[str, Any], hit: bool) -> Dict[str, Any]:
+    """Token usage to report for a call; a shared cache hit spent no provider tokens."""
+    if not hit:
+        return usage
+    return {"input_tokens": 0, "output_tokens": 0, "estimated": False, "cached": True}
@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Optional
+
+TRIM_MARKER = "\n[... {omitted} characters omitted ...]\n"
+
+# Parts of a pytest-json-report test entry kept in a compact report
+COMPACT_TEST_FIELDS = ("nodeid", "lineno", "outcome")
+COMPACT_REPORT_FIELDS = ("created", "duration", "exitcode", "summary")
+
+def trim_tail(text: str, max_chars: Optional[int]) -> str:
+    """Keep the last max_chars characters, where pytest prints its summary."""
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    omitted = len(text) - max_chars
+    return TRIM_MARKER.format(omitted=omitted).lstrip("\n") + text[omitted:]
+
+def compact_test(test: Dict[str, Any]) -> Dict[str, Any]:
+    """A test entry without keywords, tracebacks, captured output or longrepr."""
+    compact = {field: test[field] for field in COMPACT_TEST_FIELDS if field in test}
+    compact["duration"] = round(sum(
+        test.get(phase, {}).get("duration", 0.0) for phase in ("setup", "call", "teardown")
+    ), 6)
+    crash = (test.get("call") or {}).get("crash")
+    if crash:
+        compact["call"] = {"crash": {"lineno": crash.get("lineno"), "message": crash.get("message")}}
+    return compact
+
+def compact_report(report: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    The fields of a pytest-json-report the web client reads: summary, timing
+    and per-test outcome with the crash message. Environment, collectors and
+    tracebacks are dropped.
+    """
+    if report is None:
+        return None
+    compact = {field: report[field] for field in COMPACT_REPORT_FIELDS if field in report}
+    compact["tests"] = [compact_test(test) for test in report.get("tests", [])]
+    return compact
+
+def shape_test_run(
+    result: Dict[str, Any], report: str = "full", include_logs: bool = True, max_log_chars: Optional[int] = None
+) -> Dict[str, Any]:
+    """Apply the response flags of /pytest/run to a {"exit_code", "logs", "report"} result."""
+    shaped = dict(result)
+    if report == "compact":
+        shaped["report"] = compact_report(result.get("report"))
+    elif report == "none":
+        shaped.pop("report", None)
+    if not include_logs:
+        shaped.pop("logs", None)
+    elif "logs" in shaped:
+        shaped["logs"] = trim_tail(shaped["logs"], max_log_chars)
+    return shaped
+
+def summarize_files_to_text(processed: Dict[str, Any]) -> Dict[str, List[int]]:
+    """Replace the OCR'd text of a files-to-text response with its per-file lengths."""
+    return {"characters": [len(text or "") for text in processed.get("content", [])]}
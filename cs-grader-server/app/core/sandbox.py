@@ -0,0 +1,317 @@
+from typing import Any, Dict, Iterator, Optional
+import hashlib
+import io
+import json
+import re
+import subprocess
+import tarfile
+import threading
+import time
+import docker
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.streaming import ndjson_event
+
+logger = setup_logger("sandbox")
+
+# Matches the per-test lines printed by `pytest -v`, e.g.
+# "test_main.py::test_add PASSED                [ 50%]"
+TEST_OUTCOME_PATTERN = re.compile(
+    r"^(?P<nodeid>\S+::\S+)\s+(?P<outcome>PASSED|FAILED|ERROR|SKIPPED|XFAIL|XPASS)\b"
+)
+
+def check_docker_available():
+    """Check if Docker is running and accessible."""
+    try:
+        # Try to run docker info command
+        subprocess.run(["docker", "info"], capture_output=True, check=True, shell=True)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+def create_dockerfile():
+    return """
+FROM python:3.12-slim
+
+WORKDIR /app
+
+RUN pip install pytest pytest-json-report
+
+CMD ["pytest", "-v", "--json-report"]
+"""
+
+def get_docker_client() -> docker.DockerClient:
+    """Return a Docker client, raising a 503 if the daemon is unreachable."""
+    if not check_docker_available():
+        logger.error("Docker is not running or not accessible")
+        raise HTTPException(
+            status_code=503,
+            detail="Docker is not running. Please start Docker and try again."
+        )
+
+    try:
+        return docker.from_env()
+    except docker.errors.DockerException as e:
+        logger.error(f"Failed to connect to Docker: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="Failed to connect to Docker. Please ensure Docker is running and accessible."
+        )
+
+RUNNER_IMAGE_REPOSITORY = "pytest-runner"
+
+_runner_image_id: Optional[str] = None
+_runner_image_lock = threading.Lock()
+
+def runner_image_ref() -> str:
+    """The configured runner image, or the tag of the image built from create_dockerfile()."""
+    if settings.SANDBOX_RUNNER_IMAGE:
+        return settings.SANDBOX_RUNNER_IMAGE
+    dockerfile = create_dockerfile()
+    return f"{RUNNER_IMAGE_REPOSITORY}:{hashlib.sha256(dockerfile.encode()).hexdigest()[:12]}"
+
+def get_runner_image(client: docker.DockerClient) -> str:
+    """
+    Id of the runner image, built or pulled on first use.
+
+    The image only holds Python and pytest; each run copies its code into a
+    fresh container, so the image is built once per Dockerfile instead of
+    once per run.
+    """
+    global _runner_image_id
+    with _runner_image_lock:
+        if _runner_image_id is not None:
+            return _runner_image_id
+
+        if settings.SANDBOX_RUNNER_IMAGE:
+            try:
+                image = client.images.get(settings.SANDBOX_RUNNER_IMAGE)
+            except docker.errors.ImageNotFound:
+                logger.info(f"Pulling runner image {settings.SANDBOX_RUNNER_IMAGE}")
+                image = client.images.pull(settings.SANDBOX_RUNNER_IMAGE)
+        else:
+            dockerfile = create_dockerfile()
+            tag = runner_image_ref()
+            try:
+                image = client.images.get(tag)
+            except docker.errors.ImageNotFound:
+                logger.info(f"Building runner image {tag}")
+                image, build_logs = client.images.build(
+                    fileobj=io.BytesIO(dockerfile.encode()),
+                    tag=tag,
+                    rm=True
+                )
+                # Log build output
+                for log in build_logs:
+                    if 'stream' in log:
+                        logger.debug(f"Docker build: {log['stream'].strip()}")
+
+        _runner_image_id = image.id
+        return _runner_image_id
+
+def forget_runner_image() -> None:
+    """Look the runner image up again on the next run, e.g. after it was removed."""
+    global _runner_image_id
+    with _runner_image_lock:
+        _runner_image_id = None
+
+def build_test_archive(code: str, test_code: Optional[str] = None) -> bytes:
+    """Tar main.py and test_main.py for copying into a container."""
+    files = {"main.py": code}
+    if test_code:
+        files["test_main.py"] = test_code
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, text in files.items():
+            data = text.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+def start_test_container(client: docker.DockerClient, code: str, test_code: Optional[str] = None):
+    """Start a runner container with the code copied in and the sandbox limits applied."""
+    logger.info("Running Docker container")
+    # Unbuffered output lets `container.logs(stream=True)` see each test line
+    # as soon as it is printed
+    container = client.containers.create(
+        get_runner_image(client),
+        environment={"PYTHONUNBUFFERED": "1"},
+        mem_limit=settings.SANDBOX_MEMORY_LIMIT,
+        memswap_limit=settings.SANDBOX_MEMORY_LIMIT,  # no swap on top of the memory limit
+        nano_cpus=int(settings.SANDBOX_CPU_LIMIT * 1e9),
+        pids_limit=settings.SANDBOX_PIDS_LIMIT,
+        network_disabled=settings.SANDBOX_NETWORK_DISABLED
+    )
+    try:
+        container.put_archive("/app", build_test_archive(code, test_code))
+        container.start()
+    except Exception:
+        cleanup_test_run(container)
+        raise
+    return container
+
+class Deadline:
+    """Kills a container that is still running after SANDBOX_TIMEOUT."""
+
+    def __init__(self, container, timeout: float):
+        self.started = time.monotonic()
+        self.expired = False
+        self._timer = threading.Timer(timeout, self._kill, args=(container,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _kill(self, container) -> None:
+        self.expired = True
+        logger.warning(f"Test container exceeded {settings.SANDBOX_TIMEOUT}s; killing it")
+        try:
+            container.kill()
+        except Exception as e:
+            logger.debug(f"Failed to kill container: {str(e)}")
+
+    def cancel(self) -> float:
+        """Stop the timer; returns the seconds since the container started."""
+        self._timer.cancel()
+        return time.monotonic() - self.started
+
+def read_report(container) -> Optional[Dict[str, Any]]:
+    """Read /app/.report.json out of the container without touching the disk."""
+    try:
+        report_data, _ = container.get_archive('/app/.report.json')
+        archive = io.BytesIO(b"".join(report_data))
+
+        with tarfile.open(fileobj=archive) as tar:
+            member = tar.extractfile('.report.json')
+            if member is None:
+                logger.debug("No JSON report found")
+                return None
+            logger.debug("Found JSON report")
+            return json.loads(member.read())
+
+    except Exception as e:
+        logger.warning(f"Failed to copy report from container: {str(e)}")
+        return None
+
+def cleanup_test_run(container) -> None:
+    """Remove the container, logging any failures."""
+    if container is not None:
+        try:
+            container.remove(force=True)
+        except Exception as e:
+            logger.warning(f"Failed to remove container: {str(e)}")
+
+def finish_test_run(container, status_code: int, logs: str, deadline: Deadline) -> Dict[str, Any]:
+    """The run's result, with whether it hit the time or memory limit."""
+    duration = deadline.cancel()
+    oom_killed = False
+    try:
+        container.reload()
+        oom_killed = bool(container.attrs.get("State", {}).get("OOMKilled"))
+    except Exception as e:
+        logger.warning(f"Failed to inspect container: {str(e)}")
+    if oom_killed:
+        logger.warning(f"Test container exceeded the {settings.SANDBOX_MEMORY_LIMIT} memory limit")
+
+    return {
+        "exit_code": status_code,
+        "logs": logs,
+        "report": read_report(container),
+        "duration": round(duration, 3),
+        "timed_out": deadline.expired,
+        "oom_killed": oom_killed
+    }
+
+def run_pytest_in_container(code: str, test_code: Optional[str] = None):
+    logger.info("Starting pytest run with code string")
+
+    client = get_docker_client()
+
+    container = None
+    try:
+        container = start_test_container(client, code, test_code)
+        deadline = Deadline(container, settings.SANDBOX_TIMEOUT)
+
+        # Wait for the container to finish
+        result = container.wait()
+        logger.info(f"Container finished with exit code: {result['StatusCode']}")
+
+        # Get the logs before removing the container
+        logs = container.logs().decode()
+        logger.debug(f"Container logs: {logs}")
+
+        return finish_test_run(container, result["StatusCode"], logs, deadline)
+
+    except docker.errors.BuildError as e:
+        logger.error(f"Failed to build Docker image: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Failed to build Docker image: {str(e)}")
+    except docker.errors.ImageNotFound as e:
+        forget_runner_image()
+        logger.error(f"Runner image disappeared: {str(e)}")
+        raise HTTPException(status_code=503, detail="The test runner image is unavailable; retry the request")
+    except docker.errors.APIError as e:
+        logger.error(f"Docker API error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Docker API error: {str(e)}")
+    finally:
+        cleanup_test_run(container)
+
+def stream_pytest_in_container(
+    client: docker.DockerClient, code: str, test_code: Optional[str] = None
+) -> Iterator[bytes]:
+    """
+    Run pytest in a container and yield NDJSON events while it runs.
+
+    Events, one JSON object per line:
+        {"event": "started"}
+        {"event": "log", "line": "..."}
+        {"event": "test", "nodeid": "...", "outcome": "passed"}
+        {"event": "result", "exit_code": 0, "logs": "...", "report": {...}, ...}
+        {"event": "error", "status_code": 500, "detail": "..."}
+    """
+    container = None
+    try:
+        container = start_test_container(client, code, test_code)
+        deadline = Deadline(container, settings.SANDBOX_TIMEOUT)
+        yield ndjson_event({"event": "started"})
+
+        log_lines = []
+        pending = ""
+        for chunk in container.logs(stream=True, follow=True):
+            pending += chunk.decode(errors="replace")
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                log_lines.append(line)
+                yield ndjson_event({"event": "log", "line": line})
+                match = TEST_OUTCOME_PATTERN.match(line)
+                if match:
+                    yield ndjson_event({
+                        "event": "test",
+                        "nodeid": match.group("nodeid"),
+                        "outcome": match.group("outcome").lower()
+                    })
+        if pending:
+            log_lines.append(pending)
+            yield ndjson_event({"event": "log", "line": pending})
+
+        result = container.wait()
+        logger.info(f"Container finished with exit code: {result['StatusCode']}")
+
+        yield ndjson_event({
+            "event": "result",
+            **finish_test_run(container, result["StatusCode"], "\n".join(log_lines), deadline)
+        })
+
+    except docker.errors.BuildError as e:
+        logger.error(f"Failed to build Docker image: {str(e)}")
+        yield ndjson_event({"event": "error", "status_code": 400, "detail": f"Failed to build Docker image: {str(e)}"})
+    except docker.errors.ImageNotFound as e:
+        forget_runner_image()
+        logger.error(f"Runner image disappeared: {str(e)}")
+        yield ndjson_event({"event": "error", "status_code": 503, "detail": "The test runner image is unavailable; retry the request"})
+    except docker.errors.APIError as e:
+        logger.error(f"Docker API error: {str(e)}")
+        yield ndjson_event({"event": "error", "status_code": 500, "detail": f"Docker API error: {str(e)}"})
+    finally:
+        cleanup_test_run(container)
@@ -0,0 +1,158 @@
+import ast
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.shared_cache import cache_stats
+from app.core.single_flight import request_key
+
+SANDBOX_CACHE_NAMESPACE = "pytest_run"
+
+# pytest exit codes for a run that finished: all passed, or some tests failed
+FINISHED_EXIT_CODES = (0, 1)
+
+# Modules any call into can make identical runs differ (randomness, clocks
+# of other processes, scheduling, the network or the filesystem)
+NONDETERMINISTIC_MODULES = frozenset({
+    "secrets", "threading", "multiprocessing", "concurrent", "asyncio", "subprocess", "socket", "tempfile",
+})
+
+# Functions of otherwise deterministic modules that read randomness or the clock
+NONDETERMINISTIC_FUNCTIONS = frozenset({
+    "uuid.uuid1", "uuid.uuid4",
+    "time.time", "time.time_ns", "time.monotonic", "time.monotonic_ns", "time.perf_counter",
+    "time.perf_counter_ns", "time.process_time", "time.localtime", "time.gmtime", "time.ctime", "time.asctime",
+    "datetime.datetime.now", "datetime.datetime.utcnow", "datetime.datetime.today", "datetime.date.today",
+    "os.urandom", "os.getrandom", "os.getpid",
+})
+
+# Random number modules and the call that makes them repeatable; their other
+# functions only count while no seed is set
+SEEDABLE_MODULES = {"random": "random.seed", "numpy.random": "numpy.random.seed"}
+ALWAYS_RANDOM = frozenset({"random.SystemRandom"})
+
+def sandbox_limits() -> Dict[str, Any]:
+    """Resource limits applied to every test container; part of the result cache key."""
+    return {
+        "timeout": settings.SANDBOX_TIMEOUT,
+        "memory": settings.SANDBOX_MEMORY_LIMIT,
+        "cpus": settings.SANDBOX_CPU_LIMIT,
+        "pids": settings.SANDBOX_PIDS_LIMIT,
+        "network": not settings.SANDBOX_NETWORK_DISABLED,
+    }
+
+def run_cache_key(code: str, test_code: Optional[str], image: str, limits: Dict[str, Any]) -> str:
+    """Everything that determines a sandbox run's outcome."""
+    return request_key(code, test_code or "", image, sorted(limits.items()))
+
+def _imported_names(trees: List[ast.AST]) -> Dict[str, str]:
+    """Local name -> qualified name for every import, e.g. {"np": "numpy", "now": "datetime.datetime.now"}."""
+    names: Dict[str, str] = {}
+    for tree in trees:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname:
+                        names[alias.asname] = alias.name
+                    else:
+                        top = alias.name.split(".")[0]
+                        names[top] = top
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                for alias in node.names:
+                    if alias.name != "*":
+                        names[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return names
+
+def _qualified_name(node: ast.AST, names: Dict[str, str]) -> Optional[str]:
+    """Qualified name of a called function, if it resolves through an import."""
+    attributes = []
+    while isinstance(node, ast.Attribute):
+        attributes.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name) or node.id not in names:
+        return None
+    return ".".join([names[node.id], *reversed(attributes)])
+
+def is_nondeterministic(code: str, test_code: Optional[str]) -> bool:
+    """
+    Whether the code or tests call something that can make identical runs differ.
+
+    Importing such a module is not enough: the generated tests import random
+    by convention, and only an unseeded call makes a rerun behave
+    differently. The tests star-import the code, so names imported by either
+    resolve in both.
+    """
+    trees = []
+    for source in (code, test_code or ""):
+        try:
+            trees.append(ast.parse(source))
+        except SyntaxError:
+            continue
+    names = _imported_names(trees)
+
+    calls = []
+    for tree in trees:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                name = _qualified_name(node.func, names)
+                if name is not None:
+                    calls.append((name, node))
+    seeded = {seed for seed in SEEDABLE_MODULES.values() if any(name == seed and node.args for name, node in calls)}
+
+    for name, node in calls:
+        if name in NONDETERMINISTIC_FUNCTIONS or name in ALWAYS_RANDOM:
+            return True
+        if name.split(".")[0] in NONDETERMINISTIC_MODULES:
+            return True
+        for module, seed in SEEDABLE_MODULES.items():
+            if name.startswith(module + ".") and name != seed and seed not in seeded:
+                if name.endswith(".Random") and node.args:
+                    # An explicitly seeded generator
+                    continue
+                return True
+    return False
+
+class SandboxCacheStats:
+    """Why sandbox runs were not stored in the result cache, in this process."""
+
+    def __init__(self):
+        self.skipped: Dict[str, int] = {}
+
+    def skip(self, reason: str) -> None:
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = cache_stats.stats().get(SANDBOX_CACHE_NAMESPACE, {})
+        return {
+            "enabled": settings.SANDBOX_RESULT_CACHE,
+            "hits": lookups.get("hits", 0),
+            "misses": lookups.get("misses", 0),
+            "hit_rate": lookups.get("hit_rate", 0.0),
+            "not_cached": dict(self.skipped),
+        }
+
+sandbox_cache_stats = SandboxCacheStats()
+
+def uncacheable_reason(result: Dict[str, Any], nondeterministic: bool) -> Optional[str]:
+    """Why a run's result must not be reused, or None when it can be."""
+    if result.get("timed_out"):
+        return "timeout"
+    if result.get("oom_killed"):
+        return "memory_limit"
+    if result.get("exit_code") not in FINISHED_EXIT_CODES:
+        return "abnormal_exit"
+    if nondeterministic:
+        return "nondeterministic"
+    tests = (result.get("report") or {}).get("tests") or []
+    if any(test.get("outcome") not in ("passed", "failed", "skipped", "xfailed") for test in tests):
+        # Setup errors, reruns and unexpected passes point at flaky tests
+        return "flaky_outcome"
+    if result.get("duration", 0.0) > settings.SANDBOX_TIMEOUT * settings.SANDBOX_CACHE_MAX_TIMEOUT_SHARE:
+        # Close enough to the limit that a rerun could time out
+        return "near_timeout"
+    return None
+
+def is_cacheable(result: Dict[str, Any], nondeterministic: bool) -> bool:
+    reason = uncacheable_reason(result, nondeterministic)
+    if reason is not None:
+        sandbox_cache_stats.skip(reason)
+        return False
+    return True
@@ -0,0 +1,234 @@
+import asyncio
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.sandbox_cache import sandbox_limits
+from app.core.shared_cache import REPLICA_ID
+from app.core.state_store import StateStore, get_state_store
+
+logger = setup_logger("sandbox_workers")
+
+# Layout in the shared state store:
+#   sandbox_workers/<worker id>       heartbeat: capacity, load, runner image and limits
+#   sandbox_jobs/<job id>             code and tests of a queued or running job
+#   sandbox_queue.<worker id>/<job>   jobs placed on a worker, claimed in order
+#   sandbox_events.<job id>/<seq>     batches of run events written by the worker
+# A job is claimed by taking the lock sandbox_job.<job id>; a dispatcher that
+# takes it first has revoked the job, and the worker drops it.
+WORKERS_NAMESPACE = "sandbox_workers"
+JOBS_NAMESPACE = "sandbox_jobs"
+
+TERMINAL_EVENTS = ("result", "error")
+
+# Seconds allowed after a job is claimed beyond SANDBOX_TIMEOUT, for
+# container setup and reading back the report
+RESULT_GRACE = 30.0
+
+def queue_namespace(worker_id: str) -> str:
+    return f"sandbox_queue.{worker_id}"
+
+def events_namespace(job_id: str) -> str:
+    return f"sandbox_events.{job_id}"
+
+def job_lock(job_id: str) -> str:
+    return f"sandbox_job.{job_id}"
+
+def heartbeat_ttl() -> float:
+    """Workers that miss three heartbeats are considered gone."""
+    return settings.SANDBOX_WORKER_HEARTBEAT_INTERVAL * 3
+
+class SandboxJobError(Exception):
+    """A remote run could not be completed; carries the HTTP status to report."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class _Moved(Exception):
+    """The job was revoked from its worker before being claimed and should be placed again."""
+
+class SandboxDispatcher:
+    """
+    Places test runs on sandbox workers and follows their events.
+
+    Each job goes to the compatible worker (same runner image and limits as
+    this replica, so cached results stay valid) with the lowest load,
+    counting both the load it last reported and the jobs this replica has
+    sent it since. A job still unclaimed after SANDBOX_CLAIM_TIMEOUT is
+    moved when its worker stopped heartbeating or another worker has a free
+    slot; otherwise it keeps its place in the queue until
+    SANDBOX_QUEUE_TIMEOUT.
+    """
+
+    def __init__(self):
+        self.in_flight: Dict[str, int] = {}
+        self.placed_total: Dict[str, int] = {}
+        self.moved_total = 0
+        self.failed_total = 0
+
+    async def live_workers(self, store: StateStore) -> List[Dict[str, Any]]:
+        ids = await store.keys(WORKERS_NAMESPACE)
+        workers = await asyncio.gather(*(store.get_json(WORKERS_NAMESPACE, worker_id) for worker_id in ids))
+        return [worker for worker in workers if worker is not None]
+
+    def _load(self, worker: Dict[str, Any]) -> float:
+        reported = worker.get("running", 0) + worker.get("queued", 0)
+        capacity = worker.get("capacity", 0)
+        if capacity <= 0:
+            # Draining
+            return float("inf")
+        return max(reported, self.in_flight.get(worker["id"], 0)) / capacity
+
+    def _compatible(self, worker: Dict[str, Any], image: str) -> bool:
+        return worker.get("image") == image and worker.get("limits") == sandbox_limits()
+
+    async def _place(self, store: StateStore, image: str, exclude: Set[str]) -> Optional[str]:
+        candidates = [
+            worker for worker in await self.live_workers(store)
+            if worker["id"] not in exclude and self._compatible(worker, image) and worker.get("capacity", 0) > 0
+        ]
+        if not candidates:
+            return None
+        lowest = min(self._load(worker) for worker in candidates)
+        return random.choice([worker["id"] for worker in candidates if self._load(worker) == lowest])
+
+    async def _should_move(self, store: StateStore, worker_id: str, image: str) -> bool:
+        """Whether an unclaimed job would start sooner elsewhere."""
+        workers = {worker["id"]: worker for worker in await self.live_workers(store)}
+        if worker_id not in workers or workers[worker_id].get("capacity", 0) <= 0:
+            return True
+        return any(
+            self._compatible(worker, image) and self._load(worker) < 1.0
+            for other_id, worker in workers.items() if other_id != worker_id
+        )
+
+    async def _follow(
+        self, store: StateStore, job_id: str, worker_id: str, image: str, queued_at: float
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job's events until a result or error; raises _Moved if it was revoked."""
+        namespace = events_namespace(job_id)
+        loop = asyncio.get_running_loop()
+        last_check = loop.time()
+        claimed_at: Optional[float] = None
+        seen = 0
+        while True:
+            keys = await store.keys(namespace, limit=100, offset=seen)
+            for key in keys:
+                seen += 1
+                entry = await store.get_json(namespace, key)
+                if entry is None:
+                    continue
+                if claimed_at is None:
+                    claimed_at = loop.time()
+                for event in entry["events"]:
+                    if event["event"] != "claimed":
+                        yield event
+                    if event["event"] in TERMINAL_EVENTS:
+                        return
+            if keys:
+                continue
+
+            now = loop.time()
+            if claimed_at is None:
+                timed_out = now - queued_at > settings.SANDBOX_QUEUE_TIMEOUT
+                if timed_out or now - last_check > settings.SANDBOX_CLAIM_TIMEOUT:
+                    last_check = now
+                    if timed_out or await self._should_move(store, worker_id, image):
+                        if await store.acquire_lock(job_lock(job_id), f"dispatcher-{REPLICA_ID}", settings.SANDBOX_JOB_TTL):
+                            await store.delete(queue_namespace(worker_id), job_id)
+                            await store.delete(JOBS_NAMESPACE, job_id)
+                            if timed_out:
+                                raise SandboxJobError(503, "Sandbox workers are busy; retry the request")
+                            raise _Moved()
+                        # The worker claimed it meanwhile; its first events are on the way
+                        claimed_at = now
+            else:
+                if now - claimed_at > settings.SANDBOX_TIMEOUT + RESULT_GRACE:
+                    raise SandboxJobError(504, f"Sandbox worker {worker_id} did not return a result in time")
+                if now - last_check > heartbeat_ttl():
+                    last_check = now
+                    if await store.get(WORKERS_NAMESPACE, worker_id) is None:
+                        raise SandboxJobError(503, f"Sandbox worker {worker_id} stopped responding; retry the request")
+            await asyncio.sleep(settings.SANDBOX_WORKER_POLL_INTERVAL)
+
+    async def stream(self, code: str, test_code: Optional[str], image: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run code and tests on a sandbox worker, yielding the same events as
+        a local streamed run. Raises SandboxJobError when no worker can run it.
+        """
+        store = get_state_store()
+        if store is None:
+            raise SandboxJobError(503, "Remote sandbox execution needs a shared state store (STATE_BACKEND)")
+
+        queued_at = asyncio.get_running_loop().time()
+        moved_from: Set[str] = set()
+        while True:
+            worker_id = await self._place(store, image, moved_from)
+            if worker_id is None and moved_from:
+                # Every other worker was tried; queue on the least loaded one again
+                worker_id = await self._place(store, image, set())
+            if worker_id is None:
+                self.failed_total += 1
+                raise SandboxJobError(503, "No sandbox workers are available; retry the request")
+            # Counted before any await so concurrent placements see it
+            self.in_flight[worker_id] = self.in_flight.get(worker_id, 0) + 1
+            self.placed_total[worker_id] = self.placed_total.get(worker_id, 0) + 1
+
+            job_id = uuid.uuid4().hex
+            try:
+                await store.set_json(JOBS_NAMESPACE, job_id, {
+                    "code": code,
+                    "test_code": test_code,
+                    "image": image,
+                    "dispatcher": REPLICA_ID,
+                    "submitted_at": time.time()
+                }, ttl=settings.SANDBOX_JOB_TTL)
+                await store.set(queue_namespace(worker_id), job_id, b"", ttl=settings.SANDBOX_JOB_TTL)
+                async for event in self._follow(store, job_id, worker_id, image, queued_at):
+                    yield event
+                return
+            except _Moved:
+                self.moved_total += 1
+                moved_from.add(worker_id)
+                logger.info(f"Moved unclaimed job {job_id} off sandbox worker {worker_id}")
+            except SandboxJobError:
+                self.failed_total += 1
+                raise
+            finally:
+                self.in_flight[worker_id] -= 1
+
+    async def run(self, code: str, test_code: Optional[str], image: str) -> Dict[str, Any]:
+        """Run on a sandbox worker and return the same result as a local run."""
+        events = self.stream(code, test_code, image)
+        try:
+            async for event in events:
+                if event["event"] == "result":
+                    return {key: value for key, value in event.items() if key != "event"}
+                if event["event"] == "error":
+                    raise SandboxJobError(event.get("status_code", 500), event.get("detail", "Sandbox run failed"))
+        finally:
+            # Release the placement now rather than when the generator is collected
+            await events.aclose()
+        raise SandboxJobError(502, "Sandbox worker finished without a result")
+
+    async def stats(self) -> Dict[str, Any]:
+        store = get_state_store()
+        workers = await self.live_workers(store) if store is not None else []
+        return {
+            "execution": settings.SANDBOX_EXECUTION,
+            "workers": [
+                {**{key: value for key, value in worker.items() if key != "limits"},
+                 "load": round(self._load(worker), 3) if worker.get("capacity", 0) > 0 else None}
+                for worker in workers
+            ],
+            "in_flight": {worker_id: count for worker_id, count in self.in_flight.items() if count},
+            "placed_total": dict(self.placed_total),
+            "moved_total": self.moved_total,
+            "failed_total": self.failed_total,
+        }
+
+sandbox_dispatcher = SandboxDispatcher()
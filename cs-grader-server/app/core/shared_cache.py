@@ -0,0 +1,124 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.state_store import get_state_store
+
+logger = setup_logger("shared_cache")
+
+# Identifies this process as a lock owner in the shared store
+REPLICA_ID = uuid.uuid4().hex
+
+class CacheStats:
+    """Per-namespace hit/miss counters of this process's shared cache lookups."""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def incr(self, namespace: str, field: str) -> None:
+        counts = self._counts.setdefault(
+            namespace, {"hits": 0, "misses": 0, "waited": 0, "store_errors": 0}
+        )
+        counts[field] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for namespace, counts in self._counts.items():
+            lookups = counts["hits"] + counts["misses"]
+            result[namespace] = {
+                **counts,
+                "hit_rate": round(counts["hits"] / lookups, 3) if lookups else 0.0,
+            }
+        return result
+
+cache_stats = CacheStats()
+
+async def _lookup(namespace: str, key: str) -> Optional[Any]:
+    store = get_state_store()
+    try:
+        return await store.get_json(namespace, key)
+    except Exception as e:
+        cache_stats.incr(namespace, "store_errors")
+        logger.warning(f"State store read failed for {namespace}: {str(e)}")
+        return None
+
+async def _try_lock(name: str) -> bool:
+    try:
+        return await get_state_store().acquire_lock(name, REPLICA_ID, settings.CACHE_LOCK_TTL)
+    except Exception as e:
+        logger.warning(f"State store lock failed for {name}: {str(e)}")
+        # Without the store, compute locally rather than waiting on nothing
+        return True
+
+async def _compute_and_store(
+    namespace: str, key: str, compute: Callable[[], Awaitable[Any]],
+    ttl: Optional[float], lock_name: str, cacheable: Optional[Callable[[Any], bool]]
+) -> Any:
+    try:
+        value = await compute()
+        if value is not None and (cacheable is None or cacheable(value)):
+            try:
+                await get_state_store().set_json(namespace, key, value, ttl)
+            except Exception as e:
+                cache_stats.incr(namespace, "store_errors")
+                logger.warning(f"State store write failed for {namespace}: {str(e)}")
+        return value
+    finally:
+        try:
+            await get_state_store().release_lock(lock_name, REPLICA_ID)
+        except Exception as e:
+            logger.warning(f"State store unlock failed for {lock_name}: {str(e)}")
+
+async def cached(
+    namespace: str,
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: Optional[float] = None,
+    cacheable: Optional[Callable[[Any], bool]] = None,
+) -> Tuple[Any, bool]:
+    """
+    Return the shared cache entry for (namespace, key), computing it on a miss.
+
+    On a miss the replica that takes the key's lock computes and stores the
+    value; other replicas wait up to CACHE_LOCK_WAIT for it to appear, then
+    compute it themselves. `compute` must return JSON-serialisable data;
+    None, exceptions and values `cacheable` rejects are not cached. Store
+    failures fall back to calling `compute` directly. Combine with
+    SingleFlight for in-process coalescing.
+
+    Returns:
+        Tuple[Any, bool]: The value and whether it came from the cache
+    """
+    if get_state_store() is None:
+        return await compute(), False
+
+    ttl = ttl if ttl is not None else settings.CACHE_TTL_SECONDS
+    value = await _lookup(namespace, key)
+    if value is not None:
+        cache_stats.incr(namespace, "hits")
+        return value, True
+
+    lock_name = f"{namespace}:{key}"
+    if await _try_lock(lock_name):
+        cache_stats.incr(namespace, "misses")
+        return await _compute_and_store(namespace, key, compute, ttl, lock_name, cacheable), False
+
+    # Another replica is computing this entry; wait for its result
+    cache_stats.incr(namespace, "waited")
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.CACHE_POLL_INTERVAL)
+        value = await _lookup(namespace, key)
+        if value is not None:
+            cache_stats.incr(namespace, "hits")
+            return value, True
+        if await _try_lock(lock_name):
+            # The other replica gave up or failed; compute it here
+            break
+    else:
+        logger.info(f"Gave up waiting for {namespace} entry {key[:12]} from another replica")
+
+    cache_stats.incr(namespace, "misses")
+    return await _compute_and_store(namespace, key, compute, ttl, lock_name, cacheable), False
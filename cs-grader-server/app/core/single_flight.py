@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar
+from app.core.logging import setup_logger
+
+logger = setup_logger("single_flight")
+
+T = TypeVar("T")
+
+def request_key(*parts: Any) -> str:
+    """Stable fingerprint of the inputs that fully determine a provider call."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode()
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+class _Call(Generic[T]):
+    def __init__(self, task: "asyncio.Task[T]"):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one.
+
+    The first caller starts the work as a task; callers arriving while it is
+    in flight await the same task instead of calling the provider again.
+    A cancelled caller only stops waiting: the shared task keeps running for
+    the others and is cancelled only when its last waiter has gone. Nothing
+    is cached once the task finishes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self.calls_total = 0
+        self.coalesced_total = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self.calls_total += 1
+        else:
+            self.coalesced_total += 1
+            logger.debug(f"{self.name}: joined in-flight call {key[:12]}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller gave up; stop the provider call
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "calls_total": self.calls_total,
+            "coalesced_total": self.coalesced_total,
+        }
+
+_groups: Dict[str, SingleFlight] = {}
+
+def single_flight(name: str) -> SingleFlight:
+    """Return the process-wide SingleFlight group with this name."""
+    if name not in _groups:
+        _groups[name] = SingleFlight(name)
+    return _groups[name]
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import httpx
+from app.core.config import settings
+from app.core.logging import setup_logger
+
+logger = setup_logger("state_store")
+
+# Carries STATE_SERVICE_TOKEN on every request to the state service
+STATE_TOKEN_HEADER = "X-State-Token"
+
+class StateStore(ABC):
+    """
+    Storage for state shared between server replicas: cache entries, job
+    records and locks.
+
+    Values are bytes under a (namespace, key) pair with an optional TTL in
+    seconds. Locks are leases: `acquire_lock` succeeds when the lock is free
+    or its previous lease expired, and only the owner can release it.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, namespace: str, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def keys(self, namespace: str, limit: int = 1000, offset: int = 0) -> List[str]:
+        """Unexpired keys in a namespace, least recently written first."""
+
+    @abstractmethod
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        ...
+
+    @abstractmethod
+    async def release_lock(self, name: str, owner: str) -> None:
+        ...
+
+    async def get_json(self, namespace: str, key: str) -> Optional[Any]:
+        value = await self.get(namespace, key)
+        return None if value is None else json.loads(value)
+
+    async def set_json(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.set(namespace, key, json.dumps(value).encode(), ttl)
+
+    async def close(self) -> None:
+        pass
+
+class SqliteStateStore(StateStore):
+    """
+    State in a local SQLite file.
+
+    Shared by every process on the host that opens the same path (WAL mode
+    lets readers and the writer run at the same time). Calls run in a worker
+    thread; one connection is used behind a lock.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "expires_at REAL, updated_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time.time():
+                self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                self._conn.commit()
+                return None
+            return bytes(value)
+
+    def _set(self, namespace: str, key: str, value: bytes, ttl: Optional[float]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, now + ttl if ttl else None, now)
+            )
+            self._conn.commit()
+
+    def _delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+            self._conn.commit()
+
+    def _keys(self, namespace: str, limit: int, offset: int) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) "
+                "ORDER BY updated_at, key LIMIT ? OFFSET ?",
+                (namespace, time.time(), limit, offset)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # Take the lock if it is free, expired or already ours (renewal)
+            cursor = self._conn.execute(
+                "INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE locks.expires_at <= ? OR locks.owner = excluded.owner",
+                (name, owner, now + ttl, now)
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def _release_lock(self, name: str, owner: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries and locks; returns the number of entries removed."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self._conn.execute("DELETE FROM locks WHERE expires_at <= ?", (now,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    async def get(self, namespace: str, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, namespace, key)
+
+    async def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self._set, namespace, key, value, ttl)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await asyncio.to_thread(self._delete, namespace, key)
+
+    async def keys(self, namespace: str, limit: int = 1000, offset: int = 0) -> List[str]:
+        return await asyncio.to_thread(self._keys, namespace, limit, offset)
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        return await asyncio.to_thread(self._acquire_lock, name, owner, ttl)
+
+    async def release_lock(self, name: str, owner: str) -> None:
+        await asyncio.to_thread(self._release_lock, name, owner)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class HttpStateStore(StateStore):
+    """
+    State held by a state service over HTTP (see app/state_service.py).
+
+    Lets replicas on different hosts share caches and locks; point every
+    replica's STATE_SERVICE_URL at the same service.
+    """
+
+    name = "http"
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 2.0,
+        token: str = "",
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            headers={STATE_TOKEN_HEADER: token} if token else None,
+            transport=transport
+        )
+
+    async def get(self, namespace: str, key: str) -> Optional[bytes]:
+        response = await self._client.get(f"/kv/{namespace}/{key}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.content
+
+    async def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        params = {"ttl": ttl} if ttl else {}
+        response = await self._client.put(f"/kv/{namespace}/{key}", content=value, params=params)
+        response.raise_for_status()
+
+    async def delete(self, namespace: str, key: str) -> None:
+        response = await self._client.delete(f"/kv/{namespace}/{key}")
+        response.raise_for_status()
+
+    async def keys(self, namespace: str, limit: int = 1000, offset: int = 0) -> List[str]:
+        response = await self._client.get(f"/kv/{namespace}", params={"limit": limit, "offset": offset})
+        response.raise_for_status()
+        return response.json()["keys"]
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        response = await self._client.post(f"/locks/{name}", json={"owner": owner, "ttl": ttl})
+        response.raise_for_status()
+        return response.json()["acquired"]
+
+    async def release_lock(self, name: str, owner: str) -> None:
+        response = await self._client.delete(f"/locks/{name}", params={"owner": owner})
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+async def purge_periodically(store: SqliteStateStore, interval: float) -> None:
+    """
+    Delete expired entries and locks every `interval` seconds until cancelled.
+
+    Reads already ignore expired rows; this keeps the file from growing with
+    entries nobody reads again.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await asyncio.to_thread(store.purge_expired)
+            if removed:
+                logger.info(f"Purged {removed} expired state entries")
+        except Exception as e:
+            logger.warning(f"Purging expired state failed: {str(e)}")
+
+def create_state_store() -> Optional[StateStore]:
+    """The store selected by STATE_BACKEND, or None when shared state is disabled."""
+    backend = settings.STATE_BACKEND
+    if backend == "sqlite":
+        return SqliteStateStore(settings.STATE_DB_PATH)
+    if backend == "http":
+        return HttpStateStore(
+            settings.STATE_SERVICE_URL, timeout=settings.STATE_SERVICE_TIMEOUT, token=settings.STATE_SERVICE_TOKEN
+        )
+    if backend != "none":
+        logger.warning(f"Unknown STATE_BACKEND '{backend}'; shared state is disabled")
+    return None
+
+_store: Optional[StateStore] = None
+_store_created = False
+
+def get_state_store() -> Optional[StateStore]:
+    """Return the process-wide state store, creating it on first use."""
+    global _store, _store_created
+    if not _store_created:
+        _store_created = True
+        try:
+            _store = create_state_store()
+        except Exception as e:
+            logger.error(f"Could not open the state store, shared state is disabled: {str(e)}")
+            _store = None
+        if _store is not None:
+            logger.info(f"Using the {_store.name} state store")
+    return _store
+
+def state_store_info() -> Dict[str, Any]:
+    store = get_state_store()
+    return {"backend": store.name if store is not None else "none"}
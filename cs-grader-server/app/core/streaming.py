@@ -0,0 +1,8 @@
+import orjson
+from typing import Any, Dict
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def ndjson_event(event: Dict[str, Any]) -> bytes:
+    """Encode a single event as one line of newline-delimited JSON."""
+    return orjson.dumps(event) + b"\n"
@@ -0,0 +1,171 @@
+import base64
+import inspect
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.pipeline import StageFn, StageSkipped
+from app.core.single_flight import request_key
+from app.core.state_store import get_state_store
+
+logger = setup_logger("submissions")
+
+SUBMISSIONS_NAMESPACE = "submissions"
+SUBMISSION_FILES_NAMESPACE = "submission_files"
+
+# (name, filename, bytes, content type) of one uploaded file, as sent to files-to-text
+FormFile = Tuple[str, Tuple[str, bytes, str]]
+
+_versions: Dict[str, str] = {}
+
+def _source(part: Any) -> str:
+    if callable(part):
+        try:
+            return inspect.getsource(part)
+        except (OSError, TypeError):
+            return getattr(part, "__qualname__", repr(part))
+    if isinstance(part, (dict, list)):
+        return json.dumps(part, sort_keys=True, default=str)
+    return str(part)
+
+def register_version(name: str, model: str, *templates: Any) -> str:
+    """
+    Record the version of a provider-backed step: its model plus a hash of
+    the prompt templates, schemas and parsers that shape its output.
+
+    Functions are hashed by their source, so editing a prompt template
+    changes the version without anyone having to bump it.
+    """
+    version = request_key(model, *(_source(template) for template in templates))[:16]
+    _versions[name] = version
+    return version
+
+def component_version(name: str) -> str:
+    return _versions.get(name, "unregistered")
+
+def stage_fingerprint(*parts: Any) -> str:
+    """Fingerprint of a pipeline stage from the versions and settings it depends on."""
+    return request_key(*parts)[:16]
+
+def submission_id_for(*form_groups: List[FormFile]) -> str:
+    """Submissions are identified by the uploaded bytes, so a resubmission updates the same record."""
+    parts: List[Any] = []
+    for group in form_groups:
+        parts.append(len(group))
+        for _, (filename, content, content_type) in group:
+            parts.extend((filename, content_type, content))
+    return request_key(*parts)[:32]
+
+def _inputs_hash(inputs: Dict[str, Any]) -> str:
+    return request_key(json.dumps(inputs, sort_keys=True, default=str))[:16]
+
+class StageRecorder:
+    """
+    Records what each pipeline stage consumed and produced, and on a regrade
+    reuses a stage's stored output when neither its fingerprint nor its
+    inputs changed.
+
+    A stage whose fingerprint changed is recomputed; its new output then
+    changes the inputs of the stages after it, so those are recomputed too
+    while unaffected branches are reused.
+    """
+
+    def __init__(self, previous: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.previous = previous or {}
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.reused: List[str] = []
+
+    def wrap(self, name: str, fn: StageFn, fingerprint: str) -> StageFn:
+        async def run(inputs: Dict[str, Any]) -> Any:
+            inputs_hash = _inputs_hash(inputs)
+            old = self.previous.get(name)
+            if old is not None and old.get("status") == "ok" \
+                    and old.get("fingerprint") == fingerprint and old.get("inputs_hash") == inputs_hash:
+                self.reused.append(name)
+                self.records[name] = old
+                return old["output"]
+
+            record = {"fingerprint": fingerprint, "inputs": sorted(inputs), "inputs_hash": inputs_hash}
+            try:
+                value = await fn(inputs)
+            except StageSkipped as e:
+                self.records[name] = {**record, "status": "skipped", "reason": e.reason, "recorded_at": time.time()}
+                raise
+            except Exception as e:
+                self.records[name] = {**record, "status": "failed", "error": str(e), "recorded_at": time.time()}
+                raise
+            self.records[name] = {**record, "status": "ok", "output": value, "recorded_at": time.time()}
+            return value
+        return run
+
+    @property
+    def recomputed(self) -> List[str]:
+        return [name for name in self.records if name not in self.reused]
+
+def _encode_files(form_data: List[FormFile]) -> List[Dict[str, str]]:
+    return [
+        {"filename": filename, "content_type": content_type, "data": base64.b64encode(content).decode()}
+        for _, (filename, content, content_type) in form_data
+    ]
+
+def _decode_files(files: List[Dict[str, str]]) -> List[FormFile]:
+    return [
+        ("files", (f["filename"], base64.b64decode(f["data"]), f["content_type"]))
+        for f in files
+    ]
+
+class SubmissionStore:
+    """
+    Per-submission stage records and uploads, kept in the shared state store
+    for SUBMISSION_RETENTION_DAYS after the submission was last graded.
+    """
+
+    async def save(
+        self, submission_id: str, records: Dict[str, Dict[str, Any]], options: Dict[str, Any],
+        files: Optional[Dict[str, List[FormFile]]] = None
+    ) -> None:
+        store = get_state_store()
+        if store is None or not settings.SUBMISSION_RECORDS_ENABLED:
+            return
+        # Every regrade saves again, which restarts the retention period
+        ttl = settings.SUBMISSION_RETENTION_DAYS * 24 * 3600 or None
+        try:
+            if files is not None:
+                await store.set_json(
+                    SUBMISSION_FILES_NAMESPACE, submission_id,
+                    {name: _encode_files(form_data) for name, form_data in files.items()},
+                    ttl=ttl
+                )
+            await store.set_json(SUBMISSIONS_NAMESPACE, submission_id, {
+                "id": submission_id,
+                "updated_at": time.time(),
+                "options": options,
+                "stages": records
+            }, ttl=ttl)
+        except Exception as e:
+            # Grading already succeeded; losing the record only costs a full regrade later
+            logger.warning(f"Failed to save submission {submission_id}: {str(e)}")
+
+    async def load(self, submission_id: str) -> Optional[Dict[str, Any]]:
+        store = get_state_store()
+        if store is None:
+            return None
+        return await store.get_json(SUBMISSIONS_NAMESPACE, submission_id)
+
+    async def load_files(self, submission_id: str) -> Optional[Dict[str, List[FormFile]]]:
+        store = get_state_store()
+        if store is None:
+            return None
+        files = await store.get_json(SUBMISSION_FILES_NAMESPACE, submission_id)
+        if files is None:
+            return None
+        return {name: _decode_files(encoded) for name, encoded in files.items()}
+
+    async def list_ids(self, limit: int = 1000, offset: int = 0) -> List[str]:
+        store = get_state_store()
+        if store is None:
+            return []
+        return await store.keys(SUBMISSIONS_NAMESPACE, limit, offset)
+
+submission_store = SubmissionStore()
@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.algorithm_documents import parse_algorithm_document, ALGORITHM_FIELDS
+from app.core.logging import setup_logger
+
+logger = setup_logger("vector_index")
+
+class InMemoryVectorIndex:
+    """
+    Exact cosine top-k over the whole `algorithms` collection held in memory.
+
+    Embeddings are L2-normalised into one contiguous float32 matrix (or an int8
+    matrix with a per-row scale) so a batch of queries is a single matrix
+    multiply. Documents are parsed once at load time.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        embeddings: Any,
+        documents: Sequence[Optional[Dict[str, Any]]],
+        quantize: bool = False,
+    ):
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids) or len(ids) != len(documents):
+            raise ValueError("ids, embeddings and documents must have the same length")
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.rows = {id_: i for i, id_ in enumerate(self.ids)}
+        self.quantized = quantize
+        if quantize:
+            scale = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127.0
+            self._matrix = np.ascontiguousarray(np.round(matrix / scale[:, None]).astype(np.int8))
+            self._scale = scale.astype(np.float32)
+        else:
+            self._matrix = matrix
+            self._scale = None
+
+    @classmethod
+    def from_collection(cls, collection, quantize: bool = False) -> "InMemoryVectorIndex":
+        """Load every embedding and document from a Chroma collection."""
+        data = collection.get(include=["embeddings", "documents"])
+        ids = data.get("ids") or []
+        embeddings = data.get("embeddings")
+        if embeddings is None or len(ids) == 0:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        documents = [parse_algorithm_document(doc) if doc else None for doc in data.get("documents") or []]
+        index = cls(ids, embeddings, documents, quantize=quantize)
+        logger.info(f"Loaded {len(index)} embeddings into memory ({index.nbytes / 1024:.0f} KiB, quantized={quantize})")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes + (self._scale.nbytes if self._scale is not None else 0)
+
+    def similarities(self, query_embeddings: Any) -> np.ndarray:
+        """Cosine similarity of each query (rows) against every stored embedding (columns)."""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = queries @ self._matrix.T.astype(np.float32, copy=False)
+        if self._scale is not None:
+            scores *= self._scale
+        return scores
+
+    def similarities_for(self, query_embedding: Sequence[float], ids: Sequence[str]) -> Dict[str, float]:
+        """Exact cosine similarity of one query to specific stored ids."""
+        rows = [self.rows[id_] for id_ in ids if id_ in self.rows]
+        if not rows:
+            return {}
+        scores = self.similarities([query_embedding])[0]
+        return {self.ids[row]: float(scores[row]) for row in rows}
+
+    def document(self, id_: str) -> Optional[Dict[str, Any]]:
+        row = self.rows.get(id_)
+        return self.documents[row] if row is not None else None
+
+    def search(
+        self, query_embeddings: Any, n_results: int, min_similarity: Optional[float] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Batched top-k: one list of (row, similarity) per query, best first, above min_similarity."""
+        if len(self) == 0:
+            return [[] for _ in np.atleast_2d(query_embeddings)]
+        scores = self.similarities(query_embeddings)
+        k = min(n_results, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, top):
+            if min_similarity is not None:
+                candidates = candidates[row[candidates] >= min_similarity]
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append([(int(i), float(row[i])) for i in ordered])
+        return results
+
+    def query(
+        self,
+        query_embedding: Sequence[float],
+        n_results: int,
+        min_similarity: Optional[float] = None,
+        include: Sequence[str] = ALGORITHM_FIELDS,
+    ) -> List[Dict[str, Any]]:
+        """Top-k algorithms for one query, shaped like ChromaMiddleware results."""
+        algorithms = []
+        for i, similarity in self.search([query_embedding], n_results, min_similarity)[0]:
+            document = self.documents[i]
+            if document is not None:
+                algorithms.append({
+                    "id": self.ids[i],
+                    **{field: document[field] for field in include},
+                    "similarity": similarity
+                })
+        return algorithms
@@ -1,14 +1,58 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.core.logging import setup_logger
+from app.core.outbound import (
+    current_tenant, TENANT_HEADER, DEFAULT_TENANT,
+    current_request_class, REQUEST_CLASS_HEADER, parse_request_class, QueueFullError, outbound
+)
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.compression import CompressionMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.admission import AdmissionMiddleware, admission
+from app.api.v1.endpoints.evaluateLogic import chroma_middleware
+from app.core.embeddings import get_embedding_provider
+from app.core.state_store import SqliteStateStore, get_state_store, purge_periodically
+from app.core.image_preprocessing import shutdown_pool
+import asyncio
 import logging
+import math
 
 # Set up logger
 logger = setup_logger("main")
 logger.setLevel(logging.DEBUG)  # Set to debug level
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Load the embedding model, and run the corpus watcher and the purge of
+    expired shared state, when enabled, for the lifetime of the app. The
+    image pre-processing workers are stopped on shutdown.
+    """
+    try:
+        await get_embedding_provider().warm_up()
+    except Exception as e:
+        # Retrieval falls back to lexical search until the provider works
+        logger.error(f"Embedding provider failed to load: {str(e)}")
+    watcher = None
+    if settings.CORPUS_WATCH_INTERVAL > 0:
+        watcher = asyncio.create_task(chroma_middleware.watch(settings.CORPUS_WATCH_INTERVAL))
+    purger = None
+    store = get_state_store()
+    # An http store is purged by the state service itself
+    if isinstance(store, SqliteStateStore) and settings.STATE_PURGE_INTERVAL > 0:
+        purger = asyncio.create_task(purge_periodically(store, settings.STATE_PURGE_INTERVAL))
+    try:
+        yield
+    finally:
+        for task in (watcher, purger):
+            if task is not None:
+                task.cancel()
+        await asyncio.to_thread(shutdown_pool)
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API for CS Grader with Gemini and Cohere integration",
@@ -16,8 +60,13 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url=f"{settings.API_V1_STR}/docs",  # Swagger UI endpoint
     redoc_url=f"{settings.API_V1_STR}/redoc",  # ReDoc endpoint
+    default_response_class=ORJSONResponse,  # orjson is several times faster than the stdlib encoder
+    lifespan=lifespan,
 )
 
+# Added first so it is innermost: its 503s still get CORS headers
+app.add_middleware(AdmissionMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +75,41 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_SIZE)
+
+@app.middleware("http")
+async def bind_tenant(request: Request, call_next):
+    """Expose the caller's tenant and request class to the outbound scheduler for fair queuing."""
+    token = current_tenant.set(request.headers.get(TENANT_HEADER, DEFAULT_TENANT))
+    class_token = current_request_class.set(parse_request_class(request.headers.get(REQUEST_CLASS_HEADER)))
+    try:
+        return await call_next(request)
+    finally:
+        current_request_class.reset(class_token)
+        current_tenant.reset(token)
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """A provider's circuit is open: fail fast with a 503 and when to retry."""
+    return ORJSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "provider": exc.provider},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    """A provider's queue for this request class is full: shed the request."""
+    return ORJSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "provider": exc.provider, "request_class": exc.lane},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
+
+# Added last so it is outermost and times the whole request, streams included
+app.add_middleware(ProfilingMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
@@ -35,4 +119,16 @@ async def root():
         "docs_url": f"{settings.API_V1_STR}/docs",
         "redoc_url": f"{settings.API_V1_STR}/redoc",
         "openapi_url": f"{settings.API_V1_STR}/openapi.json"
-    } 
\ No newline at end of file
+    } 
+
+@app.get("/health")
+async def health():
+    """
+    Liveness plus current load: admission pressure ("ok", "busy" or
+    "saturated"), in-flight and queued requests, reserved memory per route
+    and providers whose circuit is open.
+    """
+    return {
+        **admission.pressure(),
+        "open_circuits": outbound.open_circuits()
+    }
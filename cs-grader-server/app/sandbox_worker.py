@@ -0,0 +1,182 @@
+"""
+Sandbox worker for SANDBOX_EXECUTION=remote.
+
+Runs test jobs on this host's Docker daemon so the API replicas don't need
+the Docker socket. It heartbeats its capacity and load into the shared state
+store, claims jobs the replicas place in its queue and writes each run's
+events back as they happen. Start one per sandbox host, with the same
+sandbox settings (runner image and limits) as the replicas and a state store
+they share (STATE_BACKEND=http and STATE_SERVICE_URL across hosts):
+
+    python -m app.sandbox_worker --capacity 4
+
+SIGTERM or Ctrl-C stops taking jobs, lets running ones finish and removes
+the worker's heartbeat.
+"""
+import argparse
+import asyncio
+import json
+import signal
+import socket
+import time
+import uuid
+from typing import Any, Dict, List
+from fastapi import HTTPException
+from starlette.concurrency import iterate_in_threadpool
+from app.core.config import settings
+from app.core.logging import setup_logger
+from app.core.sandbox import get_docker_client, get_runner_image, runner_image_ref, stream_pytest_in_container
+from app.core.sandbox_cache import sandbox_limits
+from app.core.sandbox_workers import (
+    WORKERS_NAMESPACE, JOBS_NAMESPACE, queue_namespace, events_namespace, job_lock, heartbeat_ttl
+)
+from app.core.state_store import StateStore, get_state_store
+
+logger = setup_logger("sandbox_worker")
+
+# Log lines are sent in batches: when this many are waiting, when this
+# many seconds passed since the last batch, or with the next non-log event
+LOG_BATCH_LINES = 50
+LOG_BATCH_SECONDS = 0.25
+
+class EventWriter:
+    """Appends batches of one job's events under increasing keys."""
+
+    def __init__(self, store: StateStore, job_id: str):
+        self.store = store
+        self.namespace = events_namespace(job_id)
+        self.seq = 0
+
+    async def write(self, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        await self.store.set_json(self.namespace, f"{self.seq:08d}", {"events": events}, ttl=settings.SANDBOX_JOB_TTL)
+        self.seq += 1
+
+class SandboxWorker:
+    def __init__(self, store: StateStore, worker_id: str, capacity: int):
+        self.store = store
+        self.worker_id = worker_id
+        self.capacity = capacity
+        self.image_id = ""
+        self.running: Dict[str, asyncio.Task] = {}
+        self.completed_total = 0
+        self.started_at = time.time()
+        self.stopping = asyncio.Event()
+
+    async def heartbeat(self) -> None:
+        queued = len(await self.store.keys(queue_namespace(self.worker_id)))
+        await self.store.set_json(WORKERS_NAMESPACE, self.worker_id, {
+            "id": self.worker_id,
+            "host": socket.gethostname(),
+            # A draining worker gets no new jobs
+            "capacity": 0 if self.stopping.is_set() else self.capacity,
+            "running": len(self.running),
+            "queued": queued,
+            "completed_total": self.completed_total,
+            "image": runner_image_ref(),
+            "image_id": self.image_id,
+            "limits": sandbox_limits(),
+            "started_at": self.started_at,
+            "updated_at": time.time()
+        }, ttl=heartbeat_ttl())
+
+    async def heartbeat_forever(self) -> None:
+        while True:
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {str(e)}")
+            await asyncio.sleep(settings.SANDBOX_WORKER_HEARTBEAT_INTERVAL)
+
+    async def claim(self, free: int) -> None:
+        """Take up to `free` jobs from this worker's queue, oldest first."""
+        namespace = queue_namespace(self.worker_id)
+        for job_id in await self.store.keys(namespace, limit=free):
+            claimed = await self.store.acquire_lock(job_lock(job_id), self.worker_id, settings.SANDBOX_JOB_TTL)
+            await self.store.delete(namespace, job_id)
+            if not claimed:
+                # Revoked by the dispatcher and placed on another worker
+                continue
+            job = await self.store.get_json(JOBS_NAMESPACE, job_id)
+            if job is None:
+                continue
+            task = asyncio.create_task(self.run_job(job_id, job))
+            self.running[job_id] = task
+            task.add_done_callback(lambda _, job_id=job_id: self.running.pop(job_id, None))
+
+    async def run_job(self, job_id: str, job: Dict[str, Any]) -> None:
+        logger.info(f"Running job {job_id}")
+        writer = EventWriter(self.store, job_id)
+        try:
+            await writer.write([{"event": "claimed", "worker": self.worker_id}])
+            client = await asyncio.to_thread(get_docker_client)
+            batch: List[Dict[str, Any]] = []
+            last_write = time.monotonic()
+            async for line in iterate_in_threadpool(stream_pytest_in_container(client, job["code"], job.get("test_code"))):
+                event = json.loads(line)
+                batch.append(event)
+                if event["event"] != "log" or len(batch) >= LOG_BATCH_LINES \
+                        or time.monotonic() - last_write >= LOG_BATCH_SECONDS:
+                    await writer.write(batch)
+                    batch = []
+                    last_write = time.monotonic()
+            await writer.write(batch)
+        except HTTPException as e:
+            await writer.write([{"event": "error", "status_code": e.status_code, "detail": e.detail}])
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+            await writer.write([{"event": "error", "status_code": 500, "detail": f"Sandbox worker error: {str(e)}"}])
+        finally:
+            self.completed_total += 1
+            await self.store.delete(JOBS_NAMESPACE, job_id)
+
+    async def run(self) -> None:
+        # Build or pull the runner image before advertising capacity
+        self.image_id = await asyncio.to_thread(lambda: get_runner_image(get_docker_client()))
+        logger.info(f"Sandbox worker {self.worker_id} ready: capacity {self.capacity}, image {runner_image_ref()}")
+
+        heartbeats = asyncio.create_task(self.heartbeat_forever())
+        try:
+            while not self.stopping.is_set():
+                free = self.capacity - len(self.running)
+                if free > 0:
+                    try:
+                        await self.claim(free)
+                    except Exception as e:
+                        logger.warning(f"Failed to claim jobs: {str(e)}")
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), timeout=settings.SANDBOX_WORKER_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+            logger.info(f"Draining: waiting for {len(self.running)} running job(s)")
+            await self.heartbeat()
+            await asyncio.gather(*self.running.values(), return_exceptions=True)
+        finally:
+            heartbeats.cancel()
+            await self.store.delete(WORKERS_NAMESPACE, self.worker_id)
+            # Jobs still queued here are moved by their dispatchers once the heartbeat is gone
+
+async def serve(worker_id: str, capacity: int) -> None:
+    store = get_state_store()
+    if store is None:
+        raise SystemExit("Sandbox workers need a shared state store; set STATE_BACKEND")
+    worker = SandboxWorker(store, worker_id, capacity)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stopping.set)
+    try:
+        await worker.run()
+    finally:
+        await store.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}")
+    parser.add_argument("--capacity", type=int, default=settings.SANDBOX_WORKER_CAPACITY, help="Concurrent runs")
+    args = parser.parse_args()
+    asyncio.run(serve(args.worker_id, max(1, args.capacity)))
+
+if __name__ == "__main__":
+    main()
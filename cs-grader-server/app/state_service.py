@@ -0,0 +1,81 @@
+"""
+Minimal state service for STATE_BACKEND=http.
+
+Serves a SqliteStateStore over HTTP so replicas on different hosts share
+caches, job records and locks. Run one instance next to the replicas, with
+the same STATE_SERVICE_TOKEN set here and on every replica:
+
+    STATE_SERVICE_TOKEN=... uvicorn app.state_service:app --port 8100
+"""
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
+from app.core.config import settings
+from app.core.state_store import SqliteStateStore, purge_periodically
+
+store = SqliteStateStore(settings.STATE_DB_PATH)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Purge expired entries and locks, when enabled, for the lifetime of the service."""
+    purger = None
+    if settings.STATE_PURGE_INTERVAL > 0:
+        purger = asyncio.create_task(purge_periodically(store, settings.STATE_PURGE_INTERVAL))
+    try:
+        yield
+    finally:
+        if purger is not None:
+            purger.cancel()
+
+async def require_state_token(x_state_token: Optional[str] = Header(default=None)) -> None:
+    """FastAPI dependency admitting only callers that send STATE_SERVICE_TOKEN."""
+    if not settings.STATE_SERVICE_TOKEN:
+        raise HTTPException(status_code=403, detail="State service is disabled (STATE_SERVICE_TOKEN is not set)")
+    if x_state_token is None or not secrets.compare_digest(x_state_token, settings.STATE_SERVICE_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid state service token")
+
+app = FastAPI(title="CS Grader state service", lifespan=lifespan)
+router = APIRouter(dependencies=[Depends(require_state_token)])
+
+class LockRequest(BaseModel):
+    owner: str
+    ttl: float = Field(..., gt=0, description="Lease length in seconds")
+
+@router.get("/kv/{namespace}/{key}")
+async def get_entry(namespace: str, key: str):
+    value = await store.get(namespace, key)
+    if value is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return Response(content=value, media_type="application/octet-stream")
+
+@router.put("/kv/{namespace}/{key}", status_code=204)
+async def set_entry(namespace: str, key: str, request: Request, ttl: Optional[float] = Query(None, gt=0)):
+    await store.set(namespace, key, await request.body(), ttl)
+    return Response(status_code=204)
+
+@router.delete("/kv/{namespace}/{key}", status_code=204)
+async def delete_entry(namespace: str, key: str):
+    await store.delete(namespace, key)
+    return Response(status_code=204)
+
+@router.get("/kv/{namespace}")
+async def list_keys(namespace: str, limit: int = Query(1000, ge=1, le=10000), offset: int = Query(0, ge=0)):
+    return {"keys": await store.keys(namespace, limit, offset)}
+
+@router.post("/locks/{name}")
+async def acquire_lock(name: str, request: LockRequest):
+    return {"acquired": await store.acquire_lock(name, request.owner, request.ttl)}
+
+@router.delete("/locks/{name}", status_code=204)
+async def release_lock(name: str, owner: str = Query(...)):
+    await store.release_lock(name, owner)
+    return Response(status_code=204)
+
+app.include_router(router)
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
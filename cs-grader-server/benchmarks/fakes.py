@@ -0,0 +1,330 @@
+"""
+In-process stand-ins for every external provider the server calls.
+
+Each fake follows the subset of the real client API the server uses and
+sleeps for a configurable latency, optionally failing with a generic error
+or an HTTP 429 carrying Retry-After. `install_fakes()` must run before
+`app.main` is imported, because the real clients are created at import time.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+EMBEDDING_DIMENSION = 1024
+
+FAKE_CODE = "def solve(values):\n    return sorted(values)\n"
+FAKE_TESTS = {
+    "imports": "from main import *\nimport random",
+    "tests": "def test_sorted():\n    assert solve([3, 1, 2]) == [1, 2, 3]\n\n"
+             "def test_empty():\n    assert solve([]) == []\n",
+}
+FAKE_EVALUATION = {
+    "feedback": "The pseudocode sorts the input correctly.",
+    "logical_analysis": {
+        "correctness": "Correct for all inputs.",
+        "efficiency": "O(n log n).",
+        "readability": "Clear.",
+    },
+    "potential_issues": ["Does not handle None input."],
+}
+
+class FakeProviderError(Exception):
+    """Generic provider failure."""
+
+    def __init__(self, message: str, status_code: int = 500, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+@dataclass
+class FaultProfile:
+    """Latency and error injection for one fake provider."""
+    latency: float = 0.05  # seconds
+    jitter: float = 0.02  # +/- seconds, uniform
+    error_rate: float = 0.0  # fraction of calls raising a 500
+    rate_limit_rate: float = 0.0  # fraction of calls raising a 429
+    retry_after: float = 0.2  # Retry-After sent with injected 429s
+    calls: int = field(default=0, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _maybe_fail(self) -> None:
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            raise FakeProviderError("rate limited", 429, {"retry-after": str(self.retry_after)})
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise FakeProviderError("injected failure", 500)
+
+    async def async_call(self) -> None:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+
+    def sync_call(self) -> None:
+        time.sleep(self._delay())
+        self._maybe_fail()
+
+def fake_embedding(text: str) -> List[float]:
+    """Deterministic unit-ish vector for text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSION)]
+
+def _chat_text(response_format: Any) -> str:
+    schema = getattr(response_format, "json_schema", None) or getattr(response_format, "schema_", None) \
+        or getattr(response_format, "schema", None) or {}
+    if isinstance(schema, dict) and "tests" in schema.get("properties", {}):
+        return json.dumps(FAKE_TESTS)
+    return json.dumps(FAKE_EVALUATION)
+
+class FakeCohereClient:
+    """Stands in for cohere.AsyncClientV2 (chat, chat_stream, embed)."""
+
+    def __init__(self, chat: FaultProfile, embed: FaultProfile):
+        self.chat_profile = chat
+        self.embed_profile = embed
+
+    async def chat(self, model: str, messages: Any, response_format: Any = None, **kwargs):
+        await self.chat_profile.async_call()
+        text = _chat_text(response_format)
+        return SimpleNamespace(
+            message=SimpleNamespace(content=[SimpleNamespace(type="text", text=text)]),
+            usage=SimpleNamespace(tokens=SimpleNamespace(
+                input_tokens=sum(len(str(getattr(m, "content", ""))) for m in messages) // 4,
+                output_tokens=len(text) // 4,
+            )),
+        )
+
+    async def chat_stream(self, model: str, messages: Any, response_format: Any = None, **kwargs):
+        await self.chat_profile.async_call()
+        text = _chat_text(response_format)
+        for i in range(0, len(text), 32):
+            await asyncio.sleep(self.chat_profile.latency / 20)
+            yield SimpleNamespace(
+                type="content-delta",
+                delta=SimpleNamespace(message=SimpleNamespace(content=SimpleNamespace(text=text[i:i + 32]))),
+            )
+
+    async def embed(self, texts: List[str], model: str, input_type: str, embedding_types: List[str], **kwargs):
+        await self.embed_profile.async_call()
+        return SimpleNamespace(embeddings=SimpleNamespace(float_=[fake_embedding(text) for text in texts]))
+
+class _FakeStream:
+    """Blocking chunk iterator, like a streamed response from the REST transport."""
+
+    def __init__(self, chunks: List[str], delay: float):
+        self._chunks = chunks
+        self._delay = delay
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield SimpleNamespace(text=chunk)
+
+class FakeGeminiModel:
+    """
+    Stands in for google.generativeai.GenerativeModel.
+
+    Only the blocking methods exist: the app uses the REST transport, which
+    has no async client, so a call to generate_content_async fails here as
+    it would against Gemini.
+    """
+
+    def __init__(self, profile: FaultProfile):
+        self.profile = profile
+
+    def generate_content(self, contents: Any, generation_config: Any = None, stream: bool = False, **kwargs):
+        self.profile.sync_call()
+        if stream:
+            lines = FAKE_CODE.splitlines(keepends=True)
+            return _FakeStream(lines, self.profile.latency / 20)
+        return SimpleNamespace(text=f"```python\n{FAKE_CODE}```", usage_metadata=None)
+
+class FakeVisionClient:
+    """Stands in for google.cloud.vision.ImageAnnotatorClient."""
+
+    def __init__(self, profile: FaultProfile):
+        self.profile = profile
+
+    def text_detection(self, image: Any, **kwargs):
+        self.profile.sync_call()
+        return SimpleNamespace(
+            text_annotations=[SimpleNamespace(description="function solve(values)\n  return sort(values)")],
+            error=SimpleNamespace(message=""),
+        )
+
+class FakeContainer:
+    def __init__(self, profile: FaultProfile):
+        self.profile = profile
+        self.id = f"fake-{random.getrandbits(32):08x}"
+        self.attrs = {"State": {"OOMKilled": False}}
+        self._log_lines = [
+            "============================= test session starts ==============================",
+            "test_main.py::test_sorted PASSED                                         [ 50%]",
+            "test_main.py::test_empty PASSED                                          [100%]",
+            "============================== 2 passed in 0.01s ===============================",
+        ]
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, int]:
+        self.profile.sync_call()
+        return {"StatusCode": 0}
+
+    def logs(self, stream: bool = False, follow: bool = False, **kwargs):
+        if not stream:
+            return ("\n".join(self._log_lines) + "\n").encode()
+        return self._stream_logs()
+
+    def _stream_logs(self) -> Iterator[bytes]:
+        for line in self._log_lines:
+            time.sleep(self.profile.latency / len(self._log_lines))
+            yield (line + "\n").encode()
+
+    def get_archive(self, path: str):
+        report = {
+            "exitcode": 0,
+            "summary": {"passed": 2, "total": 2, "collected": 2},
+            "tests": [
+                {"nodeid": "test_main.py::test_sorted", "lineno": 3, "outcome": "passed"},
+                {"nodeid": "test_main.py::test_empty", "lineno": 6, "outcome": "passed"},
+            ],
+        }
+        data = json.dumps(report).encode()
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            info = tarfile.TarInfo(os.path.basename(path))
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        return iter([buffer.getvalue()]), {"name": os.path.basename(path), "size": len(data)}
+
+    def put_archive(self, path: str, data: Any) -> bool:
+        return True
+
+    def start(self) -> None:
+        pass
+
+    def reload(self) -> None:
+        pass
+
+    def remove(self, force: bool = False) -> None:
+        pass
+
+class _FakeImages:
+    def __init__(self, profile: FaultProfile):
+        self.profile = profile
+
+    def build(self, **kwargs):
+        image = SimpleNamespace(id=f"sha256:{random.getrandbits(64):016x}", tags=[kwargs.get("tag")])
+        return image, [{"stream": "Successfully built"}]
+
+    def get(self, name: str):
+        return SimpleNamespace(id=f"sha256:{hashlib.sha256(name.encode()).hexdigest()}", tags=[name])
+
+    def remove(self, image: str, force: bool = False) -> None:
+        pass
+
+class _FakeContainers:
+    def __init__(self, profile: FaultProfile):
+        self.profile = profile
+
+    def run(self, image: str, **kwargs) -> FakeContainer:
+        return FakeContainer(self.profile)
+
+    def create(self, image: str, **kwargs) -> FakeContainer:
+        return FakeContainer(self.profile)
+
+class FakeDockerClient:
+    """Stands in for docker.DockerClient (images.build/remove, containers.run)."""
+
+    def __init__(self, profile: FaultProfile):
+        self.images = _FakeImages(profile)
+        self.containers = _FakeContainers(profile)
+
+    def ping(self) -> bool:
+        return True
+
+@dataclass
+class FakeProviders:
+    gemini: FaultProfile = field(default_factory=FaultProfile)
+    cohere_chat: FaultProfile = field(default_factory=FaultProfile)
+    cohere_embed: FaultProfile = field(default_factory=lambda: FaultProfile(latency=0.02, jitter=0.01))
+    vision: FaultProfile = field(default_factory=FaultProfile)
+    docker: FaultProfile = field(default_factory=lambda: FaultProfile(latency=0.5, jitter=0.1))
+
+    def call_counts(self) -> Dict[str, int]:
+        return {name: getattr(self, name).calls for name in ("gemini", "cohere_chat", "cohere_embed", "vision", "docker")}
+
+def seed_algorithms(path: str, count: int = 200) -> None:
+    """Create an `algorithms` collection of synthetic documents with fake embeddings."""
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=path).get_or_create_collection(
+        name="algorithms", metadata={"hnsw:space": "cosine"}
+    )
+    if collection.count():
+        return
+    questions = [f"Algorithm problem {i}: sort, search or traverse input number {i}" for i in range(count)]
+    collection.add(
+        ids=[f"alg-{i}" for i in range(count)],
+        embeddings=[fake_embedding(q) for q in questions],
+        documents=[json.dumps({"question": q, "pseudocode": f"function solve_{i}(values)\n  return values"})
+                   for i, q in enumerate(questions)],
+    )
+
+def install_fakes(providers: Optional[FakeProviders] = None, chroma_path: Optional[str] = None) -> FakeProviders:
+    """
+    Replace every external client with a fake. Call before importing app.main.
+
+    Sets dummy credentials, points CHROMA_DB_PATH at a seeded temporary
+    collection (unless one is given), patches the Vision and Docker client
+    constructors and then swaps COHERE_CLIENT / GEMINI_MODEL wherever the app
+    modules imported them.
+    """
+    providers = providers or FakeProviders()
+    if "app.main" in sys.modules:
+        raise RuntimeError("install_fakes() must run before app.main is imported")
+
+    os.environ.setdefault("GOOGLE_API_KEY", "fake")
+    os.environ.setdefault("COHERE_API_KEY", "fake")
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "/dev/null")
+    if chroma_path is None:
+        chroma_path = tempfile.mkdtemp(prefix="cs-grader-bench-")
+        seed_algorithms(chroma_path)
+    os.environ["CHROMA_DB_PATH"] = chroma_path
+
+    import docker
+    from google.cloud import vision
+
+    vision.ImageAnnotatorClient = lambda *args, **kwargs: FakeVisionClient(providers.vision)
+    docker.from_env = lambda *args, **kwargs: FakeDockerClient(providers.docker)
+
+    import app.core.clients as clients
+    cohere_client = FakeCohereClient(providers.cohere_chat, providers.cohere_embed)
+    gemini_model = FakeGeminiModel(providers.gemini)
+    clients.COHERE_CLIENT = cohere_client
+    clients.GEMINI_MODEL = gemini_model
+
+    import app.main  # noqa: F401  (imports every endpoint module)
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("app.") or module is None:
+            continue
+        if hasattr(module, "COHERE_CLIENT"):
+            module.COHERE_CLIENT = cohere_client
+        if hasattr(module, "GEMINI_MODEL"):
+            module.GEMINI_MODEL = gemini_model
+        if hasattr(module, "check_docker_available"):
+            module.check_docker_available = lambda: True
+    return providers
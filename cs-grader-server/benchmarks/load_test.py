@@ -0,0 +1,175 @@
+"""
+Offline load test: runs the API in-process against fake providers and
+drives its endpoints at a target concurrency.
+
+Every provider (Cohere, Gemini, Vision, Docker) is replaced by the fakes in
+benchmarks/fakes.py, so no credentials are needed and nothing is billed.
+The server runs under uvicorn on a local port because /getResponse calls
+the other endpoints over HTTP.
+
+Usage (from cs-grader-server/):
+    python -m benchmarks.load_test --scenario all --concurrency 16 --requests 200
+    python -m benchmarks.load_test --scenario get-response --latency 0.3 --rate-limit-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+from benchmarks.fakes import FakeProviders, FaultProfile, install_fakes
+
+API = "/api/v1"
+
+QUESTION = "Write a function solve(values) that returns the values sorted in ascending order."
+PSEUDOCODE = "function solve(values)\n  for i from 0 to n\n    insert values[i] into sorted position\n  return values"
+CODE = "def solve(values):\n    return sorted(values)\n"
+TESTS = "from main import *\n\ndef test_sorted():\n    assert solve([2, 1]) == [1, 2]\n"
+# Smallest valid PNG, enough to take the Vision path
+PNG_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    elapsed: float = 0.0
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "scenario": self.name,
+            "requests": len(self.latencies),
+            "rps": round(len(self.latencies) / self.elapsed, 2) if self.elapsed else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 1),
+            "p95_ms": round(self.percentile(95) * 1000, 1),
+            "p99_ms": round(self.percentile(99) * 1000, 1),
+            "mean_ms": round(statistics.fmean(self.latencies) * 1000, 1) if self.latencies else 0.0,
+            "statuses": dict(self.statuses),
+        }
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int):
+    """Run app.main:app under uvicorn in a background thread."""
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Server did not start")
+        time.sleep(0.05)
+    return server, thread
+
+def scenarios() -> Dict[str, Callable[[Any], Any]]:
+    """Request factories by scenario name; each takes an httpx.AsyncClient."""
+
+    def get_response(client):
+        return client.post(f"{API}/getResponse/get-response", files=[
+            ("question_files", ("question.txt", QUESTION.encode(), "text/plain")),
+            ("pseudocode_files", ("answer.png", PNG_BYTES, "image/png")),
+        ])
+
+    def evaluate(client):
+        return client.post(f"{API}/evaluateLogic/evaluate", json={"question": QUESTION, "pseudocode": PSEUDOCODE})
+
+    def generate(client):
+        return client.post(f"{API}/generateCode/generate", json={"prompt": PSEUDOCODE, "description": QUESTION})
+
+    def run_tests(client):
+        return client.post(f"{API}/pytest/run", json={"code": CODE, "test_code": TESTS})
+
+    return {"get-response": get_response, "evaluate": evaluate, "generate": generate, "pytest": run_tests}
+
+async def drive(base_url: str, name: str, make_request, concurrency: int, total: int) -> ScenarioResult:
+    import httpx
+
+    result = ScenarioResult(name)
+    remaining = iter(range(total))
+
+    async def worker(client):
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client)
+                result.statuses[response.status_code] += 1
+            except Exception as e:
+                result.statuses[type(e).__name__] += 1
+            result.latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        result.elapsed = time.perf_counter() - start
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="all", choices=["all", *scenarios().keys()])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean latency of LLM, OCR and embed fakes (s)")
+    parser.add_argument("--sandbox-latency", type=float, default=0.5, help="Mean latency of a fake container run (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of provider calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of provider calls failing with 429")
+    parser.add_argument("--chroma-path", default=None, help="Use an existing Chroma directory instead of a seeded temp one")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    def profile(latency):
+        return FaultProfile(latency=latency, jitter=latency * 0.2,
+                            error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+
+    providers = install_fakes(FakeProviders(
+        gemini=profile(args.latency),
+        cohere_chat=profile(args.latency),
+        cohere_embed=profile(args.latency / 2),
+        vision=profile(args.latency),
+        docker=profile(args.sandbox_latency),
+    ), chroma_path=args.chroma_path)
+
+    port = _free_port()
+    server, thread = start_server(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    names = list(scenarios()) if args.scenario == "all" else [args.scenario]
+    results = []
+    try:
+        for name in names:
+            result = asyncio.run(drive(base_url, name, scenarios()[name], args.concurrency, args.requests))
+            results.append(result.summary())
+            if not args.json:
+                s = results[-1]
+                print(f"{name:<13} n={s['requests']:<5} rps={s['rps']:<8} p50={s['p50_ms']}ms  "
+                      f"p95={s['p95_ms']}ms  p99={s['p99_ms']}ms  statuses={s['statuses']}")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    if args.json:
+        print(json.dumps({"results": results, "provider_calls": providers.call_counts()}, indent=2))
+    else:
+        print(f"provider calls: {providers.call_counts()}")
+
+if __name__ == "__main__":
+    main()
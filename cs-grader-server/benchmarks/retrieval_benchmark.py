@@ -0,0 +1,96 @@
+"""
+Compare recall and latency of the Chroma HNSW query path against the
+in-memory vector index (float32 and int8).
+
+Queries are stored embeddings with Gaussian noise added, so no embedding
+provider is needed. Ground truth is exact float64 cosine top-k.
+
+Usage (from cs-grader-server/):
+    python -m benchmarks.retrieval_benchmark --db app/core/chroma_db --queries 200 --k 5
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List, Sequence
+import chromadb
+import numpy as np
+from app.core.vector_index import InMemoryVectorIndex
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def exact_top_k(embeddings: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    matrix = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = normalized @ matrix.T
+    return [list(np.argsort(-row)[:k]) for row in scores]
+
+def measure(name: str, search: Callable[[np.ndarray], List[int]], queries: np.ndarray,
+            truth: List[List[int]], k: int) -> Dict[str, float]:
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found[:k]) & set(expected))
+    result = {
+        "recall": hits / (k * len(queries)),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+    print(f"{name:<16} recall@{k}={result['recall']:.3f}  p50={result['p50_ms']:.3f}ms  "
+          f"p95={result['p95_ms']:.3f}ms  p99={result['p99_ms']:.3f}ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="Path to the Chroma persistent directory")
+    parser.add_argument("--collection", default="algorithms")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.05, help="Std-dev of noise added to query embeddings")
+    parser.add_argument("--batch", type=int, default=64, help="Batch size for the batched in-memory run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.db).get_collection(args.collection)
+    data = collection.get(include=["embeddings"])
+    ids = data["ids"]
+    embeddings = np.asarray(data["embeddings"], dtype=np.float64)
+    if len(ids) == 0:
+        raise SystemExit("Collection is empty")
+    print(f"{len(ids)} embeddings of dimension {embeddings.shape[1]}")
+
+    rng = np.random.default_rng(args.seed)
+    picks = rng.integers(0, len(ids), size=args.queries)
+    queries = embeddings[picks] + rng.normal(0, args.noise, size=(args.queries, embeddings.shape[1]))
+    truth = exact_top_k(embeddings, queries, args.k)
+    row_of = {id_: i for i, id_ in enumerate(ids)}
+
+    def chroma_search(query: np.ndarray) -> List[int]:
+        result = collection.query(query_embeddings=[query.tolist()], n_results=args.k, include=["distances"])
+        return [row_of[id_] for id_ in result["ids"][0]]
+
+    measure("chroma", chroma_search, queries, truth, args.k)
+
+    for quantize in (False, True):
+        start = time.perf_counter()
+        index = InMemoryVectorIndex.from_collection(collection, quantize=quantize)
+        load_ms = (time.perf_counter() - start) * 1000
+        name = "memory-int8" if quantize else "memory-float32"
+        print(f"{name:<16} load={load_ms:.1f}ms  size={index.nbytes / 1024:.0f}KiB")
+        # Map index rows back to collection rows in case ordering differs
+        index_rows = [row_of[id_] for id_ in index.ids]
+        measure(name, lambda q: [index_rows[i] for i, _ in index.search([q], args.k)[0]], queries, truth, args.k)
+
+        start = time.perf_counter()
+        for offset in range(0, len(queries), args.batch):
+            index.search(queries[offset:offset + args.batch], args.k)
+        per_query = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"{name + '-batch':<16} {per_query:.4f}ms/query at batch size {args.batch}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+# Settings are read at import time; give the tests placeholder credentials and
+# no shared state store so nothing reaches a real provider or writes to disk.
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("COHERE_API_KEY", "test")
+os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "test")
+os.environ["STATE_BACKEND"] = "none"
+_scratch = tempfile.mkdtemp(prefix="cs-grader-tests-")
+os.environ["STATE_DB_PATH"] = os.path.join(_scratch, "state.db")
+# The endpoint modules open the corpus when imported
+os.environ["CHROMA_DB_PATH"] = os.path.join(_scratch, "chroma_db")
+
+import pytest
+from app.core import state_store
+from app.core.state_store import SqliteStateStore
+
+@pytest.fixture
+def shared_store(tmp_path, monkeypatch):
+    """Use a fresh SQLite file as the process-wide state store."""
+    store = SqliteStateStore(str(tmp_path / "shared.db"))
+    monkeypatch.setattr(state_store, "_store", store)
+    monkeypatch.setattr(state_store, "_store_created", True)
+    return store
@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.core.admission import (
+    INTERNAL_CALL_HEADER, INTERNAL_CALL_TOKEN, MB, AdmissionController, AdmissionMiddleware, AdmissionRejected,
+    policy_for
+)
+from app.core.config import settings
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_CONTROL_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_IN_FLIGHT", 2)
+    monkeypatch.setattr(settings, "ADMISSION_MEMORY_BUDGET_MB", 100)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 1)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT", 0.1)
+    monkeypatch.setattr(settings, "ADMISSION_DEFAULT_RETRY_AFTER", 5.0)
+
+def test_policy_for_paths():
+    assert policy_for("/api/v1/getResponse/get-response").name == "get_response"
+    assert policy_for("/api/v1/getResponse/regrade/abc").name == "regrade"
+    assert policy_for("/api/v1/generateCode/generate").name == "default"
+    assert policy_for("/api/v1/health") is None
+    assert policy_for("/") is None
+
+def test_estimate_scales_with_the_body():
+    policy = policy_for("/api/v1/getResponse/get-response")
+    assert policy.estimate(10 * MB) == 8 * MB + 40 * MB
+    assert policy.estimate(None) == policy.estimate(settings.ADMISSION_UNKNOWN_BODY_BYTES)
+
+def test_queued_request_starts_when_capacity_frees():
+    async def scenario():
+        controller = AdmissionController()
+        policy = policy_for("/api/v1/x")
+        first = await controller.admit(policy, MB)
+        await controller.admit(policy, MB)
+        waiting = asyncio.create_task(controller.admit(policy, MB))
+        await asyncio.sleep(0.01)
+        assert controller.queued == 1
+        await controller.release(first, 0.5)
+        ticket = await asyncio.wait_for(waiting, 1)
+        return controller, ticket
+
+    controller, ticket = asyncio.run(scenario())
+    assert ticket.reserved_bytes == MB
+    assert controller.in_flight == 2
+    assert controller.queued == 0
+
+def test_memory_budget_queues_then_rejects():
+    async def scenario():
+        controller = AdmissionController()
+        policy = policy_for("/api/v1/x")
+        await controller.admit(policy, 90 * MB)
+        with pytest.raises(AdmissionRejected) as exc:
+            await controller.admit(policy, 20 * MB)
+        return controller, exc.value
+
+    controller, rejected = asyncio.run(scenario())
+    assert rejected.reason == "memory budget exhausted"
+    assert rejected.retry_after == 5.0
+    assert controller.pressure()["routes"]["default"]["rejected_total"] == 1
+
+def test_full_queue_rejects_at_once():
+    async def scenario():
+        controller = AdmissionController()
+        policy = policy_for("/api/v1/x")
+        for _ in range(2):
+            await controller.admit(policy, MB)
+        queued = asyncio.create_task(controller.admit(policy, MB))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as exc:
+            await controller.admit(policy, MB)
+        queued.cancel()
+        return exc.value
+
+    assert asyncio.run(scenario()).reason == "too many requests in flight"
+
+def test_oversized_request_is_admitted_when_idle():
+    async def scenario():
+        controller = AdmissionController()
+        return await controller.admit(policy_for("/api/v1/x"), 500 * MB)
+
+    assert asyncio.run(scenario()).reserved_bytes == 500 * MB
+
+def test_retry_after_follows_route_duration():
+    async def scenario():
+        controller = AdmissionController()
+        policy = policy_for("/api/v1/x")
+        await controller.release(await controller.admit(policy, MB), 12.0)
+        await controller.admit(policy, 90 * MB)
+        with pytest.raises(AdmissionRejected) as exc:
+            await controller.admit(policy, 20 * MB)
+        return exc.value
+
+    assert asyncio.run(scenario()).retry_after == 12.0
+
+def make_client(controller, seen):
+    app = FastAPI()
+
+    @app.post("/api/v1/getResponse/get-response")
+    async def upload(request: Request):
+        await request.body()
+        seen.append(controller.reserved_bytes)
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    return TestClient(app)
+
+def test_middleware_counts_uploaded_files():
+    controller = AdmissionController()
+    seen = []
+    client = make_client(controller, seen)
+    files = [("files", ("a.png", b"x" * 10, "image/png")), ("files", ("b.png", b"y" * 10, "image/png"))]
+    assert client.post("/api/v1/getResponse/get-response", files=files).status_code == 200
+    policy = policy_for("/api/v1/getResponse/get-response")
+    assert seen[0] >= 2 * policy.per_file_bytes + policy.base_bytes
+    assert controller.reserved_bytes == 0
+
+def test_middleware_rejects_with_retry_after():
+    controller = AdmissionController()
+    client = make_client(controller, [])
+
+    async def fill():
+        await controller.admit(policy_for("/api/v1/x"), 95 * MB)
+
+    asyncio.run(fill())
+    response = client.post("/api/v1/getResponse/get-response", content=b"x" * MB)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert response.json()["route"] == "get_response"
+
+    # Calls made by /get-response itself are never held back
+    internal = client.post("/api/v1/getResponse/get-response", headers={INTERNAL_CALL_HEADER: INTERNAL_CALL_TOKEN})
+    assert internal.status_code == 200
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import chromadb
+import pytest
+from app.core import chroma_middleware
+from app.core.chroma_middleware import EMBEDDING_MODEL_METADATA, ChromaMiddleware, CorpusReloadError
+from app.core.config import settings
+from app.core.embeddings import EmbeddingProvider
+from app.core.submissions import component_version
+
+MODEL = "test-model"
+
+# Cosine similarity to the query vector [1, 0, 0]: search 1.0, related 0.45, keyword_only 0.0
+DOCUMENTS = {
+    "search": ("Binary search in a sorted array", [1.0, 0.0, 0.0]),
+    "related": ("Find the position of an element by bisection", [0.45, 0.893, 0.0]),
+    "keyword_only": ("Binary tree search for binary search puzzles", [0.0, 0.0, 1.0]),
+    "graph": ("Shortest path in a weighted graph", [0.0, 1.0, 0.0]),
+}
+
+class FixedEmbeddingProvider(EmbeddingProvider):
+    name = "fixed"
+    model_id = MODEL
+
+    async def embed(self, texts, input_type):
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+def seed(path, documents):
+    collection = chromadb.PersistentClient(path=str(path)).get_or_create_collection(
+        name="algorithms", metadata={"hnsw:space": "cosine", EMBEDDING_MODEL_METADATA: MODEL}
+    )
+    if not documents:
+        return
+    collection.add(
+        ids=list(documents),
+        embeddings=[embedding for _, embedding in documents.values()],
+        documents=[json.dumps({"question": question, "pseudocode": ""}) for question, _ in documents.values()],
+    )
+
+@pytest.fixture(params=["chroma", "memory"])
+def middleware(request, tmp_path, monkeypatch):
+    seed(tmp_path, DOCUMENTS)
+    monkeypatch.setattr(settings, "CHROMA_DB_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "RETRIEVAL_BACKEND", request.param)
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_ENABLED", True)
+    monkeypatch.setattr(chroma_middleware, "get_embedding_provider", lambda: FixedEmbeddingProvider())
+    return ChromaMiddleware()
+
+def test_lexical_candidates_get_their_exact_cosine(middleware):
+    scores = middleware._fill_vector_scores(
+        middleware.snapshot, [1.0, 0.0, 0.0], {"search": 1.0}, ["search", "related", "keyword_only"]
+    )
+    assert scores["search"] == 1.0
+    assert scores["related"] == pytest.approx(0.45, abs=0.01)
+    assert scores["keyword_only"] == pytest.approx(0.0, abs=1e-6)
+
+def test_threshold_applies_to_cosine_not_the_fused_score(middleware, monkeypatch):
+    # Two candidates per retriever: the vector top list misses keyword_only
+    monkeypatch.setattr(settings, "HYBRID_CANDIDATE_MULTIPLIER", 1)
+    results = asyncio.run(middleware.find_algorithms_by_question("binary search", n_results=2, min_similarity=0.4))
+
+    ids = [result["id"] for result in results]
+    # keyword_only matches every query word but is unrelated by cosine; related
+    # shares no words but is above the cosine threshold its fused score is below
+    assert ids == ["search", "related"]
+    related = results[1]
+    assert related["similarity"] < 0.4 <= related["vector_similarity"]
+
+def test_results_are_ranked_by_the_fused_score(middleware):
+    results = asyncio.run(middleware.find_algorithms_by_question("binary search", n_results=4))
+    similarities = [result["similarity"] for result in results]
+    assert results[0]["id"] == "search"
+    assert similarities == sorted(similarities, reverse=True)
+
+NEW_DOCUMENTS = {
+    "search_v2": ("Binary search over a rotated sorted array", [1.0, 0.0, 0.0]),
+    "graph_v2": ("Breadth-first search in an unweighted graph", [0.0, 1.0, 0.0]),
+}
+
+class GatedEmbeddingProvider(FixedEmbeddingProvider):
+    """Holds every query embedding until `release` is set."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def embed(self, texts, input_type):
+        self.started.set()
+        await self.release.wait()
+        return await super().embed(texts, input_type)
+
+def test_in_flight_search_finishes_on_the_snapshot_it_started_with(middleware, tmp_path_factory, monkeypatch):
+    new_path = tmp_path_factory.mktemp("corpus_v2")
+    seed(new_path, NEW_DOCUMENTS)
+    provider = GatedEmbeddingProvider()
+    monkeypatch.setattr(chroma_middleware, "get_embedding_provider", lambda: provider)
+    old_version = component_version("corpus")
+
+    async def scenario():
+        in_flight = asyncio.create_task(middleware.find_algorithms_by_question("binary search in flight", n_results=2))
+        await provider.started.wait()
+        reload = await middleware.reload(str(new_path))
+        provider.release.set()
+        return reload, await in_flight, await middleware.find_algorithms_by_question("binary search after", n_results=2)
+
+    reload, old_results, new_results = asyncio.run(scenario())
+    assert reload["reloaded"] and reload["previous_version"] == 1 and reload["version"] == 2
+    assert old_results[0]["id"] == "search"
+    assert {result["id"] for result in old_results} <= set(DOCUMENTS)
+    assert new_results[0]["id"] == "search_v2"
+    assert {result["id"] for result in new_results} <= set(NEW_DOCUMENTS)
+    assert middleware.total_solutions == len(NEW_DOCUMENTS)
+    assert middleware.get_collection_stats()["corpus_version"] == 2
+    # Stage fingerprints pick up the new corpus, so regrades recompute similarity
+    assert component_version("corpus") != old_version
+
+def test_reload_of_an_unchanged_corpus_keeps_the_snapshot(middleware):
+    snapshot = middleware.snapshot
+    result = asyncio.run(middleware.reload())
+    assert not result["reloaded"]
+    assert middleware.snapshot is snapshot
+
+def test_an_empty_corpus_does_not_replace_a_loaded_one(middleware, tmp_path_factory):
+    empty = tmp_path_factory.mktemp("empty")
+    seed(empty, {})
+    with pytest.raises(CorpusReloadError):
+        asyncio.run(middleware.reload(str(empty)))
+    assert middleware.snapshot.version == 1
+
+def test_watcher_reloads_once_the_files_settle(middleware):
+    async def scenario():
+        watcher = asyncio.create_task(middleware.watch(0.05))
+        try:
+            await asyncio.sleep(0.1)
+            seed(middleware.snapshot.path, NEW_DOCUMENTS)
+            for _ in range(100):
+                if middleware.snapshot.version > 1:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            watcher.cancel()
+
+    old = middleware.snapshot
+    asyncio.run(scenario())
+    assert middleware.snapshot.version == 2
+    assert middleware.snapshot.fingerprint != old.fingerprint
+    assert middleware.total_solutions == len(DOCUMENTS) + len(NEW_DOCUMENTS)
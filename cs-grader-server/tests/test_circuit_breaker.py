@@ -0,0 +1,102 @@
+import pytest
+from app.core import circuit_breaker
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, is_provider_failure
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+def make_breaker(**kwargs):
+    options = dict(window=4, min_calls=4, failure_rate=0.5, slow_call_seconds=1.0,
+                   slow_call_rate=0.75, open_seconds=10.0, half_open_calls=1)
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+def call(breaker, failed=False, latency=0.1):
+    breaker.record(breaker.allow(), failed=failed, latency=latency)
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(status_code)
+        self.status_code = status_code
+
+def test_is_provider_failure():
+    assert is_provider_failure(ProviderError(503))
+    assert is_provider_failure(TimeoutError())
+    assert not is_provider_failure(ProviderError(400))
+    assert not is_provider_failure(ProviderError(429))
+
+def test_opens_on_failure_rate_once_the_window_fills(clock):
+    breaker = make_breaker()
+    call(breaker, failed=True)
+    call(breaker, failed=True)
+    call(breaker)
+    assert breaker.state == CLOSED
+    call(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.allow()
+    assert exc.value.retry_after == pytest.approx(10.0)
+    assert breaker.stats()["rejected_total"] == 1
+
+def test_opens_on_slow_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        call(breaker, latency=2.0)
+    call(breaker)
+    assert breaker.state == OPEN
+
+def test_streams_without_latency_are_never_slow(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, latency=None)
+    assert breaker.state == CLOSED
+
+def test_healthy_probe_closes_the_circuit(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, failed=True)
+    clock.now += 10.0
+    assert breaker.allow() is True
+    assert breaker.state == HALF_OPEN
+    # Only half_open_calls probes at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record(True, failed=False, latency=0.1)
+    assert breaker.state == CLOSED
+    assert breaker.allow() is False
+
+def test_failed_probe_opens_the_circuit_again(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, failed=True)
+    clock.now += 10.0
+    breaker.record(breaker.allow(), failed=True)
+    assert breaker.state == OPEN
+    assert breaker.trips_total == 2
+
+def test_abandoned_probe_frees_its_slot(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, failed=True)
+    clock.now += 10.0
+    breaker.abandon(breaker.allow())
+    assert breaker.allow() is True
+
+def test_calls_started_before_opening_are_ignored(clock):
+    breaker = make_breaker()
+    late = breaker.allow()
+    for _ in range(4):
+        call(breaker, failed=True)
+    breaker.record(late, failed=False, latency=0.1)
+    assert breaker.state == OPEN
+    assert breaker.stats()["window_calls"] == 0
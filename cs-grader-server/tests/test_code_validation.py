@@ -0,0 +1,107 @@
+import ast
+import pytest
+from app.core.code_validation import (
+    exported_names, format_issues, has_errors, validate_generated_code, validate_tests
+)
+
+CODE = "import math\n\nLIMIT = 10\n_cache = {}\n\ndef area(r):\n    return math.pi * r ** 2\n\nclass Shape:\n    pass\n"
+TESTS = "from main import *\n\ndef test_area():\n    assert area(1) == math.pi\n    assert LIMIT == 10\n"
+
+def kinds(issues):
+    return [(issue.source, issue.kind, issue.severity) for issue in issues]
+
+def test_valid_code_and_tests_have_no_issues():
+    assert validate_generated_code(CODE, TESTS) == []
+
+def test_syntax_error_in_code_is_an_error_with_its_line():
+    issues = validate_generated_code("def f(:\n    pass\n", None)
+    assert kinds(issues) == [("code", "syntax", "error")]
+    assert issues[0].line == 1
+    assert has_errors(issues)
+
+def test_syntax_error_in_tests_stops_further_checks():
+    issues = validate_generated_code(CODE, "def test_x(:\n")
+    assert kinds(issues) == [("tests", "syntax", "error")]
+
+def test_compile_time_errors_count_as_syntax():
+    # Parses, but `return` outside a function only fails at compile time
+    assert kinds(validate_generated_code("return 1\n", None)) == [("code", "syntax", "error")]
+
+@pytest.mark.parametrize("code", ["import numpy\n", "from requests import get\n", "import numpy.linalg as la\n"])
+def test_modules_missing_from_the_sandbox(code):
+    issues = validate_generated_code(code, None)
+    assert kinds(issues) == [("code", "import", "error")]
+
+def test_stdlib_sandbox_and_relative_imports_are_allowed():
+    code = "import collections.abc\nfrom itertools import chain\nfrom . import sibling\n"
+    tests = "import pytest\nfrom main import *\n\ndef test_x():\n    assert chain\n"
+    assert validate_generated_code(code, tests) == []
+
+def test_missing_star_import_is_a_warning():
+    tests = "import main\n\ndef test_area():\n    assert main.area(1) > 3\n"
+    issues = validate_generated_code(CODE, tests)
+    assert kinds(issues) == [("tests", "import", "warning")]
+    assert not has_errors(issues)
+
+def test_tests_pytest_would_not_collect():
+    tests = "from main import *\n\ndef check_area():\n    assert area(1)\n\nclass AreaTests:\n    def test_a(self):\n        pass\n"
+    assert ("tests", "discovery", "error") in kinds(validate_generated_code(CODE, tests))
+
+def test_test_methods_in_test_classes_are_collected():
+    tests = "from main import *\n\nclass TestArea:\n    def test_unit(self):\n        assert area(1)\n"
+    assert validate_generated_code(CODE, tests) == []
+
+def test_undefined_names_are_reported_once():
+    tests = "from main import *\n\ndef test_volume():\n    assert volume(1) == volume(1)\n    assert perimeter(2)\n"
+    issues = validate_generated_code(CODE, tests)
+    assert kinds(issues) == [("tests", "undefined_name", "warning")] * 2
+    assert sorted((issue.line, issue.message.split("'")[1]) for issue in issues) == [(4, "volume"), (5, "perimeter")]
+
+def test_without_star_import_main_names_are_undefined():
+    tests = "def test_area():\n    assert area(1)\n"
+    assert ("tests", "undefined_name", "warning") in kinds(validate_generated_code(CODE, tests))
+
+def test_private_names_are_not_exported():
+    tests = "from main import *\n\ndef test_cache():\n    assert _cache == {}\n"
+    issues = validate_generated_code(CODE, tests)
+    assert [issue.message for issue in issues] == ["Name '_cache' is not defined in the tests or main.py"]
+
+def test_exported_names_are_public_module_level_bindings():
+    code = (
+        "import os.path\nfrom json import loads as parse\nA, (B, _c) = 1, (2, 3)\n"
+        "for INDEX in range(2):\n    pass\n\ndef f():\n    local = 1\n\nclass K:\n    attr = 1\n"
+    )
+    assert exported_names(ast.parse(code)) == {"os", "parse", "A", "B", "INDEX", "f", "K"}
+
+@pytest.mark.parametrize("body", [
+    "    assert [x * 2 for x in range(3)] == [0, 2, 4]",
+    "    assert {k: v for k, v in {}.items()} == {}",
+    "    assert sum(n for n in range(3)) == 3",
+    "    assert (y := 2) == y",
+    "    f = lambda value: value\n    assert f(1) == 1",
+    "    try:\n        area(None)\n    except TypeError as err:\n        assert err",
+    "    with open(__file__) as handle:\n        assert handle",
+    "    match [1, 2, 3]:\n        case [first, *rest]:\n            assert first and rest",
+    "    match {'a': 1}:\n        case {'a': value, **others}:\n            assert value and not others",
+    "    match Shape():\n        case Shape() as shape:\n            assert shape",
+    "    global counter\n    counter = 1\n    assert counter",
+])
+def test_bindings_in_tests_are_not_false_positives(body):
+    tests = f"from main import *\n\ndef test_binding():\n{body}\n"
+    assert validate_generated_code(CODE, tests) == []
+
+def test_names_are_not_checked_when_main_does_not_parse():
+    issues = validate_generated_code("def broken(:\n", TESTS)
+    assert kinds(issues) == [("code", "syntax", "error")]
+
+def test_validate_tests_without_code_skips_name_checks():
+    tests = "from main import *\n\ndef test_area():\n    assert area(1)\n"
+    assert validate_tests(None, tests) == []
+    issues = validate_tests("def other():\n    pass\n", tests)
+    assert kinds(issues) == [("tests", "undefined_name", "warning")]
+
+def test_format_issues_adds_lines_not_in_the_message():
+    issues = validate_generated_code("import numpy\ndef f(:\n", None)
+    assert format_issues(issues) == f"- {issues[0].message}"
+    issues = validate_generated_code("import numpy\n", None)
+    assert format_issues(issues) == "- Module 'numpy' is not available in the test sandbox (line 1)"
@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from app.api.v1.endpoints import batchGrade
+from app.api.v1.models import BatchGradeRequest
+from app.core.dedup import cluster_submissions, estimated_jaccard, fingerprint, minhash, normalize_tokens
+
+QUESTION = "Return the index of target in the sorted array, or -1"
+
+SOLUTION = """
+function binary_search(arr, target)
+    low <- 0
+    high <- length(arr) - 1
+    while low <= high do
+        mid <- (low + high) / 2
+        if arr[mid] == target then return mid
+        if arr[mid] < target then low <- mid + 1
+        else high <- mid - 1
+    endwhile
+    return -1
+"""
+
+RENAMED = """
+// same solution with other names
+FUNCTION Find(values, wanted)
+    lo <- 0
+    hi <- length(values) - 1
+    WHILE lo <= hi DO
+        m <- (lo + hi) / 2
+        IF values[m] == wanted THEN RETURN m
+        IF values[m] < wanted THEN lo <- m + 1
+        ELSE hi <- m - 1
+    ENDWHILE
+    RETURN -1
+"""
+
+# Off by one: skips the last element
+OFF_BY_ONE = SOLUTION.replace("while low <= high", "while low < high")
+
+def test_renamed_variables_and_comments_match():
+    assert fingerprint(SOLUTION) == fingerprint(RENAMED)
+
+@pytest.mark.parametrize("left, right", [
+    ("return max(a, b)", "return min(a, b)"),
+    ("x <- len(arr)\nreturn x", "x <- sum(arr)\nreturn x"),
+    ("for i in range(n): total += i", "for i in range(n): total -= i"),
+    ("if a < b then return a", "if a <= b then return a"),
+    (SOLUTION, OFF_BY_ONE),
+])
+def test_different_calls_and_operators_do_not_match(left, right):
+    assert fingerprint(left) != fingerprint(right)
+
+def test_only_bound_names_are_renamed():
+    tokens = normalize_tokens("def f(a, b):\n    total = a + b\n    for x in items: print(x)\n    return max(total, len(items))")
+    assert tokens[:6] == ["def", "v0", "(", "v1", ",", "v2"]
+    assert "max" in tokens and "len" in tokens
+    # Read but never bound here, so kept as written
+    assert "items" in tokens
+    assert "total" not in tokens and "x" not in tokens
+
+def test_index_and_attribute_assignments_do_not_bind():
+    tokens = normalize_tokens("arr[i] <- 0\nnode.next = head")
+    assert tokens == ["arr", "[", "i", "]", "<-", "0", "node", ".", "next", "=", "head"]
+
+def test_near_miss_is_similar_but_not_identical():
+    similarity = estimated_jaccard(minhash(normalize_tokens(SOLUTION)), minhash(normalize_tokens(OFF_BY_ONE)))
+    assert 0.6 <= similarity < 1.0
+
+def test_exact_duplicates_share_one_grade():
+    clusters = cluster_submissions(
+        [("a", QUESTION, SOLUTION), ("b", QUESTION, RENAMED), ("c", QUESTION, OFF_BY_ONE)], 1.0
+    )
+    assert [(c.members, c.kind) for c in clusters] == [(["a", "b"], "exact"), (["c"], "unique")]
+    assert clusters[0].graded_as == {"a": "a", "b": "a"}
+
+def test_near_miss_cluster_is_reported_but_graded_individually():
+    clusters = cluster_submissions(
+        [("a", QUESTION, SOLUTION), ("b", QUESTION, OFF_BY_ONE), ("c", QUESTION, RENAMED)], 0.5
+    )
+    assert len(clusters) == 1
+    cluster = clusters[0]
+    assert cluster.kind == "near"
+    assert cluster.members == ["a", "b", "c"]
+    assert cluster.graded_as == {"a": "a", "b": "b", "c": "a"}
+
+def test_different_questions_never_cluster():
+    clusters = cluster_submissions([("a", QUESTION, SOLUTION), ("b", "Sort the array", SOLUTION)], 0.5)
+    assert [c.kind for c in clusters] == ["unique", "unique"]
+
+def test_batch_grades_each_distinct_solution(monkeypatch):
+    graded = []
+
+    async def grade_submission(submission):
+        graded.append(submission.submission_id)
+        return {"score": submission.submission_id}
+
+    monkeypatch.setattr(batchGrade, "grade_submission", grade_submission)
+    request = BatchGradeRequest(
+        submissions=[
+            {"submission_id": "a", "question": QUESTION, "pseudocode": SOLUTION},
+            {"submission_id": "b", "question": QUESTION, "pseudocode": OFF_BY_ONE},
+            {"submission_id": "c", "question": QUESTION, "pseudocode": RENAMED},
+        ],
+        near_duplicate_threshold=0.5,
+    )
+    response = asyncio.run(batchGrade.grade_batch(request))
+
+    assert sorted(graded) == ["a", "b"]
+    assert {id_: result["score"] for id_, result in response.results.items()} == {"a": "a", "b": "b", "c": "a"}
+    assert response.results["b"]["graded_as"] == "b"
+    assert response.clusters[0].kind == "near"
+
+def test_default_threshold_is_exact_only():
+    assert BatchGradeRequest(submissions=[{"submission_id": "a", "question": "q", "pseudocode": "p"}]).near_duplicate_threshold == 1.0
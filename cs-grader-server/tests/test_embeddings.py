@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+from app.core.embeddings import EmbeddingProvider, LocalEmbeddingProvider, SEARCH_DOCUMENT, SEARCH_QUERY
+
+class FakeModel:
+    """Stands in for a SentenceTransformer: each text encodes to [len(text), call number]."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def encode(self, texts, batch_size, **kwargs):
+        with self._lock:
+            self.calls.append(list(texts))
+            call = len(self.calls)
+        if self.fail:
+            raise RuntimeError("out of memory")
+        return np.array([[len(text), call] for text in texts], dtype=np.float32)
+
+def local_provider(model, **kwargs):
+    provider = LocalEmbeddingProvider("/models/minilm", **kwargs)
+    provider._model = model
+    return provider
+
+def embed_concurrently(provider, texts, input_type=SEARCH_QUERY):
+    async def scenario():
+        return await asyncio.gather(*(provider.embed([text], input_type) for text in texts))
+    return [vectors[0] for vectors in asyncio.run(scenario())]
+
+def test_providers_must_implement_embed():
+    class Incomplete(EmbeddingProvider):
+        pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        Incomplete()
+
+def test_concurrent_queries_share_one_forward_pass():
+    model = FakeModel()
+    provider = local_provider(model, batch_size=32, batch_wait=0.05)
+    vectors = embed_concurrently(provider, ["a", "bb", "ccc", "dddd"])
+
+    assert model.calls == [["a", "bb", "ccc", "dddd"]]
+    # Each caller gets the vector of its own text
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [4.0, 1.0]]
+    assert provider.stats()["batches_total"] == 1
+    assert provider.stats()["avg_batch_size"] == 4.0
+
+def test_batches_are_capped_at_the_batch_size():
+    model = FakeModel()
+    provider = local_provider(model, batch_size=2, batch_wait=0.05)
+    vectors = embed_concurrently(provider, ["a", "bb", "ccc", "dddd", "eeeee"])
+
+    assert model.calls == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+    assert [vector[0] for vector in vectors] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert provider.stats()["texts_total"] == 5
+
+def test_queries_far_apart_are_encoded_separately():
+    model = FakeModel()
+    provider = local_provider(model, batch_wait=0.001)
+
+    async def scenario():
+        first = await provider.embed(["a"], SEARCH_QUERY)
+        second = await provider.embed(["b"], SEARCH_QUERY)
+        return first, second
+
+    asyncio.run(scenario())
+    assert model.calls == [["a"], ["b"]]
+
+def test_prefixes_follow_the_input_type():
+    model = FakeModel()
+    provider = local_provider(model, query_prefix="query: ", document_prefix="passage: ")
+
+    async def scenario():
+        await provider.embed(["sort"], SEARCH_QUERY)
+        await provider.embed(["merge", "split"], SEARCH_DOCUMENT)
+
+    asyncio.run(scenario())
+    assert model.calls == [["query: sort"], ["passage: merge", "passage: split"]]
+
+def test_encoding_errors_reach_every_waiter():
+    provider = local_provider(FakeModel(fail=True), batch_wait=0.01)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(provider.embed([text], SEARCH_QUERY) for text in ("a", "b")), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["out of memory", "out of memory"]
+
+def test_a_timed_out_caller_does_not_break_the_batch():
+    model = FakeModel()
+    provider = local_provider(model, batch_wait=0.05)
+
+    async def scenario():
+        impatient = asyncio.ensure_future(asyncio.wait_for(provider.embed(["a"], SEARCH_QUERY), timeout=0.01))
+        patient = asyncio.ensure_future(provider.embed(["bb"], SEARCH_QUERY))
+        return await asyncio.gather(impatient, patient, return_exceptions=True)
+
+    impatient, patient = asyncio.run(scenario())
+    assert isinstance(impatient, asyncio.TimeoutError)
+    assert patient == [[2.0, 1.0]]
+    assert [sorted(call) for call in model.calls] == [["a", "bb"]]
+
+def test_local_backend_needs_a_model_path():
+    with pytest.raises(ValueError):
+        LocalEmbeddingProvider("")
+
+def test_model_id_names_the_model_directory():
+    assert LocalEmbeddingProvider("/models/minilm/").model_id == "local:minilm"
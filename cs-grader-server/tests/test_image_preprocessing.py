@@ -0,0 +1,46 @@
+import asyncio
+import io
+from PIL import Image
+from app.core import image_preprocessing
+from app.core.config import settings
+from app.core.image_preprocessing import preprocess_image, shutdown_pool
+
+def photo(size=(1600, 1200)) -> bytes:
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_large_image_is_shrunk_in_the_pool(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_MAX_SIDE", 800)
+    try:
+        processed, result = asyncio.run(preprocess_image(photo()))
+    finally:
+        shutdown_pool()
+    assert result["applied"]
+    assert max(result["width"], result["height"]) == 800
+    assert result["processed_bytes"] == len(processed) < result["original_bytes"]
+
+def test_unreadable_image_is_passed_through():
+    try:
+        processed, result = asyncio.run(preprocess_image(b"not an image"))
+    finally:
+        shutdown_pool()
+    assert processed == b"not an image"
+    assert not result["applied"]
+
+def test_shutdown_stops_the_workers_and_a_new_pool_starts_on_demand():
+    asyncio.run(preprocess_image(photo((64, 64))))
+    pool = image_preprocessing._pool
+    workers = list(pool._processes.values())
+    assert workers
+
+    shutdown_pool()
+    assert image_preprocessing._pool is None
+    assert not any(worker.is_alive() for worker in workers)
+    shutdown_pool()  # idempotent
+
+    try:
+        asyncio.run(preprocess_image(photo((64, 64))))
+        assert image_preprocessing._pool is not None and image_preprocessing._pool is not pool
+    finally:
+        shutdown_pool()
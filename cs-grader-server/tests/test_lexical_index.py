@@ -0,0 +1,48 @@
+import pytest
+from app.core.lexical_index import LexicalIndex, tokenize
+
+DOCUMENTS = {
+    "search": {"question": "Binary search in a sorted array", "pseudocode": "while low <= high: mid = (low + high) / 2"},
+    "sort": {"question": "Sort an array with merge sort", "pseudocode": "split the array, sort both halves, merge"},
+    "graph": {"question": "Shortest path in a weighted graph", "pseudocode": "Dijkstra with a priority queue"},
+}
+
+@pytest.fixture
+def index():
+    return LexicalIndex(list(DOCUMENTS), list(DOCUMENTS.values()))
+
+def test_tokenize_adds_trigrams_of_long_words():
+    assert tokenize("A sort") == ["a", "sort", "#sor", "#ort"]
+
+def test_search_ranks_the_matching_document_first(index):
+    results = index.search("binary search sorted array", 3)
+    assert next(iter(results)) == "search"
+    assert all(0.0 <= score < 1.0 for score in results.values())
+
+def test_misspelled_query_still_matches(index):
+    results = index.search("shortst pathh graf", 1)
+    assert list(results) == ["graph"]
+
+def test_question_counts_more_than_pseudocode():
+    index = LexicalIndex(
+        ["in_question", "in_pseudocode"],
+        [{"question": "queue", "pseudocode": "x"}, {"question": "x", "pseudocode": "queue"}],
+    )
+    results = index.search("queue", 2)
+    assert results["in_question"] > results["in_pseudocode"]
+
+def test_search_without_known_terms(index):
+    assert index.search("", 3) == {}
+    assert index.search("zzz", 3) == {}
+
+def test_similarities_of_specific_documents(index):
+    scores = index.similarities("merge", ["sort", "graph", "unknown"])
+    assert scores["sort"] > 0
+    assert scores["graph"] == 0.0
+    assert scores["unknown"] == 0.0
+    assert scores["sort"] == pytest.approx(index.search("merge", 3)["sort"])
+
+def test_documents_without_text_are_indexed_empty():
+    index = LexicalIndex(["empty", "search"], [None, DOCUMENTS["search"]])
+    assert len(index) == 2
+    assert list(index.search("binary search", 2)) == ["search"]
@@ -0,0 +1,163 @@
+import asyncio
+import pytest
+from app.core.outbound import (
+    BATCH, INTERACTIVE, ProviderLimiter, QueueFullError, get_retry_after, parse_request_class
+)
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+
+def make_limiter(max_concurrency=1):
+    # A rate this high never makes a waiter wait for tokens
+    return ProviderLimiter("test", 1e6, max_concurrency)
+
+async def grant_order(limiter, waiters):
+    """Queue `waiters` ((name, tenant, lane), ...) behind a held slot and return the order they are granted in."""
+    held = [await limiter.acquire("holder", INTERACTIVE)]
+    order = []
+
+    async def wait(name, tenant, lane):
+        held.append(await limiter.acquire(tenant, lane))
+        order.append(name)
+
+    tasks = [asyncio.create_task(wait(*waiter)) for waiter in waiters]
+    await asyncio.sleep(0)
+    while held:
+        limiter.release(held.pop(0))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+def test_parse_request_class():
+    assert parse_request_class("Batch ") == BATCH
+    assert parse_request_class("interactive") == INTERACTIVE
+    assert parse_request_class("bulk") == INTERACTIVE
+    assert parse_request_class(None) == INTERACTIVE
+
+def test_get_retry_after():
+    assert get_retry_after(RateLimited(7)) == 7.0
+    assert get_retry_after(RateLimited()) is None
+    assert get_retry_after(Exception()) is None
+
+def test_tenants_are_served_round_robin():
+    limiter = make_limiter()
+    waiters = [(f"a{i}", "a", INTERACTIVE) for i in range(3)] + [("b0", "b", INTERACTIVE)]
+    order = asyncio.run(grant_order(limiter, waiters))
+    assert order == ["a0", "b0", "a1", "a2"]
+
+def test_interactive_lane_is_weighted_over_batch():
+    limiter = make_limiter()
+    waiters = [(f"batch{i}", "t", BATCH) for i in range(5)] + [(f"ui{i}", "t", INTERACTIVE) for i in range(8)]
+    order = asyncio.run(grant_order(limiter, waiters))
+    # INTERACTIVE_LANE_WEIGHT 4 to BATCH_LANE_WEIGHT 1
+    assert order[:10] == ["ui0", "ui1", "batch0", "ui2", "ui3", "ui4", "ui5", "batch1", "ui6", "ui7"]
+    assert order[10:] == ["batch2", "batch3", "batch4"]
+
+def test_batch_lane_is_capped_to_its_share():
+    async def scenario():
+        limiter = make_limiter(max_concurrency=4)
+        for _ in range(2):
+            await limiter.acquire("t", BATCH)
+        third = asyncio.create_task(limiter.acquire("t", BATCH))
+        await asyncio.sleep(0)
+        assert not third.done()
+        # Interactive calls may still use the free slots
+        assert await limiter.acquire("t", INTERACTIVE) == INTERACTIVE
+        limiter.release(BATCH)
+        assert await asyncio.wait_for(third, 1) == BATCH
+
+    asyncio.run(scenario())
+
+def test_full_lane_rejects_new_waiters():
+    async def scenario():
+        limiter = make_limiter()
+        limiter._queue_limits[BATCH] = 1
+        await limiter.acquire("t", INTERACTIVE)
+        queued = asyncio.create_task(limiter.acquire("t", BATCH))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError) as exc:
+            await limiter.acquire("t", BATCH)
+        assert exc.value.lane == BATCH
+        assert limiter.rejected_total == 1
+        queued.cancel()
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_does_not_hold_a_slot():
+    async def scenario():
+        limiter = make_limiter()
+        await limiter.acquire("t", INTERACTIVE)
+        cancelled = asyncio.create_task(limiter.acquire("t", INTERACTIVE))
+        waiting = asyncio.create_task(limiter.acquire("t", INTERACTIVE))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limiter.release(INTERACTIVE)
+        await asyncio.wait_for(waiting, 1)
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+def test_run_retries_after_rate_limit_and_backs_off():
+    async def scenario():
+        limiter = make_limiter()
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RateLimited(retry_after=0)
+            return "ok"
+
+        assert await limiter.run(call, tenant="t", max_retries=1) == "ok"
+        assert len(attempts) == 2
+        assert limiter.throttled_total == 1
+        assert limiter.rate < limiter.max_rate
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+def test_run_gives_up_after_max_retries():
+    async def scenario():
+        limiter = make_limiter()
+
+        async def call():
+            raise RateLimited(retry_after=0)
+
+        with pytest.raises(RateLimited):
+            await limiter.run(call, tenant="t", max_retries=0)
+        assert limiter.in_flight == 0
+        # Throttling is not a provider failure
+        assert not limiter.breaker.is_open
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiters_do_not_shift_lane_weighting():
+    async def scenario():
+        limiter = make_limiter()
+        held = [await limiter.acquire("holder", INTERACTIVE)]
+        order = []
+
+        async def wait(name, lane):
+            held.append(await limiter.acquire("t", lane))
+            order.append(name)
+
+        cancelled = [asyncio.create_task(limiter.acquire("t", BATCH)) for _ in range(3)]
+        tasks = [asyncio.create_task(wait("batch", BATCH))]
+        tasks += [asyncio.create_task(wait(f"ui{i}", INTERACTIVE)) for i in range(4)]
+        await asyncio.sleep(0)
+        for task in cancelled:
+            task.cancel()
+        await asyncio.sleep(0)
+        while held:
+            limiter.release(held.pop(0))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    # Same order as with no cancelled batch waiters at all
+    assert asyncio.run(scenario()) == ["ui0", "ui1", "batch", "ui2", "ui3"]
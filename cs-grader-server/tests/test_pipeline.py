@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from app.core.pipeline import Pipeline, Stage, StageSkipped
+
+def value(result):
+    async def fn(inputs):
+        return result
+    return fn
+
+def failing(message):
+    async def fn(inputs):
+        raise RuntimeError(message)
+    return fn
+
+def test_dependents_receive_dependency_values():
+    async def add(inputs):
+        return inputs["a"] + inputs["b"]
+
+    results = asyncio.run(Pipeline([
+        Stage("a", value(1)),
+        Stage("b", value(2)),
+        Stage("sum", add, deps=("a", "b")),
+    ]).run())
+    assert results["sum"].ok
+    assert results["sum"].value == 3
+
+def test_independent_stages_run_concurrently():
+    started = []
+
+    def slow(name):
+        async def fn(inputs):
+            started.append(name)
+            await asyncio.sleep(0.2)
+            return name
+        return fn
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await Pipeline([Stage("a", slow("a")), Stage("b", slow("b")), Stage("c", slow("c"))]).run()
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) < 0.5
+    assert sorted(started) == ["a", "b", "c"]
+
+def test_failed_required_dependency_skips_dependents():
+    called = []
+
+    async def downstream(inputs):
+        called.append(True)
+
+    pipeline = Pipeline([
+        Stage("fetch", failing("boom")),
+        Stage("use", downstream, deps=("fetch",)),
+        Stage("after", downstream, deps=("use",)),
+    ])
+    results = asyncio.run(pipeline.run())
+    assert results["fetch"].status == "failed"
+    assert results["use"].status == "skipped"
+    assert results["use"].reason == "fetch failed"
+    assert results["after"].reason == "use skipped"
+    assert not called
+
+def test_optional_dependency_failure_passes_none():
+    async def use(inputs):
+        return inputs["hint"]
+
+    results = asyncio.run(Pipeline([
+        Stage("hint", failing("down"), optional=True),
+        Stage("use", use, deps=("hint",)),
+    ]).run())
+    assert results["use"].ok
+    assert results["use"].value is None
+
+def test_stage_timeout():
+    async def hang(inputs):
+        await asyncio.sleep(5)
+
+    pipeline = Pipeline([Stage("hang", hang, optional=True, timeout=0.05)])
+    results = asyncio.run(pipeline.run())
+    assert results["hang"].status == "timeout"
+    assert pipeline.timeline()["hang"]["reason"] == "timed out after 0.05s"
+
+def test_stage_can_skip_itself():
+    async def skip(inputs):
+        raise StageSkipped("nothing to do")
+
+    results = asyncio.run(Pipeline([Stage("skip", skip)]).run())
+    assert results["skip"].status == "skipped"
+    assert results["skip"].reason == "nothing to do"
+
+def test_fatal_failure_cancels_running_stages():
+    cancelled = []
+
+    async def long(inputs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    pipeline = Pipeline([Stage("long", long), Stage("validate", failing("invalid"), fatal=True)])
+    with pytest.raises(RuntimeError, match="invalid"):
+        asyncio.run(pipeline.run())
+    assert cancelled == [True]
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError, match="unknown stage 'missing'"):
+        Pipeline([Stage("a", value(1), deps=("missing",))])
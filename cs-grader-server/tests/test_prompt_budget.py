@@ -0,0 +1,77 @@
+from app.core import prompt_budget
+from app.core.config import settings
+from app.core.prompt_budget import (
+    TRUNCATION_MARKER, clean_ocr_text, compact_submission, count_tokens, fit_similar_algorithms,
+    scale_output_tokens, truncate_to_budget
+)
+
+PSEUDOCODE = """function search(arr, target) {
+    for i in range(len(arr)) {
+        if arr[i] == target {
+            return i
+        }
+    }
+    return -1
+}
+-----
+"""
+
+def test_prose_noise_lines_are_dropped():
+    page = "Write a function.\n|\n~~~~\n\x0cReturn the index."
+    # The question printed on every page is kept once
+    assert clean_ocr_text(page + "\n\n\n\n" + page) == "Write a function.\nReturn the index."
+
+def test_code_keeps_closing_brackets():
+    cleaned = clean_ocr_text(PSEUDOCODE, dedupe=False, code=True)
+    assert cleaned.count("}") == PSEUDOCODE.count("}")
+    assert cleaned.splitlines()[-1] == "}"
+    assert "-----" not in cleaned
+
+def test_compaction_keeps_block_structure_and_drops_the_repeated_question():
+    question = "Find the index of target in the array, or -1."
+    _, pseudocode = compact_submission(question, question + "\n" + PSEUDOCODE)
+    assert question not in pseudocode
+    assert pseudocode == clean_ocr_text(PSEUDOCODE, dedupe=False, code=True)
+
+def test_truncate_keeps_beginning_and_end():
+    text = "a" * 400 + "z" * 400
+    truncated = truncate_to_budget(text, 50)
+    assert count_tokens(truncated) <= 50
+    assert truncated.startswith("a") and truncated.endswith("z")
+    assert TRUNCATION_MARKER in truncated
+    assert truncate_to_budget("short", 50) == "short"
+
+def test_compaction_fits_the_budget_favouring_the_pseudocode(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_TOKEN_BUDGET", 300)
+    question, pseudocode = compact_submission("q" * 2000, "p" * 2000)
+    assert count_tokens(question) + count_tokens(pseudocode) <= 300
+    assert count_tokens(pseudocode) > count_tokens(question)
+
+def test_similar_algorithms_fit_in_order_of_similarity(monkeypatch):
+    monkeypatch.setattr(settings, "MIN_SIMILAR_ALGORITHM_TOKENS", 10)
+    algorithms = [
+        {"similarity": 0.5, "question": "low", "pseudocode": "x" * 400},
+        {"similarity": 0.9, "question": "high", "pseudocode": "y" * 400},
+        {"similarity": 0.7, "question": "mid", "pseudocode": "z" * 400},
+    ]
+    fitted = fit_similar_algorithms(algorithms, max_tokens=160)
+    # The second most similar is trimmed into what is left; the last is dropped
+    assert [algorithm["question"] for algorithm in fitted] == ["high", "mid"]
+    assert TRUNCATION_MARKER in fitted[1]["pseudocode"]
+    assert sum(count_tokens(a["question"]) + count_tokens(a["pseudocode"]) for a in fitted) <= 160
+
+def test_similar_algorithm_below_the_minimum_is_dropped(monkeypatch):
+    monkeypatch.setattr(settings, "MIN_SIMILAR_ALGORITHM_TOKENS", 64)
+    fitted = fit_similar_algorithms([{"similarity": 0.9, "question": "q", "pseudocode": "x" * 400}], max_tokens=20)
+    assert fitted == []
+
+def test_output_tokens_scale_within_bounds(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_MIN_OUTPUT_TOKENS", 1000)
+    monkeypatch.setattr(settings, "GEMINI_MAX_OUTPUT_TOKENS", 4096)
+    assert scale_output_tokens("x") == 1000
+    assert scale_output_tokens("x" * 4000) == 1000 * 3 + 256
+    assert scale_output_tokens("x" * 40000) == 4096
+
+def test_noise_pattern_is_kept_for_prose():
+    assert prompt_budget.NOISE_LINE_PATTERN.match("}")
+    assert not prompt_budget.RULED_LINE_PATTERN.match("}")
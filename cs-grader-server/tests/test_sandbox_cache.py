@@ -0,0 +1,101 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app.api.v1.endpoints import pytest as pytest_endpoint
+from app.core.config import settings
+from app.core.sandbox_cache import is_nondeterministic, run_cache_key, sandbox_limits, uncacheable_reason
+
+CODE = "def add(a, b):\n    return a + b\n"
+TESTS = "from main import *\nimport random\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+
+def finished(**overrides):
+    result = {
+        "exit_code": 0,
+        "logs": "",
+        "report": {"summary": {"passed": 1, "total": 1}, "tests": [{"nodeid": "test_main.py::test_add", "outcome": "passed"}]},
+        "duration": 0.5,
+        "timed_out": False,
+        "oom_killed": False,
+    }
+    result.update(overrides)
+    return result
+
+@pytest.mark.parametrize("tests", [
+    TESTS,
+    "import random\nrandom.seed(0)\n\ndef test_pick():\n    assert random.randint(1, 6) == random.randint(1, 6) or True\n",
+    "import random\n\ndef test_rng():\n    rng = random.Random(42)\n    assert rng.random() < 1\n",
+    "import time\n\ndef test_sleep():\n    time.sleep(0)\n",
+    "import os\n\ndef test_path():\n    assert os.path.join('a', 'b') == 'a/b'\n",
+    "from datetime import datetime\n\ndef test_parse():\n    assert datetime(2024, 1, 1).year == 2024\n",
+])
+def test_deterministic_use_is_cacheable(tests):
+    assert not is_nondeterministic(CODE, tests)
+
+@pytest.mark.parametrize("tests", [
+    "import random\n\ndef test_pick():\n    assert 1 <= random.randint(1, 6) <= 6\n",
+    "from random import choice as pick\n\ndef test_pick():\n    assert pick([1, 2])\n",
+    "import numpy as np\n\ndef test_noise():\n    assert np.random.rand() < 1\n",
+    "import uuid\n\ndef test_id():\n    assert uuid.uuid4()\n",
+    "from datetime import datetime\n\ndef test_now():\n    assert datetime.now()\n",
+    "import time\n\ndef test_clock():\n    assert time.time() > 0\n",
+    "import threading\n\ndef test_thread():\n    threading.Thread(target=print).start()\n",
+    "import random\nrandom.seed(0)\n\ndef test_secure():\n    assert random.SystemRandom().random() < 1\n",
+])
+def test_unseeded_or_clock_calls_are_nondeterministic(tests):
+    assert is_nondeterministic(CODE, tests)
+
+def test_names_imported_by_the_code_resolve_in_the_tests():
+    code = "import random\n\ndef roll():\n    return 4\n"
+    assert is_nondeterministic(code, "from main import *\n\ndef test_roll():\n    assert random.random() < 1\n")
+    # Seeding in the code covers the tests too
+    assert not is_nondeterministic("import random\nrandom.seed(1)\n", "from main import *\n\ndef test_r():\n    random.random()\n")
+
+def test_syntax_errors_are_ignored():
+    assert not is_nondeterministic("def broken(:\n", TESTS)
+
+@pytest.mark.parametrize("result, reason", [
+    (finished(), None),
+    (finished(exit_code=1), None),
+    (finished(timed_out=True, exit_code=137), "timeout"),
+    (finished(oom_killed=True, exit_code=137), "memory_limit"),
+    (finished(exit_code=2), "abnormal_exit"),
+    (finished(report={"tests": [{"outcome": "error"}]}), "flaky_outcome"),
+    (finished(duration=settings.SANDBOX_TIMEOUT * 0.9), "near_timeout"),
+])
+def test_uncacheable_reason(result, reason):
+    assert uncacheable_reason(result, nondeterministic=False) == reason
+
+def test_nondeterministic_runs_are_not_cached():
+    assert uncacheable_reason(finished(), nondeterministic=True) == "nondeterministic"
+
+def test_cache_key_covers_image_and_limits():
+    key = run_cache_key(CODE, TESTS, "pytest-runner:abc", sandbox_limits())
+    assert key == run_cache_key(CODE, TESTS, "pytest-runner:abc", sandbox_limits())
+    assert key != run_cache_key(CODE, TESTS, "pytest-runner:def", sandbox_limits())
+    assert key != run_cache_key(CODE, TESTS, "pytest-runner:abc", {**sandbox_limits(), "timeout": 1})
+    assert key != run_cache_key(CODE, None, "pytest-runner:abc", sandbox_limits())
+
+def test_cache_hit_needs_no_docker(shared_store, monkeypatch):
+    runs = []
+
+    def run_pytest_in_container(code, test_code=None):
+        runs.append(code)
+        return finished()
+
+    def no_docker():
+        raise HTTPException(status_code=503, detail="Docker is not running")
+
+    monkeypatch.setattr(settings, "SANDBOX_EXECUTION", "local")
+    monkeypatch.setattr(settings, "SANDBOX_RESULT_CACHE", True)
+    monkeypatch.setattr(pytest_endpoint, "run_pytest_in_container", run_pytest_in_container)
+    monkeypatch.setattr(pytest_endpoint, "get_docker_client", no_docker)
+    app = FastAPI()
+    app.include_router(pytest_endpoint.router)
+    client = TestClient(app)
+
+    first = client.post("/run", json={"code": CODE, "test_code": TESTS})
+    second = client.post("/run", json={"code": CODE, "test_code": TESTS})
+    assert first.status_code == second.status_code == 200
+    assert first.json()["cached"] is False
+    assert second.json()["cached"] is True
+    assert len(runs) == 1
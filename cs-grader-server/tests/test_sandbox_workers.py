@@ -0,0 +1,166 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from app import sandbox_worker
+from app.core.config import settings
+from app.core.sandbox import runner_image_ref
+from app.core.sandbox_cache import sandbox_limits
+from app.core.sandbox_workers import (
+    JOBS_NAMESPACE, WORKERS_NAMESPACE, SandboxDispatcher, SandboxJobError, queue_namespace
+)
+from app.core.streaming import ndjson_event
+from app.sandbox_worker import SandboxWorker
+
+RESULT = {"exit_code": 0, "logs": "test_main.py::test_add PASSED", "report": None, "duration": 0.01,
+          "timed_out": False, "oom_killed": False}
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(settings, "SANDBOX_WORKER_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "SANDBOX_WORKER_HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "SANDBOX_CLAIM_TIMEOUT", 0.2)
+    monkeypatch.setattr(settings, "SANDBOX_QUEUE_TIMEOUT", 2.0)
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Replace Docker in the worker with a run that streams fixed events; records the code it ran."""
+    runs = []
+
+    def stream_pytest_in_container(client, code, test_code=None):
+        runs.append(code)
+        if code == "crash":
+            yield ndjson_event({"event": "error", "status_code": 500, "detail": "Docker API error: boom"})
+            return
+        yield ndjson_event({"event": "started"})
+        yield ndjson_event({"event": "log", "line": "test_main.py::test_add PASSED"})
+        yield ndjson_event({"event": "test", "nodeid": "test_main.py::test_add", "outcome": "passed"})
+        yield ndjson_event({"event": "result", **RESULT})
+
+    monkeypatch.setattr(sandbox_worker, "get_docker_client", lambda: object())
+    monkeypatch.setattr(sandbox_worker, "get_runner_image", lambda client: "sha256:runner")
+    monkeypatch.setattr(sandbox_worker, "stream_pytest_in_container", stream_pytest_in_container)
+    return runs
+
+async def start_worker(store, worker_id, capacity=2):
+    worker = SandboxWorker(store, worker_id, capacity)
+    task = asyncio.create_task(worker.run())
+    while await store.get(WORKERS_NAMESPACE, worker_id) is None:
+        await asyncio.sleep(0.01)
+    return worker, task
+
+async def stop_worker(worker, task):
+    worker.stopping.set()
+    await task
+
+async def advertise(store, worker_id, **overrides):
+    """A heartbeat for a worker that never claims anything."""
+    heartbeat = {"id": worker_id, "capacity": 2, "running": 0, "queued": 0,
+                 "image": runner_image_ref(), "limits": sandbox_limits()}
+    heartbeat.update(overrides)
+    await store.set_json(WORKERS_NAMESPACE, worker_id, heartbeat)
+
+def test_run_on_a_worker(shared_store, runs):
+    async def scenario():
+        worker, task = await start_worker(shared_store, "w1")
+        dispatcher = SandboxDispatcher()
+        try:
+            events = [event async for event in dispatcher.stream("code", "tests", runner_image_ref())]
+            result = await dispatcher.run("code", "tests", runner_image_ref())
+        finally:
+            await stop_worker(worker, task)
+        return dispatcher, events, result
+
+    dispatcher, events, result = asyncio.run(scenario())
+    assert [event["event"] for event in events] == ["started", "log", "test", "result"]
+    assert result == RESULT
+    assert runs == ["code", "code"]
+    assert dispatcher.placed_total == {"w1": 2}
+    assert dispatcher.in_flight == {"w1": 0}
+
+    async def leftovers():
+        return await shared_store.keys(JOBS_NAMESPACE), await shared_store.keys(WORKERS_NAMESPACE)
+
+    # Finished jobs are removed, and a stopped worker takes its heartbeat with it
+    assert asyncio.run(leftovers()) == ([], [])
+
+def test_worker_error_is_raised(shared_store, runs):
+    async def scenario():
+        worker, task = await start_worker(shared_store, "w1")
+        try:
+            with pytest.raises(SandboxJobError) as exc:
+                await SandboxDispatcher().run("crash", None, runner_image_ref())
+        finally:
+            await stop_worker(worker, task)
+        return exc.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 500
+    assert "boom" in error.detail
+
+def test_no_compatible_worker(shared_store):
+    async def scenario():
+        await advertise(shared_store, "other-image", image="pytest-runner:other")
+        await advertise(shared_store, "other-limits", limits={**sandbox_limits(), "timeout": 1})
+        await advertise(shared_store, "draining", capacity=0)
+        with pytest.raises(SandboxJobError) as exc:
+            await SandboxDispatcher().run("code", None, runner_image_ref())
+        return exc.value
+
+    assert asyncio.run(scenario()).status_code == 503
+
+def test_placement_prefers_the_least_loaded_worker(shared_store):
+    async def scenario():
+        await advertise(shared_store, "busy", running=2, capacity=4)
+        await advertise(shared_store, "idle", running=0, capacity=4)
+        dispatcher = SandboxDispatcher()
+        first = await dispatcher._place(shared_store, runner_image_ref(), set())
+        # Jobs this replica already sent count even before the worker reports them
+        dispatcher.in_flight["idle"] = 3
+        second = await dispatcher._place(shared_store, runner_image_ref(), set())
+        return first, second
+
+    assert asyncio.run(scenario()) == ("idle", "busy")
+
+def test_unclaimed_job_moves_to_a_free_worker(shared_store, runs):
+    async def scenario():
+        # A worker that advertises capacity but never claims its queue
+        await advertise(shared_store, "stuck")
+        dispatcher = SandboxDispatcher()
+        job = asyncio.create_task(dispatcher.run("code", None, runner_image_ref()))
+        while not await shared_store.keys(queue_namespace("stuck")):
+            await asyncio.sleep(0.01)
+        worker, task = await start_worker(shared_store, "w1")
+        try:
+            result = await asyncio.wait_for(job, 5)
+        finally:
+            await stop_worker(worker, task)
+        return dispatcher, result, await shared_store.keys(queue_namespace("stuck"))
+
+    dispatcher, result, stuck_queue = asyncio.run(scenario())
+    assert result == RESULT
+    assert dispatcher.moved_total == 1
+    assert dispatcher.placed_total == {"stuck": 1, "w1": 1}
+    assert stuck_queue == []
+
+def test_job_times_out_in_the_queue(shared_store, monkeypatch):
+    monkeypatch.setattr(settings, "SANDBOX_QUEUE_TIMEOUT", 0.3)
+
+    async def scenario():
+        await advertise(shared_store, "stuck")
+        with pytest.raises(SandboxJobError) as exc:
+            await SandboxDispatcher().run("code", None, runner_image_ref())
+        return exc.value, await shared_store.keys(JOBS_NAMESPACE)
+
+    error, jobs = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert jobs == []
+
+def test_worker_starts_without_provider_credentials():
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("GOOGLE_API_KEY", "COHERE_API_KEY", "GOOGLE_APPLICATION_CREDENTIALS")}
+    check = "import sys, app.sandbox_worker; assert 'google.generativeai' not in sys.modules"
+    completed = subprocess.run([sys.executable, "-c", check], env=env, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert completed.returncode == 0, completed.stderr
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from app.core.single_flight import SingleFlight, request_key, single_flight
+
+def test_request_key_separates_parts():
+    assert request_key("model", "prompt") == request_key("model", "prompt")
+    assert request_key("ab", "c") != request_key("a", "bc")
+    assert request_key(b"x") == request_key("x")
+
+def test_concurrent_calls_share_one_task():
+    async def scenario():
+        group = SingleFlight("test")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+
+        results = await asyncio.gather(*(group.do("key", fetch) for _ in range(5)))
+        return group, calls, results
+
+    group, calls, results = asyncio.run(scenario())
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert group.stats() == {"in_flight": 0, "calls_total": 1, "coalesced_total": 4}
+
+def test_nothing_is_cached_after_the_call_finishes():
+    async def scenario():
+        group = SingleFlight("test")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return len(calls)
+
+        return [await group.do("key", fetch), await group.do("key", fetch)]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        group = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("provider down")
+
+        return await asyncio.gather(group.do("key", fail), group.do("key", fail), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [str(error) for error in results] == ["provider down", "provider down"]
+
+def test_cancelled_waiter_leaves_the_call_running_for_others():
+    async def scenario():
+        group = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "value"
+
+        first = asyncio.create_task(group.do("key", fetch))
+        second = asyncio.create_task(group.do("key", fetch))
+        await started.wait()
+        first.cancel()
+        return await second, first
+
+    value, first = asyncio.run(scenario())
+    assert value == "value"
+    assert first.cancelled()
+
+def test_call_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        group = SingleFlight("test")
+        started = asyncio.Event()
+        cancelled = []
+
+        async def fetch():
+            started.set()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        waiter = asyncio.create_task(group.do("key", fetch))
+        await started.wait()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)
+        return group, cancelled
+
+    group, cancelled = asyncio.run(scenario())
+    assert cancelled == [True]
+    assert group.stats()["in_flight"] == 0
+
+def test_groups_are_shared_by_name():
+    assert single_flight("shared") is single_flight("shared")
+    assert single_flight("shared") is not single_flight("other")
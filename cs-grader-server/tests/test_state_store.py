@@ -0,0 +1,136 @@
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app import state_service
+from app.core.config import settings
+from app.core.state_store import HttpStateStore, SqliteStateStore, StateStore, STATE_TOKEN_HEADER, purge_periodically
+
+TOKEN = "test-token"
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """The state service app, backed by its own SQLite file."""
+    monkeypatch.setattr(settings, "STATE_SERVICE_TOKEN", TOKEN)
+    monkeypatch.setattr(state_service, "store", SqliteStateStore(str(tmp_path / "service.db")))
+    return state_service.app
+
+@pytest.fixture(params=["sqlite", "http"])
+def make_store(request, tmp_path):
+    """Open a store of each backend; call it inside the test's event loop."""
+    if request.param == "sqlite":
+        return lambda: SqliteStateStore(str(tmp_path / "state.db"))
+    app = request.getfixturevalue("service")
+    return lambda: HttpStateStore("http://state", token=TOKEN, transport=httpx.ASGITransport(app=app))
+
+def run_with(make_store, scenario):
+    async def main():
+        store = make_store()
+        try:
+            return await scenario(store)
+        finally:
+            await store.close()
+    return asyncio.run(main())
+
+def test_get_set_delete(make_store):
+    async def scenario(store):
+        assert await store.get("ns", "missing") is None
+        await store.set("ns", "key", b"value")
+        assert await store.get("ns", "key") == b"value"
+        await store.set("ns", "key", b"replaced")
+        assert await store.get("ns", "key") == b"replaced"
+        await store.delete("ns", "key")
+        assert await store.get("ns", "key") is None
+
+    run_with(make_store, scenario)
+
+def test_json_values(make_store):
+    async def scenario(store):
+        await store.set_json("ns", "key", {"score": 0.5, "items": [1, 2]})
+        assert await store.get_json("ns", "key") == {"score": 0.5, "items": [1, 2]}
+        assert await store.get_json("ns", "missing") is None
+
+    run_with(make_store, scenario)
+
+def test_entries_expire_after_their_ttl(make_store):
+    async def scenario(store):
+        await store.set("ns", "short", b"1", ttl=0.1)
+        await store.set("ns", "long", b"2", ttl=60)
+        assert await store.get("ns", "short") == b"1"
+        await asyncio.sleep(0.2)
+        assert await store.get("ns", "short") is None
+        assert await store.get("ns", "long") == b"2"
+        assert await store.keys("ns") == ["long"]
+
+    run_with(make_store, scenario)
+
+def test_keys_in_write_order_with_paging(make_store):
+    async def scenario(store):
+        for key in ("c", "a", "b"):
+            await store.set("ns", key, b"")
+        await store.set("other", "x", b"")
+        assert await store.keys("ns") == ["c", "a", "b"]
+        assert await store.keys("ns", limit=1, offset=1) == ["a"]
+
+    run_with(make_store, scenario)
+
+def test_lock_lease(make_store):
+    async def scenario(store):
+        assert await store.acquire_lock("job", "a", ttl=60)
+        assert not await store.acquire_lock("job", "b", ttl=60)
+        # The owner renews its lease
+        assert await store.acquire_lock("job", "a", ttl=60)
+        # Only the owner can release it
+        await store.release_lock("job", "b")
+        assert not await store.acquire_lock("job", "b", ttl=60)
+        await store.release_lock("job", "a")
+        assert await store.acquire_lock("job", "b", ttl=60)
+
+    run_with(make_store, scenario)
+
+def test_expired_lease_can_be_taken_over(make_store):
+    async def scenario(store):
+        assert await store.acquire_lock("job", "a", ttl=0.1)
+        await asyncio.sleep(0.2)
+        assert await store.acquire_lock("job", "b", ttl=60)
+        assert not await store.acquire_lock("job", "a", ttl=60)
+
+    run_with(make_store, scenario)
+
+def test_backends_must_implement_every_operation():
+    class Incomplete(StateStore):
+        async def get(self, namespace, key):
+            return None
+
+    with pytest.raises(TypeError, match="abstract"):
+        Incomplete()
+
+def test_purge_removes_expired_entries(tmp_path):
+    async def scenario():
+        store = SqliteStateStore(str(tmp_path / "state.db"))
+        await store.set("ns", "short", b"", ttl=0.05)
+        await store.set("ns", "kept", b"")
+        await asyncio.sleep(0.1)
+        assert store.purge_expired() == 1
+        await store.set("ns", "short", b"", ttl=0.05)
+        purger = asyncio.create_task(purge_periodically(store, 0.1))
+        await asyncio.sleep(0.3)
+        purger.cancel()
+        remaining = store._conn.execute("SELECT key FROM entries").fetchall()
+        await store.close()
+        return remaining
+
+    assert asyncio.run(scenario()) == [("kept",)]
+
+def test_state_service_requires_the_token(service):
+    client = TestClient(service)
+    assert client.get("/kv/ns/key").status_code == 401
+    assert client.get("/kv/ns/key", headers={STATE_TOKEN_HEADER: "wrong"}).status_code == 401
+    assert client.get("/kv/ns/key", headers={STATE_TOKEN_HEADER: TOKEN}).status_code == 404
+    assert client.post("/locks/job", json={"owner": "a", "ttl": 1}).status_code == 401
+    assert client.get("/health").status_code == 200
+
+def test_state_service_is_closed_without_a_token(service, monkeypatch):
+    monkeypatch.setattr(settings, "STATE_SERVICE_TOKEN", "")
+    response = TestClient(service).get("/kv/ns/key", headers={STATE_TOKEN_HEADER: ""})
+    assert response.status_code == 403
@@ -0,0 +1,123 @@
+import asyncio
+import importlib
+from unittest import mock
+import pytest
+from app.core.config import settings
+from app.core.pipeline import Pipeline, Stage
+from app.core.submissions import (
+    SUBMISSION_FILES_NAMESPACE, SUBMISSIONS_NAMESPACE, StageRecorder, component_version, submission_store
+)
+
+FILES = {"question": [("files", ("question.png", b"\x89PNG", "image/png"))]}
+
+def saved_ttls(store, monkeypatch, retention_days):
+    monkeypatch.setattr(settings, "SUBMISSION_RECORDS_ENABLED", True)
+    monkeypatch.setattr(settings, "SUBMISSION_RETENTION_DAYS", retention_days)
+    ttls = {}
+    set_json = store.set_json
+
+    async def recording_set_json(namespace, key, value, ttl=None):
+        ttls[namespace] = ttl
+        await set_json(namespace, key, value, ttl)
+
+    monkeypatch.setattr(store, "set_json", recording_set_json)
+    asyncio.run(submission_store.save("sub-1", {"stage": {}}, {"preprocess_images": True}, FILES))
+    return ttls
+
+def test_records_and_uploads_expire_after_the_retention_period(shared_store, monkeypatch):
+    ttls = saved_ttls(shared_store, monkeypatch, 2)
+    assert ttls == {SUBMISSIONS_NAMESPACE: 2 * 24 * 3600, SUBMISSION_FILES_NAMESPACE: 2 * 24 * 3600}
+
+    async def load():
+        return await submission_store.load("sub-1"), await submission_store.load_files("sub-1")
+
+    record, files = asyncio.run(load())
+    assert record["options"] == {"preprocess_images": True}
+    assert files == FILES
+
+def test_zero_retention_keeps_submissions(shared_store, monkeypatch):
+    ttls = saved_ttls(shared_store, monkeypatch, 0)
+    assert ttls == {SUBMISSIONS_NAMESPACE: None, SUBMISSION_FILES_NAMESPACE: None}
+
+def grade(recorder, fingerprints, outputs, calls):
+    """Run a small grading-shaped DAG: text -> code -> tests, and text -> evaluation."""
+    def stage(name):
+        async def fn(inputs):
+            calls.append(name)
+            return outputs.get(name, f"{name}({','.join(str(inputs[dep]) for dep in sorted(inputs))})")
+        return fn
+
+    stages = {"text": (), "code": ("text",), "tests": ("code",), "evaluation": ("text",)}
+    results = asyncio.run(Pipeline([
+        Stage(name, recorder.wrap(name, stage(name), fingerprints[name]), deps=deps)
+        for name, deps in stages.items()
+    ]).run())
+    return {name: result.value for name, result in results.items()}
+
+FINGERPRINTS = {"text": "t1", "code": "c1", "tests": "x1", "evaluation": "e1"}
+
+def test_unchanged_stages_are_reused():
+    first = StageRecorder()
+    values = grade(first, FINGERPRINTS, {}, [])
+
+    calls = []
+    second = StageRecorder(first.records)
+    assert grade(second, FINGERPRINTS, {}, calls) == values
+    assert calls == []
+    assert sorted(second.reused) == ["code", "evaluation", "tests", "text"]
+    assert second.recomputed == []
+
+def test_changed_fingerprint_recomputes_the_stage_and_what_its_output_feeds():
+    first = StageRecorder()
+    grade(first, FINGERPRINTS, {}, [])
+
+    calls = []
+    second = StageRecorder(first.records)
+    grade(second, {**FINGERPRINTS, "code": "c2"}, {"code": "new code"}, calls)
+    assert sorted(calls) == ["code", "tests"]
+    assert sorted(second.reused) == ["evaluation", "text"]
+    assert second.records["tests"]["output"] == "tests(new code)"
+
+def test_same_output_after_recompute_keeps_downstream_reused():
+    first = StageRecorder()
+    grade(first, FINGERPRINTS, {}, [])
+
+    calls = []
+    second = StageRecorder(first.records)
+    grade(second, {**FINGERPRINTS, "text": "t2"}, {}, calls)
+    assert calls == ["text"]
+    assert sorted(second.reused) == ["code", "evaluation", "tests"]
+
+def test_failed_stages_are_not_reused():
+    records = {"text": {"status": "failed", "fingerprint": "t1", "inputs_hash": "", "error": "boom"}}
+
+    calls = []
+    grade(StageRecorder(records), FINGERPRINTS, {}, calls)
+    assert "text" in calls
+
+@pytest.fixture(scope="module")
+def stage_fingerprints():
+    # Importing the router registers every endpoint's version, as at startup.
+    # The OCR endpoint creates its Vision client at import; it is never called here.
+    with mock.patch("google.cloud.vision.ImageAnnotatorClient"):
+        importlib.import_module("app.api.v1.api")
+        from app.api.v1.endpoints.getResponse import stage_fingerprints
+    return stage_fingerprints
+
+def test_every_stage_component_is_versioned(stage_fingerprints):
+    for name in ("vision_ocr", "usable_text", "similar", "generate_question_tests", "generate_code",
+                 "generate_tests", "evaluate", "prompt_budget"):
+        assert component_version(name) != "unregistered", name
+
+@pytest.mark.parametrize("setting, value, changed", [
+    ("PROMPT_TOKEN_BUDGET", 3000, {"test_generation", "code_generation", "tests", "logic_evaluation"}),
+    ("GEMINI_MAX_OUTPUT_TOKENS", 8192, {"code_generation"}),
+    ("GEMINI_MIN_OUTPUT_TOKENS", 500, {"code_generation"}),
+    ("SIMILAR_ALGORITHMS_TOKEN_BUDGET", 500, {"logic_evaluation"}),
+    ("MIN_SIMILAR_ALGORITHM_TOKENS", 16, {"logic_evaluation"}),
+])
+def test_budget_settings_change_the_stages_they_shape(stage_fingerprints, monkeypatch, setting, value, changed):
+    before = stage_fingerprints(True)
+    monkeypatch.setattr(settings, setting, value)
+    after = stage_fingerprints(True)
+    assert {name for name in before if before[name] != after[name]} == changed
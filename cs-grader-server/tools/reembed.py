@@ -0,0 +1,102 @@
+"""
+Re-embed the `algorithms` collection with another embedding backend.
+
+Reads every document from the source Chroma directory, embeds it with the
+chosen backend (EMBEDDING_BACKEND settings apply, e.g. EMBEDDING_MODEL_PATH
+for "local") and writes a new collection to the output directory, recording
+the model in its metadata. The server only runs vector search against a
+corpus embedded with its own provider, so switch both together: point
+CHROMA_DB_PATH at the output and set EMBEDDING_BACKEND, or reload a running
+server with the new corpus once it uses the same backend.
+
+Usage (from cs-grader-server/):
+    EMBEDDING_MODEL_PATH=/models/bge-small-en python -m tools.reembed \\
+        --backend local --output app/core/chroma_db_local
+    curl -X POST -H "X-Admin-Token: $ADMIN_TOKEN" \\
+        "http://localhost:8000/api/v1/evaluateLogic/reload?path=app/core/chroma_db_local"
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+import chromadb
+from app.core.config import settings
+from app.core.chroma_middleware import EMBEDDING_MODEL_METADATA
+from app.core.embeddings import create_embedding_provider, SEARCH_DOCUMENT
+
+COLLECTION = "algorithms"
+PAGE_SIZE = 500
+
+def read_collection(path: str) -> Dict[str, List[Any]]:
+    """Every id, document and metadata in the source collection."""
+    collection = chromadb.PersistentClient(path=path).get_collection(COLLECTION)
+    rows: Dict[str, List[Any]] = {"ids": [], "documents": [], "metadatas": []}
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=PAGE_SIZE, offset=len(rows["ids"]))
+        for field in rows:
+            rows[field].extend(page.get(field) or [])
+        if len(page["ids"]) < PAGE_SIZE:
+            return rows
+
+async def reembed(source: str, output: str, backend: str, batch_size: int) -> Dict[str, Any]:
+    rows = read_collection(source)
+    # Documents without text cannot be embedded; they are left out of the new corpus
+    keep = [i for i, document in enumerate(rows["documents"]) if document]
+    ids = [rows["ids"][i] for i in keep]
+    documents = [rows["documents"][i] for i in keep]
+    metadatas = [rows["metadatas"][i] if rows["metadatas"] else None for i in keep]
+
+    provider = create_embedding_provider(backend)
+    print(f"Embedding {len(documents)} document(s) with {provider.model_id}")
+
+    client = chromadb.PersistentClient(path=output)
+    if COLLECTION in [c if isinstance(c, str) else c.name for c in client.list_collections()]:
+        client.delete_collection(COLLECTION)
+    collection = client.create_collection(
+        name=COLLECTION,
+        metadata={"hnsw:space": "cosine", EMBEDDING_MODEL_METADATA: provider.model_id}
+    )
+
+    dimensions = 0
+    for start in range(0, len(documents), batch_size):
+        end = start + batch_size
+        embeddings = await provider.embed(documents[start:end], SEARCH_DOCUMENT)
+        dimensions = len(embeddings[0])
+        batch_metadatas = metadatas[start:end]
+        collection.add(
+            ids=ids[start:end],
+            embeddings=embeddings,
+            documents=documents[start:end],
+            # Chroma rejects empty metadata, so only pass it when every row has some
+            metadatas=batch_metadatas if all(batch_metadatas) else None
+        )
+        print(f"  {min(end, len(documents))}/{len(documents)}")
+
+    return {
+        "model": provider.model_id,
+        "embedded": len(documents),
+        "skipped": len(rows["ids"]) - len(documents),
+        "dimensions": dimensions,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=settings.CHROMA_DB_PATH, help="Chroma directory to read")
+    parser.add_argument("--output", required=True, help="Chroma directory to write; must differ from --source")
+    parser.add_argument("--backend", default=settings.EMBEDDING_BACKEND, choices=["cohere", "local"])
+    parser.add_argument("--batch-size", type=int, default=64, help="Documents per embedding call")
+    args = parser.parse_args()
+
+    if os.path.realpath(args.source) == os.path.realpath(args.output):
+        # A server may be serving the source; build beside it and switch over
+        parser.error("--output must be a different directory from --source")
+
+    start = time.perf_counter()
+    summary = asyncio.run(reembed(args.source, args.output, args.backend, max(1, args.batch_size)))
+    print(f"\nDone in {time.perf_counter() - start:.1f}s")
+    print(f"Model: {summary['model']} ({summary['dimensions']} dimensions)")
+    print(f"Embedded: {summary['embedded']}, skipped without text: {summary['skipped']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Regrade stored submissions after a model, prompt template or test suite
+change.
+
+Each submission graded through /getResponse/get-response has its stage
+inputs, outputs and version fingerprints stored. This asks a running server
+to regrade every stored submission (or the given ones); only stages whose
+fingerprint or inputs changed are recomputed, so OCR is not redone when only
+a prompt changed. Calls are sent as batch traffic so they queue behind
+interactive grading.
+
+Usage (from cs-grader-server/, with ADMIN_TOKEN set):
+    python -m tools.regrade --base-url http://localhost:8000 --concurrency 4
+    python -m tools.regrade --submission 3f2a... --submission 9b1c...
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List
+import httpx
+
+API = "/api/v1/getResponse"
+PAGE_SIZE = 1000
+
+async def list_submissions(client: httpx.AsyncClient) -> List[str]:
+    """Every stored submission id, collected before any regrade rewrites the records."""
+    ids: List[str] = []
+    while True:
+        response = await client.get(f"{API}/submissions", params={"limit": PAGE_SIZE, "offset": len(ids)})
+        response.raise_for_status()
+        page = response.json()["submission_ids"]
+        ids.extend(page)
+        if len(page) < PAGE_SIZE:
+            return ids
+
+async def regrade_all(
+    base_url: str, admin_token: str, submission_ids: List[str], concurrency: int, timeout: float
+) -> Dict[str, Any]:
+    headers = {"X-Admin-Token": admin_token, "X-Request-Class": "batch"}
+    semaphore = asyncio.Semaphore(concurrency)
+    recomputed: Counter = Counter()
+    statuses: Counter = Counter()
+    failed: List[str] = []
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout) as client:
+        if not submission_ids:
+            submission_ids = await list_submissions(client)
+        print(f"Regrading {len(submission_ids)} submission(s) with concurrency {concurrency}")
+
+        async def regrade(submission_id: str) -> None:
+            async with semaphore:
+                try:
+                    response = await client.post(
+                        f"{API}/regrade/{submission_id}", params={"include_stages": "false"}
+                    )
+                except httpx.HTTPError as e:
+                    statuses["error"] += 1
+                    failed.append(submission_id)
+                    print(f"{submission_id}: {e}")
+                    return
+            statuses[response.status_code] += 1
+            if response.status_code != 200:
+                failed.append(submission_id)
+                print(f"{submission_id}: HTTP {response.status_code} {response.text[:200]}")
+                return
+            stages = response.json().get("recomputed", [])
+            recomputed.update(stages)
+            print(f"{submission_id}: recomputed {', '.join(stages) or 'nothing'}")
+
+        await asyncio.gather(*(regrade(submission_id) for submission_id in submission_ids))
+
+    return {
+        "submissions": len(submission_ids),
+        "statuses": dict(statuses),
+        "recomputed_stages": dict(recomputed),
+        "failed": failed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--admin-token", default=os.getenv("ADMIN_TOKEN", ""))
+    parser.add_argument("--submission", action="append", default=[], help="Regrade only this id (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Submissions regraded at once")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds per regrade request")
+    args = parser.parse_args()
+
+    if not args.admin_token:
+        parser.error("--admin-token or ADMIN_TOKEN is required")
+
+    start = time.perf_counter()
+    summary = asyncio.run(regrade_all(
+        args.base_url, args.admin_token, args.submission, max(1, args.concurrency), args.timeout
+    ))
+    print(f"\nDone in {time.perf_counter() - start:.1f}s")
+    print(f"Statuses: {summary['statuses']}")
+    print(f"Recomputed stages: {summary['recomputed_stages']}")
+    if summary["failed"]:
+        print(f"Failed: {len(summary['failed'])} submission(s)")
+
+if __name__ == "__main__":
+    main()